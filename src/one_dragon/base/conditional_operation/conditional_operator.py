@@ -1,7 +1,7 @@
 import time
 from concurrent.futures import ThreadPoolExecutor, Future
 
-from threading import Lock
+from threading import RLock, Condition, Lock
 from typing import Optional, Callable, List
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
@@ -39,10 +39,14 @@ class ConditionalOperator(YamlConfig):
         self.normal_scene_handler: Optional[SceneHandler] = None  # 不需要状态触发的场景处理
         self.is_running: bool = False  # 整体是否正在运行
 
-        self._task_lock: Lock = Lock()
+        self._task_lock: RLock = RLock()
+        self._task_cond: Condition = Condition(self._task_lock)  # 任务完成 状态变化 停止运行时 唤醒主循环
         self.running_task: Optional[OperationTask] = None  # 正在运行的任务
         self.running_task_cnt: AtomicInt = AtomicInt()
 
+        self._trigger_cond: Condition = Condition(Lock())  # 有新的状态触发时 唤醒分发线程
+        self._pending_trigger_states: dict[str, None] = {}  # 等待触发场景的状态 按到达顺序 相同状态合并
+
     def init(
             self,
             op_getter: Callable[[OperationDef], AtomicOp],
@@ -104,53 +108,104 @@ class ConditionalOperator(YamlConfig):
 
         self.is_running = True
         self.running_task_cnt.set(0)  # 每次重置计数器 防止有bug导致无法正常运行
+        with self._trigger_cond:
+            self._pending_trigger_states.clear()
 
         if self.normal_scene_handler is not None:
             future: Future = _od_conditional_op_executor.submit(self._normal_scene_loop)
             future.add_done_callback(thread_utils.handle_future_result)
 
+        if len(self.trigger_scene_handler) > 0:
+            future: Future = _od_conditional_op_executor.submit(self._trigger_dispatch_loop)
+            future.add_done_callback(thread_utils.handle_future_result)
+
         return True
 
     def _normal_scene_loop(self) -> None:
         """
         主循环
+        不再轮询 而是在以下情况被唤醒后判断
+        - 运行中的任务完成或被打断
+        - 状态发生变化
+        - 场景的冷却时间到期
+        - 某个状态进入或离开表达式要求的时间区间
         :return:
         """
         normal_handler_id = id(self.normal_scene_handler)
-        while self.is_running:
-            if self.running_task_cnt.get() > 0:
-                # 有其它场景在运行 等待
-                time.sleep(0.02)
-            else:
-                # log.debug('开始等待新的主循环')
-                to_sleep: Optional[float] = None
-
-                # 上锁后确保运行状态不会被篡改
-                with self._task_lock:
-                    if not self.is_running:
-                        # 已经被stop_running中断了 不继续
-                        break
-
-                    trigger_time = time.time()
-                    last_trigger_time = self.last_trigger_time.get(normal_handler_id, 0)
-                    past_time = trigger_time - last_trigger_time
-                    if past_time < self.normal_scene_handler.interval_seconds:
-                        to_sleep = self.normal_scene_handler.interval_seconds - past_time
+        # 上锁后确保运行状态不会被篡改 等待时会释放锁
+        with self._task_cond:
+            while self.is_running:
+                if self.running_task_cnt.get() > 0:
+                    # 有其它场景在运行 等待任务结束
+                    self._task_cond.wait()
+                    continue
+
+                trigger_time = time.time()
+                last_trigger_time = self.last_trigger_time.get(normal_handler_id, 0)
+                past_time = trigger_time - last_trigger_time
+                if past_time < self.normal_scene_handler.interval_seconds:
+                    # 等待冷却时间到期
+                    self._task_cond.wait(self.normal_scene_handler.interval_seconds - past_time)
+                    continue
+
+                new_task = self.normal_scene_handler.get_operations(trigger_time)
+                if new_task is None:
+                    # 没有命中的状态 等待状态更新 或者等到判断结果可能随时间变化的时候
+                    change_time = self.normal_scene_handler.get_next_change_time(trigger_time)
+                    if change_time is None:
+                        self._task_cond.wait()
                     else:
-                        new_task = self.normal_scene_handler.get_operations(trigger_time)
-                        if new_task is not None:
-                            log.debug(f'当前场景 主循环 当前条件 {new_task.expr_display}')
-                            self.running_task = new_task
-                            self.last_trigger_time[normal_handler_id] = trigger_time
-                            self.running_task_cnt.inc()
-                            future = self.running_task.run_async()
-                            future.add_done_callback(self._on_task_done)
-
-                if to_sleep is not None:
-                    # 等待时间不能写在锁里 要尽快释放锁
-                    time.sleep(to_sleep)
-                else:  # 没有命中的状态 或者 提交执行了 那就自旋等待
-                    time.sleep(0.02)
+                        self._task_cond.wait(max(0.0, change_time - time.time()))
+                    continue
+
+                log.debug(f'当前场景 主循环 当前条件 {new_task.expr_display}')
+                self.running_task = new_task
+                self.last_trigger_time[normal_handler_id] = trigger_time
+                self.running_task_cnt.inc()
+                future = self.running_task.run_async()
+                future.add_done_callback(self._on_task_done)
+
+    def _trigger_dispatch_loop(self) -> None:
+        """
+        状态触发场景的分发线程
+        所有状态触发都在这一个线程中按顺序判断
+        :return:
+        """
+        while True:
+            with self._trigger_cond:
+                while self.is_running and len(self._pending_trigger_states) == 0:
+                    self._trigger_cond.wait()
+                if not self.is_running:
+                    break
+                state_name = next(iter(self._pending_trigger_states))
+                self._pending_trigger_states.pop(state_name)
+
+            try:
+                self._trigger_scene(state_name)
+            except Exception:
+                log.error('状态触发场景出错 %s', state_name, exc_info=True)
+
+    def _submit_trigger(self, state_name: str) -> None:
+        """
+        提交一个状态触发 由分发线程处理
+        :param state_name: 触发的状态
+        :return:
+        """
+        if not self.is_running:
+            return
+        with self._trigger_cond:
+            self._pending_trigger_states[state_name] = None
+            self._trigger_cond.notify()
+
+    def _notify_state_changed(self) -> None:
+        """
+        状态变化后 唤醒主循环重新判断
+        :return:
+        """
+        if self.normal_scene_handler is None:
+            return
+        with self._task_cond:
+            self._task_cond.notify_all()
 
     def _trigger_scene(self, state_name: str) -> None:
         """
@@ -212,9 +267,13 @@ class ConditionalOperator(YamlConfig):
         :return:
         """
         # 上锁后停止 上锁后确保运行状态不会被篡改
-        with self._task_lock:
+        with self._task_cond:
             self.is_running = False
             self._stop_running_task()
+            self._task_cond.notify_all()
+        with self._trigger_cond:
+            self._pending_trigger_states.clear()
+            self._trigger_cond.notify_all()
 
     def _stop_running_task(self) -> None:
         """
@@ -228,6 +287,7 @@ class ConditionalOperator(YamlConfig):
                 # 如果 finish=True 则计数器已经在 _on_task_done 减少了 这里就不减了
                 # 如果 finish=False 则代表还有操作在继续。在这里要减少计数器而不是等_on_task_done 让无触发器场景尽早运行
                 self.running_task_cnt.dec()
+                self._task_cond.notify_all()
 
     def _on_task_done(self, future: Future) -> None:
         """
@@ -241,6 +301,7 @@ class ConditionalOperator(YamlConfig):
                     self.running_task.priority = None
             except Exception:  # run_async里有callback打印日志
                 pass
+            self._task_cond.notify_all()
 
     def get_usage_states(self) -> set[str]:
         """
@@ -274,10 +335,10 @@ class ConditionalOperator(YamlConfig):
         if state_recorder is None:
             return
 
-        # 再去触发具体的场景 由自己的线程处理
+        # 再去触发具体的场景 由分发线程处理
         if not state_record.is_clear:
-            future: Future = _od_conditional_op_executor.submit(self._trigger_scene, state_recorder.state_name)
-            future.add_done_callback(thread_utils.handle_future_result)
+            self._submit_trigger(state_recorder.state_name)
+        self._notify_state_changed()
 
     def batch_update_states(self, state_records: List[StateRecord]) -> None:
         """
@@ -319,10 +380,9 @@ class ConditionalOperator(YamlConfig):
                 top_priority_handler = handler
                 top_priority_state = state_name
 
-        # 触发具体的场景 由自己的线程处理
+        # 触发具体的场景 由分发线程处理
         if top_priority_state is not None:
-            future: Future = _od_conditional_op_executor.submit(self._trigger_scene, top_priority_state)
-            future.add_done_callback(thread_utils.handle_future_result)
+            self._submit_trigger(top_priority_state)
         else:
             # 没有场景需要触发 看是否需要打断当前操作
             with self._task_lock:
@@ -340,6 +400,8 @@ class ConditionalOperator(YamlConfig):
                 if interrupt:
                     self._stop_running_task()
 
+        self._notify_state_changed()
+
     def _update_state_recorder(self, new_record: StateRecord) -> Optional[StateRecorder]:
         """
         更新一个状态记录
@@ -362,3 +424,66 @@ class ConditionalOperator(YamlConfig):
                     mutex_recorder.clear_state_record()
 
         return recorder
+
+
+def __debug():
+    """
+    测量从 update_state 到第一个指令开始执行的延迟
+    延时 状态要在更新0.2秒后才生效 测量的是超出0.2秒的部分 主循环需要按时间区间醒来
+    """
+    import threading
+
+    class _DebugOp(AtomicOp):
+
+        def __init__(self):
+            AtomicOp.__init__(self, op_name='debug')
+            self.event = threading.Event()
+            self.execute_time: float = 0
+
+        def execute(self):
+            self.execute_time = time.perf_counter()
+            self.event.set()
+
+    class _DebugOperator(ConditionalOperator):
+
+        def __init__(self):
+            ConditionalOperator.__init__(self, sub_dir='debug', template_name='debug', is_mock=True)
+            self.recorders = {i: StateRecorder(i) for i in ['按键', '主循环', '延时']}
+
+        def get_state_recorder(self, state_name: str) -> Optional[StateRecorder]:
+            return self.recorders.get(state_name)
+
+    debug_op = _DebugOp()
+    operator = _DebugOperator()
+    operator.data = {
+        'scenes': [
+            {'triggers': ['按键'], 'interval': 0, 'handlers': [{'states': '[按键]', 'operations': [{'op_name': 'debug'}]}]},
+            {'interval': 0, 'handlers': [
+                {'states': '[主循环]', 'operations': [{'op_name': 'debug'}]},
+                {'states': '[延时, 0.2, 1]', 'operations': [{'op_name': 'debug'}]},
+            ]},
+        ]
+    }
+    operator.init(op_getter=lambda op_def: debug_op, scene_handler_getter=lambda name: None,
+                  operation_template_getter=lambda name: None)
+    operator.start_running_async()
+
+    for state_name, delay in [('按键', 0), ('主循环', 0), ('延时', 0.2)]:
+        latency_list = []
+        for _ in range(100 if delay == 0 else 20):
+            debug_op.event.clear()
+            start_time = time.perf_counter()
+            operator.update_state(StateRecord(state_name, trigger_time=time.time()))
+            debug_op.event.wait(1 + delay)
+            latency_list.append(debug_op.execute_time - start_time - delay)
+            operator.update_state(StateRecord(state_name, is_clear=True))
+            time.sleep(0.01)
+        latency_list.sort()
+        print('%s 延迟 中位数 %.2fms 最大 %.2fms' % (
+            state_name, latency_list[len(latency_list) // 2] * 1000, latency_list[-1] * 1000))
+
+    operator.stop_running()
+
+
+if __name__ == '__main__':
+    __debug()
@@ -17,13 +17,24 @@ class SceneHandler:
         :param trigger_time: 触发时间
         :return:
         """
+        tick_results: dict[str, bool] = {}  # 不同处理器中相同的表达式 只计算一次
         for sh in self.state_handlers:
-            task = sh.get_operations(trigger_time)
+            task = sh.get_operations(trigger_time, tick_results)
             if task is not None:
                 task.set_priority(self.priority)
                 return task
         return None
 
+    def get_next_change_time(self, now: float) -> Optional[float]:
+        """
+        状态不再更新时 各处理器的判断结果最早可能发生变化的时间
+        :param now: 当前时间
+        :return: 之后不会再随时间变化时返回None
+        """
+        change_time_list = [sh.get_next_change_time(now) for sh in self.state_handlers]
+        change_time_list = [i for i in change_time_list if i is not None]
+        return min(change_time_list) if len(change_time_list) > 0 else None
+
     def get_usage_states(self) -> set[str]:
         """
         获取使用的状态
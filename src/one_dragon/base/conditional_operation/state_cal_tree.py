@@ -5,6 +5,9 @@ from one_dragon.base.conditional_operation.state_recorder import StateRecorder
 from one_dragon.utils.log_utils import log
 
 
+STATE_TIME_EPSILON: float = 0.001  # 判断离开生效时间区间时 在区间最大值后多等待的时间
+
+
 class StateCalNodeType(Enum):
 
     OP: int = 0
@@ -57,19 +60,59 @@ class StateCalNode:
         self.state_value_range_min: int = state_value_range_min
         self.state_value_range_max: int = state_value_range_max
 
+        self._evaluator: Optional[Callable[[float], bool]] = None  # 编译后的判断函数
+        self._expr_key: Optional[str] = None  # 规范化后的表达式 相同的表达式可以共用计算结果
+
     def in_time_range(self, now: float) -> bool:
         """
         根据当前时间 判断是否在状态的生效时间范围内
+        第一次调用时将整棵树编译成闭包 后续直接调用
+        :param now: 当前时间
+        :return:
+        """
+        if self._evaluator is None:
+            self._evaluator = compile_state_cal_tree(self)
+        return self._evaluator(now)
+
+    @property
+    def expr_key(self) -> str:
+        """
+        规范化后的表达式 忽略空格和多余括号
+        :return:
+        """
+        if self._expr_key is None:
+            if self.node_type == StateCalNodeType.OP:
+                if self.op_type == StateCalOpType.NOT:
+                    self._expr_key = '!%s' % self.left_child.expr_key
+                else:
+                    self._expr_key = '(%s%s%s)' % (
+                        self.left_child.expr_key,
+                        '&' if self.op_type == StateCalOpType.AND else '|',
+                        self.right_child.expr_key
+                    )
+            elif self.node_type == StateCalNodeType.STATE:
+                self._expr_key = '[%s,%s,%s]{%s,%s}' % (
+                    self.state_recorder.state_name,
+                    self.state_time_range_min, self.state_time_range_max,
+                    self.state_value_range_min, self.state_value_range_max,
+                )
+            else:
+                self._expr_key = ''
+        return self._expr_key
+
+    def in_time_range_by_tree(self, now: float) -> bool:
+        """
+        逐个节点递归判断 与编译后的结果一致 用于校验
         :param now: 当前时间
         :return:
         """
         if self.node_type == StateCalNodeType.OP:
             if self.op_type == StateCalOpType.AND:
-                return self.left_child.in_time_range(now) and self.right_child.in_time_range(now)
+                return self.left_child.in_time_range_by_tree(now) and self.right_child.in_time_range_by_tree(now)
             elif self.op_type == StateCalOpType.OR:
-                return self.left_child.in_time_range(now) or self.right_child.in_time_range(now)
+                return self.left_child.in_time_range_by_tree(now) or self.right_child.in_time_range_by_tree(now)
             elif self.op_type == StateCalOpType.NOT:
-                return not self.left_child.in_time_range(now)
+                return not self.left_child.in_time_range_by_tree(now)
         elif self.node_type == StateCalNodeType.STATE:
             diff = now - self.state_recorder.last_record_time
             # log.debug('状态 [ %s ] 距离上次 %.2f, 要求区间 [%.2f, %.2f]' % (
@@ -96,6 +139,32 @@ class StateCalNode:
         elif self.node_type == StateCalNodeType.TRUE:
             return True
 
+    def get_next_change_time(self, now: float) -> Optional[float]:
+        """
+        状态不再更新时 判断结果最早可能发生变化的时间 即某个状态进入或离开生效时间区间的时间
+        值的变化只会来自状态更新 不需要考虑
+        :param now: 当前时间
+        :return: 之后不会再随时间变化时返回None
+        """
+        if self.node_type == StateCalNodeType.OP:
+            change_time = self.left_child.get_next_change_time(now)
+            if self.right_child is not None:
+                right_change_time = self.right_child.get_next_change_time(now)
+                if change_time is None or (right_change_time is not None and right_change_time < change_time):
+                    change_time = right_change_time
+            return change_time
+        elif self.node_type == StateCalNodeType.STATE:
+            last_record_time = self.state_recorder.last_record_time
+            enter_time = last_record_time + self.state_time_range_min
+            if enter_time > now:
+                return enter_time
+            leave_time = last_record_time + self.state_time_range_max
+            if leave_time >= now:
+                return leave_time + STATE_TIME_EPSILON  # 区间包含最大值 超过一点才离开
+            return None
+        else:
+            return None
+
     def get_usage_states(self) -> set[str]:
         """
         获取使用的状态
@@ -125,6 +194,44 @@ class StateCalNode:
             self.state_recorder.dispose()
 
 
+def compile_state_cal_tree(node: StateCalNode) -> Callable[[float], bool]:
+    """
+    将状态判断树编译成一个闭包
+    运算符节点直接调用子节点的闭包 叶子节点的区间参数都绑定为局部变量 避免每次判断时的属性查找和类型分支
+    :param node: 状态判断树的根节点
+    :return: 判断函数 入参为当前时间
+    """
+    if node.node_type == StateCalNodeType.OP:
+        left = compile_state_cal_tree(node.left_child)
+        if node.op_type == StateCalOpType.NOT:
+            return lambda now: not left(now)
+
+        right = compile_state_cal_tree(node.right_child)
+        if node.op_type == StateCalOpType.AND:
+            return lambda now: left(now) and right(now)
+        else:
+            return lambda now: left(now) or right(now)
+    elif node.node_type == StateCalNodeType.STATE:
+        recorder = node.state_recorder
+        time_min = node.state_time_range_min
+        time_max = node.state_time_range_max
+        if node.state_value_range_min is None or node.state_value_range_max is None:
+            return lambda now: time_min <= now - recorder.last_record_time <= time_max
+
+        value_min = node.state_value_range_min
+        value_max = node.state_value_range_max
+
+        def _state_with_value(now: float) -> bool:
+            if not time_min <= now - recorder.last_record_time <= time_max:
+                return False
+            value = recorder.last_value
+            return value is not None and value_min <= value <= value_max
+
+        return _state_with_value
+    else:
+        return lambda now: True
+
+
 def construct_state_cal_tree(expr_str: str, state_getter: Callable[[str], StateRecorder]) -> StateCalNode:
     """
     根据表达式 构造出状态判断树
@@ -274,18 +381,47 @@ def construct_state_cal_tree(expr_str: str, state_getter: Callable[[str], StateR
             
 def __debug():
     expr = "( [闪避识别-黄光, 0, 1] | [闪避识别-红光, 0, 1] ) & ![按键-闪避, 0, 1]{0, 1}"
-    ctx = None
     sr1 = StateRecorder('闪避识别-黄光')
     sr1.last_record_time = 1
     sr2 = StateRecorder('闪避识别-红光')
     sr2.last_record_time = 2
     sr3 = StateRecorder('按键-闪避')
     sr3.last_record_time = 1
-    node = construct_state_cal_tree(expr, [sr1, sr2, sr3])
+    recorders = {sr.state_name: sr for sr in [sr1, sr2, sr3]}
+    node = construct_state_cal_tree(expr, recorders.get)
     assert node.in_time_range(2)  # True
     sr3.last_value = 1
     assert not node.in_time_range(2)  # False
 
+    # 性能对比 构造一个较大的表达式
+    import random
+    import time
+    state_names = ['状态-%02d' % i for i in range(20)]
+    recorders = {name: StateRecorder(name) for name in state_names}
+    parts = []
+    for i in range(0, len(state_names), 2):
+        parts.append('([%s, 0, 1] & ![%s, 0, 2]{0, 1})' % (state_names[i], state_names[i + 1]))
+    big_expr = ' | '.join(parts)
+    node = construct_state_cal_tree(big_expr, recorders.get)
+
+    round_cnt = 100000
+    rand = random.Random(0)
+    for _ in range(1000):  # 先校验结果一致
+        for recorder in recorders.values():
+            recorder.last_record_time = rand.uniform(-1, 10)
+            recorder.last_value = rand.choice([None, 0, 1, 2])
+        assert node.in_time_range(10) == node.in_time_range_by_tree(10)
+
+    t1 = time.perf_counter()
+    for _ in range(round_cnt):
+        node.in_time_range_by_tree(10)
+    t2 = time.perf_counter()
+    for _ in range(round_cnt):
+        node.in_time_range(10)
+    t3 = time.perf_counter()
+    print('递归判断 %.0f 次/秒' % (round_cnt / (t2 - t1)))
+    print('编译判断 %.0f 次/秒' % (round_cnt / (t3 - t2)))
+
 
 if __name__ == '__main__':
     __debug()
@@ -27,16 +27,17 @@ class StateHandler:
         self.operations: List[AtomicOp] = operations
         self.interrupt_states: Set[str] = interrupt_states
 
-    def get_operations(self, trigger_time: float) -> Optional[OperationTask]:
+    def get_operations(self, trigger_time: float, tick_results: Optional[dict[str, bool]] = None) -> Optional[OperationTask]:
         """
         根据触发时间 和优先级 获取符合条件的场景下的指令
         :param trigger_time:
+        :param tick_results: 本次判断中 已经计算过的表达式结果 相同的表达式只计算一次
         :return:
         """
-        if self.state_cal_tree.in_time_range(trigger_time):
+        if self.in_time_range(trigger_time, tick_results):
             if self.sub_handlers is not None and len(self.sub_handlers) > 0:
                 for sub_handler in self.sub_handlers:
-                    task = sub_handler.get_operations(trigger_time)
+                    task = sub_handler.get_operations(trigger_time, tick_results)
                     if task is not None:
                         task.add_expr(self.expr)
                         task.add_interrupt_states(self.interrupt_states)
@@ -49,6 +50,38 @@ class StateHandler:
 
         return None
 
+    def in_time_range(self, trigger_time: float, tick_results: Optional[dict[str, bool]] = None) -> bool:
+        """
+        判断状态表达式是否成立
+        :param trigger_time: 触发时间
+        :param tick_results: 本次判断中 已经计算过的表达式结果
+        :return:
+        """
+        if tick_results is None:
+            return self.state_cal_tree.in_time_range(trigger_time)
+
+        expr_key = self.state_cal_tree.expr_key
+        result = tick_results.get(expr_key)
+        if result is None:
+            result = self.state_cal_tree.in_time_range(trigger_time)
+            tick_results[expr_key] = result
+        return result
+
+    def get_next_change_time(self, now: float) -> Optional[float]:
+        """
+        状态不再更新时 自身及子处理器的判断结果最早可能发生变化的时间
+        :param now: 当前时间
+        :return: 之后不会再随时间变化时返回None
+        """
+        change_time_list: List[float] = []
+        if self.state_cal_tree is not None:
+            change_time_list.append(self.state_cal_tree.get_next_change_time(now))
+        if self.sub_handlers is not None:
+            for sub in self.sub_handlers:
+                change_time_list.append(sub.get_next_change_time(now))
+        change_time_list = [i for i in change_time_list if i is not None]
+        return min(change_time_list) if len(change_time_list) > 0 else None
+
     def get_usage_states(self) -> set[str]:
         """
         获取使用的状态
@@ -22,6 +22,8 @@ class StateRecord:
 
 class StateRecorder:
 
+    __slots__ = ('state_name', 'mutex_list', 'last_record_time', 'last_value')  # 状态判断时频繁读取 减少属性查找开销
+
     def __init__(self, state_name: str, mutex_list: Optional[List[str]] = None):
         self.state_name: str = state_name
         self.mutex_list: List[str] = mutex_list  # 互斥的状态 这种状态出现的时候 就会将自身状态清空
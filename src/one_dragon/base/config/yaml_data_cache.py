@@ -0,0 +1,184 @@
+import atexit
+import hashlib
+import os
+import pickle
+import threading
+from typing import Any, Optional
+
+import yaml
+
+from one_dragon.base.config.yaml_save_worker import yaml_save_worker, YAML_LOADER
+from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+
+
+class YamlDataCache:
+
+    VERSION: int = 1  # 缓存格式的版本 格式变化时修改 旧缓存会被丢弃
+
+    def __init__(self, cache_file_path: str):
+        """
+        yml文件解析结果的缓存
+        所有文件的解析结果保存在一个二进制文件中 一次读取全部加载
+        文件的修改时间和大小不变时直接使用缓存 否则比较文件内容的md5 内容变化时才重新解析
+        :param cache_file_path: 缓存文件的路径
+        """
+        self.cache_file_path: str = cache_file_path
+
+        self.hit_cnt: int = 0
+        """命中缓存的次数"""
+
+        self.miss_cnt: int = 0
+        """重新解析的次数"""
+
+        self._entries: Optional[dict[str, tuple[int, int, str, bytes]]] = None  # 文件 -> (修改时间, 大小, md5, 解析结果序列化后的内容)
+        self._dirty: bool = False
+        self._lock = threading.Lock()
+
+    def load(self, file_path: str) -> Any:
+        """
+        读取一个yml文件的解析结果
+        每次返回的都是新的对象 调用方可以随意修改
+        :param file_path: 文件路径
+        :return: 解析结果 文件不存在时返回None
+        """
+        yaml_save_worker.flush(file_path)  # 先写入未保存的内容 避免读取到旧数据
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+
+        key = self._get_key(file_path)
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self.hit_cnt += 1
+                return pickle.loads(entry[3])
+
+        with open(file_path, 'rb') as file:
+            content = file.read()
+        md5 = hashlib.md5(content).hexdigest()
+
+        with self._lock:
+            if entry is not None and entry[2] == md5:  # 只是修改时间变了 例如git切换分支
+                self._entries[key] = (stat.st_mtime_ns, stat.st_size, md5, entry[3])
+                self._dirty = True
+                self.hit_cnt += 1
+                return pickle.loads(entry[3])
+
+        data = yaml.load(content.decode('utf-8'), Loader=YAML_LOADER)
+        data_bytes = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = (stat.st_mtime_ns, stat.st_size, md5, data_bytes)
+            self._dirty = True
+            self.miss_cnt += 1
+
+        return data
+
+    def save(self) -> None:
+        """
+        有变化时 写入缓存文件
+        :return:
+        """
+        with self._lock:
+            if not self._dirty or self._entries is None:
+                return
+            blob = pickle.dumps((YamlDataCache.VERSION, self._entries), protocol=pickle.HIGHEST_PROTOCOL)
+            self._dirty = False
+
+        temp_path = f'{self.cache_file_path}.tmp'
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(blob)
+            os.replace(temp_path, self.cache_file_path)
+        except Exception:
+            log.error(f'缓存文件写入失败 {self.cache_file_path}', exc_info=True)
+
+    def clear(self) -> None:
+        """
+        清空缓存 并删除缓存文件
+        :return:
+        """
+        with self._lock:
+            self._entries = {}
+            self._dirty = False
+            if os.path.exists(self.cache_file_path):
+                os.remove(self.cache_file_path)
+
+    def _ensure_loaded(self) -> None:
+        """
+        需要持有锁时调用 第一次使用时读取缓存文件
+        :return:
+        """
+        if self._entries is not None:
+            return
+
+        self._entries = {}
+        if not os.path.exists(self.cache_file_path):
+            return
+
+        try:
+            with open(self.cache_file_path, 'rb') as file:
+                blob = file.read()
+            version, entries = pickle.loads(blob)
+            if version == YamlDataCache.VERSION:
+                self._entries = entries
+        except Exception:
+            log.error(f'缓存文件读取失败 将重新生成 {self.cache_file_path}', exc_info=True)
+
+    @staticmethod
+    def _get_key(file_path: str) -> str:
+        """
+        缓存使用的键 项目内的文件使用相对路径 项目目录移动后缓存依然有效
+        :param file_path: 文件路径
+        :return:
+        """
+        abs_path = os.path.abspath(file_path)
+        work_dir = os_utils.get_work_dir()
+        if abs_path.startswith(work_dir):
+            return os.path.normcase(os.path.relpath(abs_path, work_dir))
+        else:
+            return os.path.normcase(abs_path)
+
+
+game_data_cache = YamlDataCache(os.path.join(os_utils.get_path_under_work_dir('.cache'), 'yaml_data.pickle'))
+atexit.register(game_data_cache.save)
+
+
+def __debug():
+    import time
+    file_path_list = []
+    for data_dir in [
+        os_utils.get_path_under_work_dir('assets', 'game_data'),
+        os_utils.get_path_under_work_dir('config', 'world_patrol'),
+        os_utils.get_path_under_work_dir('config', 'sim_uni', 'map'),
+    ]:
+        for root, dirs, files in os.walk(data_dir):
+            for file_name in files:
+                if file_name.endswith('.yml'):
+                    file_path_list.append(os.path.join(root, file_name))
+
+    t1 = time.time()
+    for file_path in file_path_list:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            yaml.safe_load(file)
+    t2 = time.time()
+    cache = YamlDataCache(os.path.join(os_utils.get_path_under_work_dir('.cache'), 'yaml_data_debug.pickle'))
+    cache.clear()
+    for file_path in file_path_list:
+        cache.load(file_path)
+    cache.save()
+    t3 = time.time()
+    cache = YamlDataCache(cache.cache_file_path)
+    for file_path in file_path_list:
+        cache.load(file_path)
+    t4 = time.time()
+    print('文件数量 %d' % len(file_path_list))
+    print('yaml.safe_load 耗时 %.4f 秒' % (t2 - t1))
+    print('冷启动(生成缓存) 耗时 %.4f 秒' % (t3 - t2))
+    print('热启动(命中缓存 %d) 耗时 %.4f 秒' % (cache.hit_cnt, t4 - t3))
+
+
+if __name__ == '__main__':
+    __debug()
@@ -3,20 +3,27 @@ from typing import Optional
 
 import yaml
 
+from one_dragon.base.config.yaml_data_cache import game_data_cache
+from one_dragon.base.config.yaml_prefetcher import yaml_prefetcher
+from one_dragon.base.config.yaml_save_worker import yaml_save_worker, YAML_LOADER, YAML_DUMPER, atomic_write_text
 from one_dragon.utils.log_utils import log
 
 
 class YamlOperator:
 
-    def __init__(self, file_path: Optional[str] = None):
+    def __init__(self, file_path: Optional[str] = None, use_cache: bool = False):
         """
         yml文件的操作器
         :param file_path: yml文件的路径。不传入时认为是mock，用于测试。
+        :param use_cache: 是否通过解析结果的缓存读取 适用于游戏数据等较少变化的文件
         """
 
         self.file_path: str = file_path
         """yml文件的路径"""
 
+        self.use_cache: bool = use_cache
+        """是否通过解析结果的缓存读取"""
+
         self.data: dict = {}
         """存放数据的地方"""
 
@@ -29,12 +36,18 @@ class YamlOperator:
         """
         if self.file_path is None:
             return
+        yaml_save_worker.flush(self.file_path)  # 先写入未保存的内容 避免读取到旧数据
         if not os.path.exists(self.file_path):
             return
 
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as file:
-                self.data = yaml.safe_load(file)
+            if self.use_cache:
+                self.data = game_data_cache.load(self.file_path)
+            else:
+                self.data = yaml_prefetcher.pop(self.file_path)  # 一条龙中可能已经在后台预读
+                if self.data is None:
+                    with open(self.file_path, 'r', encoding='utf-8') as file:
+                        self.data = yaml.load(file, Loader=YAML_LOADER)
         except Exception:
             log.error(f'文件读取失败 将使用默认值 {self.file_path}', exc_info=True)
             return
@@ -43,11 +56,33 @@ class YamlOperator:
             self.data = {}
 
     def save(self):
+        """
+        保存到文件
+        启用延迟写入时 只提交保存请求 由后台线程合并写入
+        :return:
+        """
         if self.file_path is None:
             return
 
-        with open(self.file_path, 'w', encoding='utf-8') as file:
-            yaml.dump(self.data, file, allow_unicode=True, sort_keys=False)
+        if yaml_save_worker.enabled:
+            yaml_save_worker.submit(self.file_path, self._dump_text)
+        else:
+            yaml_save_worker.write(self.file_path, self._dump_text)
+
+    def _dump_text(self) -> str:
+        """
+        :return: 数据序列化后的文本
+        """
+        return yaml.dump(self.data, Dumper=YAML_DUMPER, allow_unicode=True, sort_keys=False)
+
+    def flush(self) -> None:
+        """
+        立刻写入未保存的内容
+        :return:
+        """
+        if self.file_path is None:
+            return
+        yaml_save_worker.flush(self.file_path)
 
     def save_diy(self, text: str):
         """
@@ -58,8 +93,8 @@ class YamlOperator:
         if self.file_path is None:
             return
 
-        with open(self.file_path, "w", encoding="utf-8") as file:
-            file.write(text)
+        yaml_save_worker.discard(self.file_path)
+        atomic_write_text(self.file_path, text)
 
     def get(self, prop: str, value=None):
         return self.data.get(prop, value)
@@ -78,12 +113,12 @@ class YamlOperator:
         删除配置文件
         :return:
         """
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
+        yaml_save_worker.discard_and_remove(self.file_path)
 
     def is_file_exists(self) -> bool:
         """
         配置文件是否存在
         :return:
         """
+        yaml_save_worker.flush(self.file_path)
         return os.path.exists(self.file_path)
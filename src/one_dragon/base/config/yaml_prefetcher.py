@@ -0,0 +1,98 @@
+import os
+import threading
+from typing import Any, Optional
+
+import yaml
+
+from one_dragon.base.config.yaml_save_worker import YAML_LOADER
+from one_dragon.utils.log_utils import log
+
+
+class YamlPrefetcher:
+
+    def __init__(self):
+        """
+        在后台提前读取并解析yml文件 例如一条龙中下一个实例的配置
+        读取时文件的修改时间和大小不变才使用预读的结果 否则按原来的方式读取
+        每个预读的结果只使用一次 之后的读取都按原来的方式
+        """
+        self.hit_cnt: int = 0
+        """使用预读结果的次数"""
+
+        self._entries: dict[str, tuple[int, int, Any]] = {}  # 文件 -> (修改时间, 大小, 解析结果)
+        self._lock = threading.Lock()
+
+    def prefetch_dir(self, dir_path: str, stop_event: Optional[threading.Event] = None) -> int:
+        """
+        预读一个目录下的全部yml文件 包括子目录
+        :param dir_path: 目录
+        :param stop_event: 设置后停止预读
+        :return: 预读的文件数量
+        """
+        if not os.path.isdir(dir_path):
+            return 0
+
+        cnt: int = 0
+        for root, _, file_list in os.walk(dir_path):
+            for file_name in file_list:
+                if stop_event is not None and stop_event.is_set():
+                    return cnt
+                if not file_name.endswith('.yml'):
+                    continue
+                if self.prefetch_file(os.path.join(root, file_name)):
+                    cnt += 1
+        return cnt
+
+    def prefetch_file(self, file_path: str) -> bool:
+        """
+        预读一个yml文件
+        :param file_path: 文件路径
+        :return: 是否预读成功
+        """
+        try:
+            stat = os.stat(file_path)
+            with open(file_path, 'r', encoding='utf-8') as file:
+                data = yaml.load(file, Loader=YAML_LOADER)
+        except Exception:
+            log.debug('预读文件失败 %s', file_path, exc_info=True)
+            return False
+
+        with self._lock:
+            self._entries[os.path.abspath(file_path)] = (stat.st_mtime_ns, stat.st_size, data)
+        return True
+
+    def pop(self, file_path: str) -> Optional[Any]:
+        """
+        取出一个文件的预读结果
+        调用前需要先写入未保存的内容
+        :param file_path: 文件路径
+        :return: 没有预读或者文件已经变化时返回None
+        """
+        with self._lock:
+            if len(self._entries) == 0:
+                return None
+            entry = self._entries.pop(os.path.abspath(file_path), None)
+        if entry is None:
+            return None
+
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            return None
+
+        with self._lock:
+            self.hit_cnt += 1
+        return entry[2]
+
+    def clear(self) -> None:
+        """
+        丢弃全部预读结果
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+yaml_prefetcher: YamlPrefetcher = YamlPrefetcher()
@@ -0,0 +1,211 @@
+import atexit
+import os
+import threading
+import time
+from typing import Optional, Callable
+
+import yaml
+
+from one_dragon.utils.log_utils import log
+
+# 有C扩展时使用C实现 行为与纯Python版本一致
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+YAML_DUMPER = getattr(yaml, 'CDumper', yaml.Dumper)
+
+
+def atomic_write_text(file_path: str, text: str) -> None:
+    """
+    原子写入文本文件
+    先写入临时文件 落盘后再替换原文件 避免写入中途退出导致文件损坏
+    :param file_path: 文件路径
+    :param text: 文本内容
+    :return:
+    """
+    temp_path = f'{file_path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+
+
+class YamlSaveWorker:
+
+    def __init__(self, debounce_seconds: float = 0.5):
+        """
+        yml文件的延迟写入
+        同一个文件短时间内的多次保存会合并为一次写入 由后台线程完成
+        :param debounce_seconds: 第一次未写入的保存请求后 最多等待多久再写入
+        """
+        self.enabled: bool = True
+        """是否启用延迟写入 关闭时调用方同步写入"""
+
+        self.debounce_seconds: float = debounce_seconds
+        """合并写入的等待时间"""
+
+        self.write_cnt: int = 0
+        """实际写入文件的次数"""
+
+        self._pending: dict[str, tuple[float, Callable[[], str]]] = {}  # 文件路径 -> (第一次请求时间, 生成文本的方法)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._write_lock = threading.RLock()  # 写入文件时持有 保证flush返回时文件已经写完
+        self._thread: Optional[threading.Thread] = None
+        self._running: bool = False
+
+    def submit(self, file_path: str, text_getter: Callable[[], str]) -> None:
+        """
+        提交一个保存请求
+        :param file_path: 文件路径
+        :param text_getter: 生成待写入文本的方法 在写入时才调用 保证写入的是最新的数据
+        :return:
+        """
+        with self._cond:
+            # 已经在等待写入时 保留第一次请求的时间 只替换生成文本的方法 使等待时间成为最大延迟
+            pending = self._pending.get(file_path)
+            request_time = pending[0] if pending is not None else time.time()
+            self._pending[file_path] = (request_time, text_getter)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def discard(self, file_path: str) -> None:
+        """
+        丢弃一个文件未写入的保存请求
+        :param file_path: 文件路径
+        :return:
+        """
+        with self._cond:
+            self._pending.pop(file_path, None)
+
+    def discard_and_remove(self, file_path: str) -> None:
+        """
+        丢弃一个文件未写入的保存请求 并删除该文件
+        持有写入锁 会等待正在进行的写入完成 避免删除后又被后台写入重新创建
+        :param file_path: 文件路径
+        :return:
+        """
+        with self._write_lock:
+            self.discard(file_path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def flush(self, file_path: Optional[str] = None) -> None:
+        """
+        立刻写入未保存的内容
+        :param file_path: 文件路径 不传入时写入全部文件
+        :return:
+        """
+        with self._write_lock:
+            with self._cond:
+                if file_path is None:
+                    to_write = list(self._pending.items())
+                    self._pending.clear()
+                elif file_path in self._pending:
+                    to_write = [(file_path, self._pending.pop(file_path))]
+                else:
+                    to_write = []
+
+            for path, (_, text_getter) in to_write:
+                self.write(path, text_getter)
+
+    def shutdown(self) -> None:
+        """
+        停止后台线程 并写入全部未保存内容
+        :return:
+        """
+        with self._cond:
+            self.enabled = False
+            self._running = False
+            self._cond.notify()
+        self.flush()
+
+    def _ensure_thread(self) -> None:
+        """
+        需要持有锁时调用 确保后台线程已经启动
+        :return:
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='yaml_save_worker', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """
+        后台线程 等待到期的保存请求并写入
+        :return:
+        """
+        while True:
+            with self._cond:
+                while self._running and not self._has_due():
+                    self._cond.wait(self._next_wait_seconds())
+                if not self._running:
+                    return
+
+            with self._write_lock:
+                with self._cond:
+                    now = time.time()
+                    to_write = [(path, text_getter)
+                                for path, (request_time, text_getter) in self._pending.items()
+                                if request_time + self.debounce_seconds <= now]
+                    for path, _ in to_write:
+                        self._pending.pop(path)
+
+                for path, text_getter in to_write:
+                    self.write(path, text_getter)
+
+    def _has_due(self) -> bool:
+        """
+        需要持有锁时调用 是否有到期的保存请求
+        :return:
+        """
+        now = time.time()
+        for request_time, _ in self._pending.values():
+            if request_time + self.debounce_seconds <= now:
+                return True
+        return False
+
+    def _next_wait_seconds(self) -> Optional[float]:
+        """
+        需要持有锁时调用 距离下一个保存请求到期的时间
+        :return: 没有保存请求时返回None 即一直等待
+        """
+        if len(self._pending) == 0:
+            return None
+        first_request_time = min(request_time for request_time, _ in self._pending.values())
+        return max(0.0, first_request_time + self.debounce_seconds - time.time())
+
+    def write(self, file_path: str, text_getter: Callable[[], str]) -> None:
+        """
+        立刻写入一个文件
+        :param file_path: 文件路径
+        :param text_getter: 生成待写入文本的方法
+        :return:
+        """
+        with self._write_lock:
+            try:
+                text = text_getter()
+            except RuntimeError:  # 序列化时数据被其它线程修改 稍后重试
+                if self.enabled:
+                    with self._cond:
+                        if file_path not in self._pending:
+                            self._pending[file_path] = (time.time(), text_getter)
+                            self._ensure_thread()
+                            self._cond.notify()
+                else:
+                    log.error(f'文件序列化失败 {file_path}', exc_info=True)
+                return
+            except Exception:
+                log.error(f'文件序列化失败 {file_path}', exc_info=True)
+                return
+
+            try:
+                atomic_write_text(file_path, text)
+                with self._cond:
+                    self.write_cnt += 1
+            except Exception:
+                log.error(f'文件写入失败 {file_path}', exc_info=True)
+
+
+yaml_save_worker = YamlSaveWorker()
+atexit.register(yaml_save_worker.shutdown)
@@ -1,18 +1,11 @@
 import time
 
 from cv2.typing import MatLike
-from typing import List
 
+from one_dragon.base.controller.screenshot_ring import ScreenshotRing
 from one_dragon.base.geometry.point import Point
 
 
-class ScreenshotWithTime:
-
-    def __init__(self, screenshot: MatLike, create_time: float):
-        self.image: MatLike = screenshot
-        self.create_time: float = create_time
-
-
 class ControllerBase:
 
     def __init__(self,
@@ -21,9 +14,9 @@ class ControllerBase:
         """
         基础控制器的定义
         """
-        self.screenshot_history: List[ScreenshotWithTime] = []
         self.screenshot_alive_seconds: float = screenshot_alive_seconds  # 截图在内存的存活时间
-        self.max_screenshot_cnt: int = max_screenshot_cnt  # 内存中最多保持的截图数量
+        self.max_screenshot_cnt: int = max_screenshot_cnt  # 内存中最多保持的截图数量 大于0时至少保留最新的两张 为0时不保留截图
+        self.screenshot_history: ScreenshotRing = ScreenshotRing(max_screenshot_cnt, screenshot_alive_seconds)
 
     def init_before_context_run(self) -> bool:
         """
@@ -53,20 +46,16 @@ class ControllerBase:
     def screenshot(self, independent: bool = False) -> MatLike:
         """
         截图并保存在内存中
+        :param independent: 是否使用独立的截图器 在后台线程截图时使用 这时不执行 before_screenshot 避免后台截图移动鼠标等
         """
-        self.before_screenshot()
+        if not independent:
+            self.before_screenshot()
         now = time.time()
         screen = self.get_screenshot(independent)
         fix_screen = self.fill_uid_black(screen)
 
-        if self.max_screenshot_cnt > 0:
-            self.screenshot_history.append(ScreenshotWithTime(fix_screen, now))
-            while len(self.screenshot_history) > self.max_screenshot_cnt:
-                self.screenshot_history.pop(0)
-
-            while (len(self.screenshot_history) > 0
-                and now - self.screenshot_history[0].create_time > self.screenshot_alive_seconds):
-                self.screenshot_history.pop(0)
+        if fix_screen is not None:
+            self.screenshot_history.add(fix_screen, now)
 
         return fix_screen
 
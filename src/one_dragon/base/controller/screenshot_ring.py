@@ -0,0 +1,268 @@
+import threading
+import time
+import weakref
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+
+class ScreenshotFrame:
+
+    def __init__(self, thumbnail_size: Tuple[int, int]):
+        """
+        截图环形缓冲区中的一个槽位 会被之后的截图重复使用
+        槽位被覆盖后 seq 会变化 长期使用时需要自己复制需要的内容
+        :param thumbnail_size: 缩略图的大小 (宽, 高)
+        """
+        self.seq: int = -1
+        """帧序号 从0开始递增 -1为空槽位"""
+
+        self._image: Optional[MatLike] = None
+        self._image_ref: Optional[weakref.ref] = None  # 不保留截图时 只持有弱引用
+
+        self.create_time: float = 0
+        """截图时间 time.time()"""
+
+        self.capture_time: float = 0
+        """截图时间 time.monotonic() 用于计算间隔"""
+
+        self.change_score: float = 0
+        """与上一帧的差异 采样像素差值的平均值 0~255 第一帧或者大小变化时为255"""
+
+        self._thumbnail_size: Tuple[int, int] = thumbnail_size
+        self._thumbnail: Optional[np.ndarray] = None  # 槽位复用时复用内存
+        self._thumbnail_seq: int = -1  # 缩略图对应的帧序号
+
+    @property
+    def image(self) -> Optional[MatLike]:
+        """
+        截图 只持有弱引用时 使用方都不再持有截图后返回None
+        """
+        if self._image is not None:
+            return self._image
+        if self._image_ref is not None:
+            return self._image_ref()
+        return None
+
+    @image.setter
+    def image(self, new_value: Optional[MatLike]) -> None:
+        self._image = new_value
+        self._image_ref = None
+
+    def set_weak_image(self, image: MatLike) -> None:
+        """
+        只持有截图的弱引用 不延长截图的生命周期
+        :param image: 截图
+        """
+        self._image = None
+        self._image_ref = weakref.ref(image)
+
+    def get_thumbnail(self) -> Optional[MatLike]:
+        """
+        缩小后的截图 第一次使用时计算
+        :return:
+        """
+        image = self.image
+        if image is None:
+            return None
+        if self._thumbnail_seq != self.seq:
+            w, h = self._thumbnail_size
+            if self._thumbnail is None or self._thumbnail.shape[2:] != image.shape[2:]:
+                self._thumbnail = np.empty((h, w) + image.shape[2:], dtype=image.dtype)
+            cv2.resize(image, (w, h), dst=self._thumbnail, interpolation=cv2.INTER_AREA)
+            self._thumbnail_seq = self.seq
+        return self._thumbnail
+
+
+class ScreenshotRing:
+
+    def __init__(self, capacity: int, alive_seconds: float,
+                 sample_step: int = 8, thumbnail_size: Tuple[int, int] = (192, 108)):
+        """
+        固定大小的截图历史 槽位预先创建并重复使用
+        每一帧记录序号、截图时间 以及与上一帧的差异 使用方不需要重复计算
+        差异只比较间隔 sample_step 的采样像素 开销远小于整张图片的比较
+        :param capacity: 最多保存多少帧 大于0时至少为2 为0时不保留截图 只记录最新一帧的信息 截图只持有弱引用
+        :param alive_seconds: 超过这个时间的帧不再返回 并释放截图
+        :param sample_step: 计算差异时的采样间隔
+        :param thumbnail_size: 缩略图的大小 (宽, 高)
+        """
+        self.retain_image: bool = capacity > 0
+        self.capacity: int = max(2, capacity) if self.retain_image else 1
+        self.alive_seconds: float = alive_seconds
+        self.sample_step: int = sample_step
+
+        self._slots: List[ScreenshotFrame] = [ScreenshotFrame(thumbnail_size) for _ in range(self.capacity)]
+        self._next_seq: int = 0
+        self._sample: Optional[np.ndarray] = None  # 当前帧的采样像素
+        self._last_sample: Optional[np.ndarray] = None  # 上一帧的采样像素 与槽位无关 槽位被覆盖后仍然可以比较
+        self._diff: Optional[np.ndarray] = None  # 计算差异的缓冲区
+        self._condition = threading.Condition()
+
+    def add(self, image: MatLike, create_time: Optional[float] = None) -> ScreenshotFrame:
+        """
+        加入一帧 覆盖最旧的槽位
+        :param image: 截图
+        :param create_time: 截图时间 time.time() 不传入时使用当前时间
+        :return: 写入的槽位
+        """
+        with self._condition:
+            now = time.monotonic()
+            seq = self._next_seq
+            self._next_seq += 1
+            slot = self._slots[seq % self.capacity]
+
+            slot.seq = seq
+            if self.retain_image:
+                slot.image = image
+            else:
+                slot.set_weak_image(image)
+            slot.create_time = time.time() if create_time is None else create_time
+            slot.capture_time = now
+
+            sample = image[::self.sample_step, ::self.sample_step]
+            if self._sample is None or self._sample.shape != sample.shape or self._sample.dtype != sample.dtype:
+                self._sample = np.empty(sample.shape, dtype=sample.dtype)
+            np.copyto(self._sample, sample)
+
+            last = self._last_sample
+            if last is None or last.shape != self._sample.shape or last.dtype != self._sample.dtype:
+                slot.change_score = 255
+            else:
+                if self._diff is None or self._diff.shape != self._sample.shape or self._diff.dtype != self._sample.dtype:
+                    self._diff = np.empty(self._sample.shape, dtype=self._sample.dtype)
+                cv2.absdiff(self._sample, last, dst=self._diff)
+                slot.change_score = float(np.mean(self._diff))
+            self._sample, self._last_sample = self._last_sample, self._sample  # 两个缓冲区交替使用
+
+            for i in self._slots:  # 释放过期的截图
+                if i.image is not None and now - i.capture_time > self.alive_seconds:
+                    i.image = None
+
+            self._condition.notify_all()
+        return slot
+
+    def _is_alive(self, frame: ScreenshotFrame, now: float) -> bool:
+        return frame.seq >= 0 and frame.image is not None and now - frame.capture_time <= self.alive_seconds
+
+    def latest(self) -> Optional[ScreenshotFrame]:
+        """
+        :return: 最新的一帧 没有或者已经过期时返回None
+        """
+        with self._condition:
+            if self._next_seq == 0:
+                return None
+            frame = self._slots[(self._next_seq - 1) % self.capacity]
+            return frame if self._is_alive(frame, time.monotonic()) else None
+
+    def since(self, seq: int) -> List[ScreenshotFrame]:
+        """
+        某一帧之后的全部帧 按时间顺序
+        :param seq: 帧序号 -1时返回全部
+        :return:
+        """
+        with self._condition:
+            now = time.monotonic()
+            start = max(seq + 1, self._next_seq - self.capacity, 0)
+            result: List[ScreenshotFrame] = []
+            for i in range(start, self._next_seq):
+                frame = self._slots[i % self.capacity]
+                if self._is_alive(frame, now):
+                    result.append(frame)
+            return result
+
+    def wait_for_change(self, seq: int, min_score: float = 1, timeout: Optional[float] = None) -> Optional[ScreenshotFrame]:
+        """
+        等待某一帧之后 出现与上一帧差异足够大的帧
+        只会等待其它线程的截图 不会主动截图
+        :param seq: 帧序号 只看这之后的帧
+        :param min_score: 最小的差异
+        :param timeout: 最多等待的秒数 None为一直等待
+        :return: 超时返回None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                for frame in self.since(seq):
+                    if frame.change_score >= min_score:
+                        return frame
+                    seq = frame.seq
+                seq = max(seq, self._next_seq - 1)  # 已经看过的帧 不再检查
+
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remain = deadline - time.monotonic()
+                    if remain <= 0:
+                        return None
+                    self._condition.wait(remain)
+
+    def clear(self) -> None:
+        """
+        释放全部截图 帧序号继续递增
+        :return:
+        """
+        with self._condition:
+            for i in self._slots:
+                i.image = None
+
+
+def __debug_benchmark(frame_cnt: int = 200, capacity: int = 10):
+    """
+    使用合成的截图来源 对比原来的列表历史与环形缓冲区的 内存分配和耗时
+    每帧是在底图上随机改动一块区域 与实际截图一样每次都是新的图片 两种方式的截图来源开销一致
+    列表历史中 使用方需要自己比较整张图片判断是否变化
+    """
+    import tracemalloc
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+
+    def next_frame() -> MatLike:
+        frame = base.copy()
+        x, y = int(rng.integers(0, 1600)), int(rng.integers(0, 800))
+        frame[y:y + 200, x:x + 300] = 0
+        return frame
+
+    def run_list() -> None:
+        history: list = []
+        last = None
+        for _ in range(frame_cnt):
+            frame = next_frame()
+            history.append((frame, time.time()))
+            while len(history) > capacity:
+                history.pop(0)
+            if last is not None:
+                _ = float(np.mean(cv2.absdiff(frame, last)))
+            last = frame
+
+    def run_ring() -> None:
+        ring = ScreenshotRing(capacity, 5)
+        for _ in range(frame_cnt):
+            ring.add(next_frame())
+
+    for name, func in [('列表 + 整图比较', run_list), ('环形缓冲区', run_ring)]:
+        tracemalloc.start()
+        start_time = time.time()
+        func()
+        cost = time.time() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('%s 每帧耗时 %.3fms 内存峰值 %.1fMB' % (name, cost * 1000 / frame_cnt, peak / 1024 / 1024))
+
+    ring = ScreenshotRing(capacity, 5)
+    start_time = time.time()
+    for _ in range(frame_cnt):
+        ring.add(next_frame())
+    add_cost = time.time() - start_time
+    start_time = time.time()
+    for _ in range(frame_cnt):
+        next_frame()
+    source_cost = time.time() - start_time
+    print('环形缓冲区 每帧差异计算 %.3fms' % ((add_cost - source_cost) * 1000 / frame_cnt))
+    print('最新帧', ring.latest().seq, '变化', ['%.1f' % i.change_score for i in ring.since(-1)])
+
+
+if __name__ == '__main__':
+    __debug_benchmark()
@@ -98,6 +98,22 @@ class MatchResultList:
             if self.max is None or a.confidence > self.max.confidence:
                 self.max = a
 
+    def extend(self, arr: List[MatchResult]) -> None:
+        """
+        一次性添加多个已经合并过的结果 不再逐个合并
+        :param arr: 匹配结果
+        :return:
+        """
+        if self.only_best:
+            for a in arr:
+                self.append(a)
+            return
+
+        self.arr.extend(arr)
+        for a in arr:
+            if self.max is None or a.confidence > self.max.confidence:
+                self.max = a
+
     def __getitem__(self, item):
         return self.arr[item]
 
@@ -121,3 +121,12 @@ class Application(Operation):
         if self.need_ocr:
             self.ctx.ocr.init_model()
         return True
+
+    def prefetch_for_application(self) -> None:
+        """
+        一条龙中 在上一个应用运行时 后台准备本应用需要的内容 由子类实现
+        只应该做 加载数据、预热缓存、初始化模型 等不依赖游戏画面的准备
+        应用开始前会等待这里完成 因此可以和 init_for_application 使用同样的初始化方法
+        """
+        if self.need_ocr:
+            self.ctx.ocr.init_model()
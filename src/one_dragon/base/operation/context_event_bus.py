@@ -1,8 +1,12 @@
+import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Lock
 
-from typing import Callable, Any, List
+from typing import Callable, Any, List, Optional
 
 from one_dragon.utils import thread_utils
+from one_dragon.utils.log_utils import log
 
 _od_event_bus_executor = ThreadPoolExecutor(thread_name_prefix='od_event_bus', max_workers=32)
 
@@ -12,12 +16,138 @@ class ContextEventItem:
     def __init__(self, event_id: str, data: Any):
         self.event_id: str = event_id
         self.data: Any = data
+        self.dispatch_time: float = time.perf_counter()  # 下发时间 用于统计延迟
+
+
+class ContextEventQueue:
+
+    def __init__(self, name: str, coalesce: bool = False, max_size: int = 64,
+                 callback: Optional[Callable[[ContextEventItem], None]] = None):
+        """
+        事件的串行投递队列 可以由多个事件共用 共用时这些事件之间也按下发顺序投递
+        队列中的事件按下发顺序依次执行回调 同一时间最多只有一个线程在处理这个队列
+        :param name: 队列名称 用于统计信息
+        :param coalesce: 是否合并连续的相同事件 新事件与队尾的事件相同时替换队尾的事件 不改变不同事件之间的顺序
+        :param max_size: 队列最大长度 超出时丢弃最旧的事件
+        :param callback: 只投递给这个回调 为空时投递给事件的全部回调
+        """
+        self.name: str = name
+        self.coalesce: bool = coalesce
+        self.max_size: int = max(1, max_size)
+        self.callback: Optional[Callable[[ContextEventItem], None]] = callback
+
+        self.queue: deque[ContextEventItem] = deque()
+        self.lock: Lock = Lock()
+        self.draining: bool = False  # 是否已经有线程在处理队列
+
+        self.dispatch_cnt: int = 0  # 下发的事件数量
+        self.deliver_cnt: int = 0  # 实际投递的事件数量
+        self.drop_cnt: int = 0  # 队列满时丢弃的事件数量
+        self.coalesce_cnt: int = 0  # 被新事件合并掉的事件数量
+        self.max_depth: int = 0  # 出现过的最大队列长度
+        self.total_latency: float = 0  # 下发到开始执行回调的总耗时
+        self.max_latency: float = 0  # 下发到开始执行回调的最大耗时
+
+    @property
+    def depth(self) -> int:
+        """
+        :return: 当前的队列长度
+        """
+        return len(self.queue)
+
+    @property
+    def avg_latency(self) -> float:
+        """
+        :return: 下发到开始执行回调的平均耗时
+        """
+        return self.total_latency / self.deliver_cnt if self.deliver_cnt > 0 else 0
+
+    def put(self, item: ContextEventItem) -> bool:
+        """
+        放入一个事件
+        :param item: 事件
+        :return: 是否需要新开一个线程处理队列
+        """
+        dropped: Optional[ContextEventItem] = None
+        with self.lock:
+            self.dispatch_cnt += 1
+            if self.coalesce and len(self.queue) > 0 and self.queue[-1].event_id == item.event_id:
+                self.queue.pop()
+                self.coalesce_cnt += 1
+            elif len(self.queue) >= self.max_size:
+                dropped = self.queue.popleft()
+                self.drop_cnt += 1
+            self.queue.append(item)
+            self.max_depth = max(self.max_depth, len(self.queue))
+
+            need_drain = not self.draining
+            self.draining = True
+
+        if dropped is not None:
+            log.warning('事件队列已满 丢弃最旧的事件 %s %s 累计丢弃 %d', self.name, dropped.data, self.drop_cnt)
+        return need_drain
+
+    def take(self) -> Optional[ContextEventItem]:
+        """
+        取出一个事件 队列为空时结束处理
+        :return: 事件
+        """
+        with self.lock:
+            if len(self.queue) == 0:
+                self.draining = False
+                return None
+            item = self.queue.popleft()
+            latency = time.perf_counter() - item.dispatch_time
+            self.deliver_cnt += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            return item
+
+    def get_stats_display(self) -> str:
+        """
+        :return: 统计信息
+        """
+        return '事件队列 %s 下发 %d 投递 %d 丢弃 %d 合并 %d 当前队列 %d 最大队列 %d 平均延迟 %.2fms 最大延迟 %.2fms' % (
+            self.name, self.dispatch_cnt, self.deliver_cnt, self.drop_cnt, self.coalesce_cnt,
+            self.depth, self.max_depth, self.avg_latency * 1000, self.max_latency * 1000
+        )
 
 
 class ContextEventBus:
 
     def __init__(self):
         self.callbacks: dict[str, List[Callable[[Any], None]]] = {}
+        self.inline_callbacks: dict[str, List[Callable[[Any], None]]] = {}  # 在下发线程中直接执行的回调
+        self.event_queues: dict[str, ContextEventQueue] = {}  # 使用串行投递的事件 多个事件可以共用一个队列
+        self.callback_queue_options: dict[str, tuple[bool, int]] = {}  # 每个回调单独串行投递的事件 -> (是否合并, 队列最大长度)
+        self.callback_event_queues: dict[tuple[str, Callable], ContextEventQueue] = {}  # (事件ID, 回调) -> 队列
+        self.callback_event_queue_lock: Lock = Lock()
+
+    def register_event_queue(self, name: str, event_id_list: List[str],
+                             coalesce: bool = False, max_size: int = 64) -> None:
+        """
+        让一组事件共用一个串行投递队列 这些事件的回调按下发顺序依次执行
+        未注册的事件 每个回调都单独提交到线程池执行 不保证顺序
+        :param name: 队列名称
+        :param event_id_list: 事件ID列表
+        :param coalesce: 是否合并连续的相同事件
+        :param max_size: 队列最大长度 超出时丢弃最旧的事件
+        :return:
+        """
+        event_queue = ContextEventQueue(name, coalesce=coalesce, max_size=max_size)
+        for event_id in event_id_list:
+            self.event_queues[event_id] = event_queue
+
+    def register_callback_event_queue(self, event_id: str, coalesce: bool = False, max_size: int = 64) -> None:
+        """
+        让一个事件的每个回调都使用自己的串行投递队列
+        每个回调按下发顺序收到事件 耗时较长的回调只会延迟自己 不影响其它回调
+        :param event_id: 事件ID
+        :param coalesce: 是否合并连续的相同事件
+        :param max_size: 队列最大长度 超出时丢弃最旧的事件
+        :return:
+        """
+        self.callback_queue_options[event_id] = (coalesce, max_size)
 
     def dispatch_event(self, event_id: str, event_obj: Any = None):
         """
@@ -26,23 +156,100 @@ class ContextEventBus:
         :param event_obj: 事件体
         :return:
         """
-        if event_id not in self.callbacks:
+        if event_id in self.inline_callbacks:
+            for callback in self.inline_callbacks[event_id]:
+                try:
+                    callback(ContextEventItem(event_id, event_obj))
+                except Exception:
+                    log.error('事件回调执行失败 %s', event_id, exc_info=True)
+
+        if event_id not in self.callbacks or len(self.callbacks[event_id]) == 0:
+            return
+
+        event_queue = self.event_queues.get(event_id)
+        if event_queue is not None:
+            self._put_event_queue(event_queue, ContextEventItem(event_id, event_obj))
             return
+
+        if event_id in self.callback_queue_options:
+            for callback in list(self.callbacks[event_id]):
+                self._put_event_queue(self._get_callback_event_queue(event_id, callback),
+                                      ContextEventItem(event_id, event_obj))
+            return
+
         for callback in self.callbacks[event_id]:
             future: Future = _od_event_bus_executor.submit(callback, ContextEventItem(event_id, event_obj))
             future.add_done_callback(thread_utils.handle_future_result)
 
-    def listen_event(self, event_id: str, callback: Callable[[ContextEventItem], None]):
+    def _get_callback_event_queue(self, event_id: str, callback: Callable[[ContextEventItem], None]) -> ContextEventQueue:
+        """
+        获取一个回调的串行投递队列 不存在时创建
+        :param event_id: 事件ID
+        :param callback: 回调
+        :return:
+        """
+        key = (event_id, callback)
+        with self.callback_event_queue_lock:
+            event_queue = self.callback_event_queues.get(key)
+            if event_queue is None:
+                coalesce, max_size = self.callback_queue_options[event_id]
+                name = '%s %s' % (event_id, getattr(callback, '__qualname__', callback))
+                event_queue = ContextEventQueue(name, coalesce=coalesce, max_size=max_size, callback=callback)
+                self.callback_event_queues[key] = event_queue
+            return event_queue
+
+    def _put_event_queue(self, event_queue: ContextEventQueue, item: ContextEventItem) -> None:
+        """
+        放入串行投递队列 队列没有在处理时 提交到线程池处理
+        :param event_queue: 队列
+        :param item: 事件
+        :return:
+        """
+        if event_queue.put(item):
+            future: Future = _od_event_bus_executor.submit(self._drain_event_queue, event_queue)
+            future.add_done_callback(thread_utils.handle_future_result)
+
+    def _drain_event_queue(self, event_queue: ContextEventQueue) -> None:
+        """
+        按顺序处理一个事件队列 直到队列为空
+        :param event_queue: 事件队列
+        :return:
+        """
+        while True:
+            item = event_queue.take()
+            if item is None:
+                return
+            if event_queue.callback is not None:
+                callback_list = [event_queue.callback]
+            else:
+                callback_list = list(self.callbacks.get(item.event_id, []))
+            for callback in callback_list:
+                try:
+                    callback(item)
+                except Exception:
+                    log.error('事件回调执行失败 %s', item.event_id, exc_info=True)
+
+    def get_event_queue(self, event_id: str) -> Optional[ContextEventQueue]:
+        """
+        获取串行投递的事件队列 可用于查看统计信息
+        :param event_id: 事件ID
+        :return:
+        """
+        return self.event_queues.get(event_id)
+
+    def listen_event(self, event_id: str, callback: Callable[[ContextEventItem], None], inline: bool = False):
         """
         新增监听事件
         监听的回调，如果耗时过长，应该在自己的线程池的工作，避免阻塞
         :param event_id:
         :param callback:
+        :param inline: 是否在下发事件的线程中直接执行 只适用于非常快的回调
         :return:
         """
-        if event_id not in self.callbacks:
-            self.callbacks[event_id] = []
-        existed_callbacks = self.callbacks[event_id]
+        callback_map = self.inline_callbacks if inline else self.callbacks
+        if event_id not in callback_map:
+            callback_map[event_id] = []
+        existed_callbacks = callback_map[event_id]
         if callback not in existed_callbacks:
             existed_callbacks.append(callback)
 
@@ -53,9 +260,10 @@ class ContextEventBus:
         :param callback:
         :return:
         """
-        if event_id not in self.callbacks:
-            return
-        self.callbacks[event_id].remove(callback)
+        for callback_map in [self.callbacks, self.inline_callbacks]:
+            if event_id in callback_map and callback in callback_map[event_id]:
+                callback_map[event_id].remove(callback)
+        self._remove_callback_event_queue(event_id, callback)
 
     def unlisten_all_event(self, obj: Any):
         """
@@ -63,20 +271,38 @@ class ContextEventBus:
         :param obj:
         :return:
         """
-        to_remove = {}
-        for key, existed_callbacks in self.callbacks.items():
-            to_remove[key] = []
-            for existed in existed_callbacks:
-                if id(existed.__self__) == id(obj):
-                    to_remove[key].append(existed)
+        for callback_map in [self.callbacks, self.inline_callbacks]:
+            to_remove = {}
+            for key, existed_callbacks in callback_map.items():
+                to_remove[key] = []
+                for existed in existed_callbacks:
+                    if id(existed.__self__) == id(obj):
+                        to_remove[key].append(existed)
+
+            for key, removes in to_remove.items():
+                for remove in removes:
+                    callback_map[key].remove(remove)
+                    self._remove_callback_event_queue(key, remove)
 
-        for key, removes in to_remove.items():
-            for remove in removes:
-                self.callbacks[key].remove(remove)
+    def _remove_callback_event_queue(self, event_id: str, callback: Callable[[Any], None]) -> None:
+        """
+        解除监听后 移除回调的串行投递队列 还没投递的事件不再投递
+        :param event_id: 事件ID
+        :param callback: 回调
+        :return:
+        """
+        with self.callback_event_queue_lock:
+            event_queue = self.callback_event_queues.pop((event_id, callback), None)
+        if event_queue is not None:
+            with event_queue.lock:
+                event_queue.queue.clear()
 
     def after_app_shutdown(self) -> None:
         """
         App关闭后进行的操作 关闭一切可能资源操作
         @return:
         """
+        event_queue_list = list(self.event_queues.values()) + list(self.callback_event_queues.values())
+        for event_queue in dict.fromkeys(event_queue_list):  # 共用的队列只输出一次
+            log.debug(event_queue.get_stats_display())
         _od_event_bus_executor.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,19 @@
+import os
 from typing import List, Optional, ClassVar
 
 from one_dragon.base.config.one_dragon_config import OneDragonInstance, InstanceRun
+from one_dragon.base.config.yaml_prefetcher import yaml_prefetcher
+from one_dragon.base.config.yaml_save_worker import yaml_save_worker
 from one_dragon.base.operation.application_base import Application
 from one_dragon.base.operation.application_run_record import AppRunRecord
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
+from one_dragon.base.operation.one_dragon_prefetcher import OneDragonPrefetcher
 from one_dragon.base.operation.operation import Operation
 from one_dragon.base.operation.operation_base import OperationResult
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
+from one_dragon.utils import os_utils
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 
@@ -38,6 +43,8 @@ class OneDragonApp(Application):
         self._op_to_switch_account: Operation = op_to_switch_account  # 切换账号的op
         self._fail_app_idx: List[int] = []  # 失败的app下标
         self._current_retry_app_idx: int = 0  # 当前重试的_fail_app_idx的下标
+        self._start_yaml_write_cnt: int = 0  # 开始运行时 配置文件的写入次数
+        self._prefetcher: OneDragonPrefetcher = OneDragonPrefetcher(Application.get_preheat_executor())  # 后台准备下一个应用和实例
 
     def get_app_list(self) -> List[Application]:
         return []
@@ -76,6 +83,8 @@ class OneDragonApp(Application):
             self._instance_start_idx = 0
 
         self._instance_idx = self._instance_start_idx
+        self._start_yaml_write_cnt = yaml_save_worker.write_cnt
+        self._prefetcher.start()
 
     def get_one_dragon_apps_in_order(self) -> List[Application]:
         """
@@ -144,6 +153,8 @@ class OneDragonApp(Application):
             return self.round_success(status=OneDragonApp.STATUS_ALL_DONE)
 
         app = self._to_run_app_list[self._current_app_idx]
+        self._prefetcher.wait()  # 等待本应用的预热完成
+        self._submit_prefetch(self._current_app_idx + 1)
         app_result = app.execute()
         if not app_result.success:
             self._fail_app_idx.append(self._current_app_idx)
@@ -151,6 +162,31 @@ class OneDragonApp(Application):
 
         return self.round_success(status=OneDragonApp.STATUS_NEXT)
 
+    def _submit_prefetch(self, next_app_idx: int) -> None:
+        """
+        在当前应用运行时 后台准备下一个应用
+        已经是最后一个应用时 准备下一个实例的配置
+        :param next_app_idx: 下一个应用的下标
+        :return:
+        """
+        if next_app_idx < len(self._to_run_app_list):
+            app = self._to_run_app_list[next_app_idx]
+            self._prefetcher.submit(app.app_id, [app.prefetch_for_application])
+        elif len(self._instance_list) > 1:
+            next_instance = self._instance_list[(self._instance_idx + 1) % len(self._instance_list)]
+            self._prefetcher.submit('instance %02d' % next_instance.idx,
+                                    [lambda: self.prefetch_instance_config(next_instance.idx)])
+
+    def prefetch_instance_config(self, instance_idx: int) -> None:
+        """
+        预读一个实例的全部配置文件 切换实例时直接使用解析结果
+        :param instance_idx: 实例下标
+        :return:
+        """
+        instance_dir = os.path.join(os_utils.get_work_dir(), 'config', '%02d' % instance_idx)
+        cnt = yaml_prefetcher.prefetch_dir(instance_dir, self._prefetcher.stop_event)
+        log.debug('预读实例配置 %02d 文件数量 %d', instance_idx, cnt)
+
     @node_from(from_name='运行任务')
     @node_from(from_name='重试失败任务', status=STATUS_NEXT)
     @operation_node(name='重试失败任务')
@@ -173,7 +209,11 @@ class OneDragonApp(Application):
         if self._instance_idx >= len(self._instance_list):
             self._instance_idx = 0
 
+        self._prefetcher.wait()
+        hit_cnt = yaml_prefetcher.hit_cnt
         self.ctx.switch_instance(self._instance_list[self._instance_idx].idx)
+        log.debug('切换实例 使用预读配置 %d 个', yaml_prefetcher.hit_cnt - hit_cnt)
+        yaml_prefetcher.clear()  # 没有使用的预读结果不再保留
         log.info('下一个实例 %s', self.ctx.one_dragon_config.current_active_instance.name)
 
         return self.round_success()
@@ -199,6 +239,10 @@ class OneDragonApp(Application):
 
     def after_operation_done(self, result: OperationResult):
         Application.after_operation_done(self, result)
+        self._prefetcher.cancel()
+        yaml_prefetcher.clear()
+        yaml_save_worker.flush()
+        log.info('本次一条龙 配置文件写入次数 %d', yaml_save_worker.write_cnt - self._start_yaml_write_cnt)
         for app in self._to_run_app_list:   # 一条龙结束后 各app恢复
             app.init_context_before_start = True
             app.stop_context_after_stop = True
@@ -17,6 +17,7 @@ from one_dragon.base.operation.one_dragon_env_context import OneDragonEnvContext
 from one_dragon.base.screen.screen_loader import ScreenContext
 from one_dragon.base.screen.template_loader import TemplateLoader
 from one_dragon.utils import debug_utils, log_utils
+from one_dragon.utils.debug_image_writer import debug_image_writer
 from one_dragon.utils import thread_utils
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
@@ -54,6 +55,10 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext, OneDragonCustomCont
 
     def __init__(self, controller: Optional = None):
         ContextEventBus.__init__(self)
+        # 运行状态的事件共用一个队列 保证开始、暂停、恢复、停止按发生的顺序投递
+        self.register_event_queue('context_running_state', [i.value for i in ContextRunningStateEventEnum], coalesce=True)
+        # 按键的每个监听者单独排队 耗时较长的监听者不会阻塞其它监听者
+        self.register_callback_event_queue(ContextKeyboardEventEnum.PRESS.value, max_size=32)
         OneDragonEnvContext.__init__(self)
         OneDragonCustomContext.__init__(self)
 
@@ -149,8 +154,9 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext, OneDragonCustomCont
             self.switch_context_pause_and_run()
         elif key == self.key_stop_running:
             self.stop_running()
-        elif key == self.key_screenshot:
-            self.screenshot_and_save_debug()
+        elif key == self.key_screenshot:  # 截图较慢 不在按键监听的线程中执行 避免阻塞其它按键
+            f = ONE_DRAGON_CONTEXT_EXECUTOR.submit(self.screenshot_and_save_debug)
+            f.add_done_callback(thread_utils.handle_future_result)
 
         self.dispatch_event(ContextKeyboardEventEnum.PRESS.value, key)
 
@@ -221,3 +227,4 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext, OneDragonCustomCont
         self.btn_listener.stop()
         ContextEventBus.after_app_shutdown(self)
         OneDragonEnvContext.after_app_shutdown(self)
+        debug_image_writer.shutdown()
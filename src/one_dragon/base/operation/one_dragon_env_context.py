@@ -1,5 +1,6 @@
 from concurrent.futures import ThreadPoolExecutor
 
+from one_dragon.base.config.yaml_save_worker import yaml_save_worker
 from one_dragon.envs.env_config import EnvConfig
 from one_dragon.envs.ghproxy_service import GhProxyService
 from one_dragon.envs.git_service import GitService
@@ -40,3 +41,4 @@ class OneDragonEnvContext:
         @return:
         """
         ONE_DRAGON_CONTEXT_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        yaml_save_worker.shutdown()
@@ -0,0 +1,136 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from one_dragon.utils.log_utils import log
+
+
+class OneDragonPrefetcher:
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        """
+        一条龙中 在当前应用运行时 后台准备下一个应用或下一个实例需要的内容
+        同一时间只有一个预热任务 下一个应用开始前需要等待预热完成 避免和应用本身的初始化同时进行
+        每个预热任务由多个步骤组成 停止后不再执行剩下的步骤
+        :param executor: 运行预热的线程池
+        """
+        self._executor: ThreadPoolExecutor = executor
+        self._stop_event: threading.Event = threading.Event()
+        self._future: Optional[Future] = None
+        self._name: str = ''
+
+        self.wait_seconds: float = 0
+        """等待预热完成的总时间"""
+
+    @property
+    def stop_event(self) -> threading.Event:
+        """
+        :return: 停止事件 预热步骤内部耗时较长时可以检查
+        """
+        return self._stop_event
+
+    def start(self) -> None:
+        """
+        开始新的一次一条龙
+        :return:
+        """
+        self._stop_event.clear()
+        self._future = None
+        self._name = ''
+        self.wait_seconds = 0
+
+    def submit(self, name: str, step_list: List[Callable[[], None]]) -> None:
+        """
+        提交一个预热任务 调用前需要先等待上一个任务完成
+        :param name: 任务名称 用于日志
+        :param step_list: 预热步骤
+        :return:
+        """
+        if self._stop_event.is_set() or len(step_list) == 0:
+            return
+        self._name = name
+        self._future = self._executor.submit(self._run, name, step_list)
+
+    def _run(self, name: str, step_list: List[Callable[[], None]]) -> None:
+        start_time = time.time()
+        for step in step_list:
+            if self._stop_event.is_set():
+                log.debug('预热已取消 %s', name)
+                return
+            try:
+                step()
+            except Exception:
+                log.error('预热失败 %s', name, exc_info=True)
+        log.debug('预热完成 %s 耗时 %.2f秒', name, time.time() - start_time)
+
+    def wait(self) -> None:
+        """
+        等待当前的预热任务完成
+        :return:
+        """
+        future = self._future
+        if future is None:
+            return
+        self._future = None
+        if future.done():
+            return
+
+        start_time = time.time()
+        try:
+            future.result()
+        except Exception:
+            log.error('预热失败 %s', self._name, exc_info=True)
+        self.wait_seconds += time.time() - start_time
+
+    def cancel(self) -> None:
+        """
+        停止预热 已经开始的步骤会继续执行完
+        :return:
+        """
+        self._stop_event.set()
+        future = self._future
+        if future is not None:
+            future.cancel()
+
+
+def __debug_timing(app_cnt: int = 5, prepare_seconds: float = 0.3, run_seconds: float = 0.5):
+    """
+    使用只会等待的假应用 对比串行准备和预热时 应用之间的间隔
+    每个应用开始前需要准备 prepare_seconds 运行需要 run_seconds
+    """
+    prepared: set[int] = set()
+    lock = threading.Lock()
+
+    def prepare(idx: int) -> None:
+        with lock:
+            if idx in prepared:
+                return
+        time.sleep(prepare_seconds)
+        with lock:
+            prepared.add(idx)
+
+    def run_all(prefetcher: Optional[OneDragonPrefetcher]) -> float:
+        prepared.clear()
+        gap = 0
+        for idx in range(app_cnt):
+            start_time = time.time()
+            if prefetcher is not None:
+                prefetcher.wait()
+                if idx + 1 < app_cnt:
+                    prefetcher.submit('app %d' % (idx + 1), [lambda i=idx + 1: prepare(i)])
+            prepare(idx)
+            gap += time.time() - start_time
+            time.sleep(run_seconds)
+        return gap
+
+    executor = ThreadPoolExecutor(thread_name_prefix='debug_prefetch', max_workers=1)
+    print('串行准备 应用间隔共 %.2f秒' % run_all(None))
+    p = OneDragonPrefetcher(executor)
+    p.start()
+    print('后台预热 应用间隔共 %.2f秒' % run_all(p))
+    executor.shutdown()
+
+
+if __name__ == '__main__':
+    __debug_timing()
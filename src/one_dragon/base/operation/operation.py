@@ -90,6 +90,12 @@ class Operation(OperationBase):
         self.last_screenshot: Optional[MatLike] = None
         """上一次的截图 用于出错时保存"""
 
+        self.last_screenshot_seq: int = -1
+        """上一次截图的帧序号 -1为未知"""
+
+        self.last_screenshot_change_score: float = 255
+        """上一次截图与再上一帧的差异 0~255 未知时为255"""
+
         self.param_start_node: OperationNode = None
         """入参的开始节点 当网络存在环时 需要自己指定"""
 
@@ -479,6 +485,14 @@ class Operation(OperationBase):
         """
         screen = self.ctx.controller.screenshot()
         self.last_screenshot = screen
+
+        frame = self.ctx.controller.screenshot_history.latest()
+        if frame is not None and frame.image is screen:  # 其它线程可能已经有新的截图
+            self.last_screenshot_seq = frame.seq
+            self.last_screenshot_change_score = frame.change_score
+        else:
+            self.last_screenshot_seq = -1
+            self.last_screenshot_change_score = 255
         return self.last_screenshot
 
     def save_screenshot(self, prefix: Optional[str] = None) -> str:
@@ -828,7 +842,7 @@ class Operation(OperationBase):
         self.ctx.screen_loader.update_current_screen_name(current_screen_name)
         if current_screen_name is None:
             return self.round_retry(Operation.STATUS_SCREEN_UNKNOWN, wait=retry_wait, wait_round_time=retry_wait_round)
-        log.debug(f'当前识别画面 {current_screen_name}')
+        log.debug('当前识别画面 %s', current_screen_name)
         if current_screen_name == screen_name:
             return self.round_success(current_screen_name, wait=success_wait, wait_round_time=success_wait_round)
 
@@ -0,0 +1,142 @@
+import threading
+import weakref
+from typing import Optional
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.base.matcher.match_result import MatchResultList
+from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.template_info import TemplateInfo
+from one_dragon.base.screen.template_loader import TemplateLoader
+from one_dragon.utils import cv2_utils, str_utils
+from one_dragon.utils.i18_utils import gt
+from one_dragon.utils.log_utils import log
+
+
+class ScreenAreaMatcher:
+
+    def __init__(self, area: ScreenArea, template_loader: TemplateLoader):
+        """
+        编译后的区域识别 每次识别不需要重复的准备工作
+        - 文本区域 预先翻译目标文本 编译最长公共子序列的模式 准备颜色范围和膨胀核
+        - 模板区域 预先拼好模板的key 只有模板重新加载后才重新获取图片和掩码
+        颜色筛选使用每个线程独立的缓冲区 返回的图片在下一次识别前有效
+        不持有区域对象 区域重新加载后会生成新的识别器
+        :param area: 区域
+        :param template_loader: 模板加载器
+        """
+        self.rect: Rect = area.rect
+        self.pc_alt: bool = area.pc_alt
+
+        self.is_text_area: bool = area.is_text_area
+        self.text: str = gt(area.text) if self.is_text_area else ''
+        self.lcs_percent: float = area.lcs_percent
+        self._text_pattern: Optional[str_utils.LcsPatternSet] = None
+        if len(self.text) > 0:
+            self._text_pattern = str_utils.get_lcs_pattern_set((self.text.lower(),))
+
+        self._color_lower: Optional[np.ndarray] = None
+        self._color_upper: Optional[np.ndarray] = None
+        if area.color_range is not None:
+            self._color_lower = np.array(area.color_range[0], dtype=np.uint8)
+            self._color_upper = np.array(area.color_range[1], dtype=np.uint8)
+        self._dilate_kernel: np.ndarray = np.ones((2, 2), np.uint8)  # 与 cv2_utils.dilate(mask, 2) 一致
+
+        self.is_template_area: bool = area.is_template_area
+        self.template_sub_dir: str = area.template_sub_dir
+        self.template_id: str = area.template_id
+        self.template_match_threshold: float = area.template_match_threshold
+        self._template_loader: TemplateLoader = template_loader
+        self._template_key: str = '%s:%s' % (area.template_sub_dir, area.template_id)
+        self._template_info: Optional[TemplateInfo] = None
+        self._template_raw: Optional[MatLike] = None
+        self._template_mask: Optional[MatLike] = None
+
+        self._local = threading.local()  # 颜色筛选的缓冲区
+
+    def crop(self, screen: MatLike) -> MatLike:
+        """
+        裁剪出区域部分
+        :param screen: 游戏截图
+        :return:
+        """
+        return cv2_utils.crop_image_only(screen, self.rect)
+
+    def get_ocr_image(self, part: MatLike) -> MatLike:
+        """
+        按颜色范围筛选后 用于OCR的图片
+        :param part: 区域部分的图片
+        :return: 没有颜色范围时返回原图 否则返回缓冲区
+        """
+        if self._color_lower is None:
+            return part
+
+        h, w = part.shape[:2]
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer[0].shape[:2] != (h, w) or buffer[2].shape != part.shape:
+            buffer = (np.empty((h, w), dtype=np.uint8),
+                      np.empty((h, w), dtype=np.uint8),
+                      np.empty(part.shape, dtype=np.uint8))
+            self._local.buffer = buffer
+        mask, dilated, to_ocr = buffer
+
+        cv2.inRange(part, self._color_lower, self._color_upper, dst=mask)
+        cv2.dilate(mask, self._dilate_kernel, dst=dilated, iterations=1)
+        to_ocr.fill(0)  # 带掩码时只会写入掩码内的像素
+        cv2.bitwise_and(part, part, dst=to_ocr, mask=dilated)
+        return to_ocr
+
+    def match_text(self, ocr_result: str) -> bool:
+        """
+        OCR结果是否与区域的文本匹配 与 str_utils.find_by_lcs 的结果一致
+        :param ocr_result: OCR结果
+        :return:
+        """
+        if self._text_pattern is None or ocr_result is None or len(ocr_result) == 0:
+            return False
+        return self._text_pattern.lcs_length(ocr_result.lower())[0] >= len(self.text) * self.lcs_percent
+
+    def match_template(self, part: MatLike) -> MatchResultList:
+        """
+        在区域部分中匹配模板 与 TemplateMatcher.match_template 的结果一致
+        :param part: 区域部分的图片
+        :return:
+        """
+        template = self._template_loader.template.get(self._template_key)
+        if template is None:
+            template = self._template_loader.get_template(self.template_sub_dir, self.template_id)
+        if template is None:
+            log.error('未加载模板 %s' % self.template_id)
+            return MatchResultList()
+
+        if template is not self._template_info:  # 模板重新加载过
+            self._template_info = template
+            self._template_raw = template.raw
+            self._template_mask = template.mask
+
+        return cv2_utils.match_template(part, self._template_raw, self.template_match_threshold,
+                                        mask=self._template_mask, only_best=True, ignore_inf=True)
+
+
+_area_2_matcher: weakref.WeakKeyDictionary[ScreenArea, ScreenAreaMatcher] = weakref.WeakKeyDictionary()
+_matcher_lock = threading.Lock()
+
+
+def get_area_matcher(area: ScreenArea, template_loader: TemplateLoader) -> ScreenAreaMatcher:
+    """
+    获取区域编译后的识别器 第一次使用时编译
+    :param area: 区域
+    :param template_loader: 模板加载器
+    :return:
+    """
+    matcher = _area_2_matcher.get(area)
+    if matcher is None:
+        with _matcher_lock:
+            matcher = _area_2_matcher.get(area)
+            if matcher is None:
+                matcher = ScreenAreaMatcher(area, template_loader)
+                _area_2_matcher[area] = matcher
+    return matcher
@@ -24,7 +24,7 @@ class ScreenInfo(YamlOperator):
         if create_new:
             YamlOperator.__init__(self)
         else:
-            YamlOperator.__init__(self, self.get_yml_file_path())
+            YamlOperator.__init__(self, self.get_yml_file_path(), use_cache=True)
             self._init_from_data()
 
     @staticmethod
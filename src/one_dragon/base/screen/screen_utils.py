@@ -1,5 +1,4 @@
 import cv2
-import numpy as np
 from cv2.typing import MatLike
 from enum import Enum
 from typing import Optional, List
@@ -7,6 +6,7 @@ from typing import Optional, List
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
 from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_area_matcher import get_area_matcher
 from one_dragon.base.screen.screen_info import ScreenInfo
 from one_dragon.utils import cv2_utils, str_utils
 from one_dragon.utils.i18_utils import gt
@@ -51,31 +51,21 @@ def find_area_in_screen(ctx: OneDragonContext, screen: MatLike, area: ScreenArea
     if area is None:
         return FindAreaResultEnum.AREA_NO_CONFIG
 
+    matcher = get_area_matcher(area, ctx.template_loader)
     find: bool = False
-    if area.is_text_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
-
-        if area.color_range is None:
-            to_ocr = part
-        else:
-            mask = cv2.inRange(part,
-                               np.array(area.color_range[0], dtype=np.uint8),
-                               np.array(area.color_range[1], dtype=np.uint8))
-            mask = cv2_utils.dilate(mask, 2)
-            to_ocr = cv2.bitwise_and(part, part, mask=mask)
+    if matcher.is_text_area:
+        part = matcher.crop(screen)
+        to_ocr = matcher.get_ocr_image(part)
 
         ocr_result_map = ctx.ocr.run_ocr(to_ocr)
         for ocr_result, mrl in ocr_result_map.items():
-            if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
+            if matcher.match_text(ocr_result):
                 find = True
                 break
-    elif area.is_template_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
+    elif matcher.is_template_area:
+        part = matcher.crop(screen)
 
-        mrl = ctx.tm.match_template(part, area.template_sub_dir, area.template_id,
-                                    threshold=area.template_match_threshold)
+        mrl = matcher.match_template(part)
         find = mrl.max is not None
 
     return FindAreaResultEnum.TRUE if find else FindAreaResultEnum.FALSE
@@ -93,14 +83,14 @@ def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str
     area: ScreenArea = ctx.screen_loader.get_area(screen_name, area_name)
     if area is None:
         return OcrClickResultEnum.AREA_NO_CONFIG
-    if area.is_text_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
+    matcher = get_area_matcher(area, ctx.template_loader)
+    if matcher.is_text_area:
+        part = matcher.crop(screen)
         # cv2_utils.show_image(part, win_name='debug')
 
         ocr_result_map = ctx.ocr.run_ocr(part)
         for ocr_result, mrl in ocr_result_map.items():
-            if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
+            if matcher.match_text(ocr_result):
                 to_click = mrl.max.center + area.left_top
                 if ctx.controller.click(to_click, pc_alt=area.pc_alt):
                     return OcrClickResultEnum.OCR_CLICK_SUCCESS
@@ -108,12 +98,11 @@ def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str
                     return OcrClickResultEnum.OCR_CLICK_FAIL
 
         return OcrClickResultEnum.OCR_CLICK_NOT_FOUND
-    elif area.is_template_area:
+    elif matcher.is_template_area:
         rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
+        part = matcher.crop(screen)
 
-        mrl = ctx.tm.match_template(part, area.template_sub_dir, area.template_id,
-                                    threshold=area.template_match_threshold)
+        mrl = matcher.match_template(part)
         if mrl.max is None:
             return OcrClickResultEnum.OCR_CLICK_NOT_FOUND
         elif ctx.controller.click(mrl.max.center + rect.left_top, pc_alt=area.pc_alt):
@@ -117,7 +117,8 @@ def mark_area_as_color(image: MatLike, pos: List, color, new_image: bool = False
 
 def match_template(source: MatLike, template: MatLike, threshold,
                    mask: np.ndarray = None, only_best: bool = True,
-                   ignore_inf: bool = False) -> MatchResultList:
+                   ignore_inf: bool = False,
+                   merge_distance: float = 10) -> MatchResultList:
     """
     在原图中匹配模板 注意无法从负偏移量开始匹配 即需要保证目标模板不会在原图边缘位置导致匹配不到
     :param source: 原图
@@ -126,6 +127,7 @@ def match_template(source: MatLike, template: MatLike, threshold,
     :param mask: 掩码
     :param only_best: 只返回最好的结果
     :param ignore_inf: 是否忽略无限大的结果
+    :param merge_distance: 返回多个结果时 多少距离内的结果合并为一个 与 MatchResultList.append 一致
     :return: 所有匹配结果
     """
     tx, ty = template.shape[1], template.shape[0]
@@ -136,19 +138,68 @@ def match_template(source: MatLike, template: MatLike, threshold,
     result = cv2.matchTemplate(source, template, cv2.TM_CCOEFF_NORMED, mask=mask)
 
     match_result_list = MatchResultList(only_best=only_best)
-    filtered_locations = np.where(np.logical_and(
-        result >= threshold,
-        np.isfinite(result) if ignore_inf else np.ones_like(result))
-    )  # 过滤低置信度的匹配结果
+    if only_best:
+        valid = result >= threshold
+        if ignore_inf:
+            valid &= np.isfinite(result)
+        if np.any(valid):
+            # 置信度一样时 取行优先的第一个
+            y, x = np.unravel_index(int(np.argmax(np.where(valid, result, -np.inf))), result.shape)
+            match_result_list.append(MatchResult(result[y, x], x, y, tx, ty))
+        return match_result_list
 
-    # 遍历所有匹配结果，并输出位置和置信度
-    for pt in zip(*filtered_locations[::-1]):
-        confidence = result[pt[1], pt[0]]  # 获取置信度
-        match_result_list.append(MatchResult(confidence, pt[0], pt[1], tx, ty))
+    valid = result >= threshold
+    if ignore_inf:
+        valid &= np.isfinite(result)
+    ys, xs = np.nonzero(valid)  # 行优先 与原来逐个加入的顺序一致
+    merged = merge_points(xs.tolist(), ys.tolist(), result[ys, xs].tolist(), merge_distance)
+    match_result_list.extend([MatchResult(c, x, y, tx, ty) for x, y, c in merged])
 
     return match_result_list
 
 
+def merge_points(xs: List[int], ys: List[int], scores: List[float],
+                 merge_distance: float = 10) -> List[List]:
+    """
+    按顺序逐个合并点 结果与逐个调用 MatchResultList.append 完全一致
+    - 与已有结果中 最早加入的、距离在 merge_distance 内的结果合并 置信度更高时移动到新的点
+    - 没有可以合并的结果时 成为新的结果
+    已有结果按 merge_distance 大小的网格索引 每个点只需要检查周围的格子 不需要遍历全部结果
+    :param xs: 横坐标
+    :param ys: 纵坐标
+    :param scores: 置信度
+    :param merge_distance: 多少距离内合并
+    :return: 按加入顺序的结果 每个为 [x, y, 置信度]
+    """
+    result: List[List] = []
+    cell_size = max(1, int(np.ceil(merge_distance)))
+    cell_2_idx: dict[tuple[int, int], List[int]] = {}  # 格子 -> 当前位置在格子中的结果下标
+    merge_distance_2 = merge_distance ** 2
+
+    for x, y, score in zip(xs, ys, scores):
+        cx, cy = x // cell_size, y // cell_size
+        target: int = -1
+        for gx in range(cx - 1, cx + 2):
+            for gy in range(cy - 1, cy + 2):
+                for idx in cell_2_idx.get((gx, gy), ()):
+                    if (target == -1 or idx < target) and \
+                            (result[idx][0] - x) ** 2 + (result[idx][1] - y) ** 2 <= merge_distance_2:
+                        target = idx
+
+        if target == -1:
+            cell_2_idx.setdefault((cx, cy), []).append(len(result))
+            result.append([x, y, score])
+        elif score > result[target][2]:
+            old = result[target]
+            old_cell = (old[0] // cell_size, old[1] // cell_size)
+            if old_cell != (cx, cy):
+                cell_2_idx[old_cell].remove(target)
+                cell_2_idx.setdefault((cx, cy), []).append(target)
+            old[0], old[1], old[2] = x, y, score
+
+    return result
+
+
 def concat_vertically(img: MatLike, next_img: MatLike, decision_height: int = 150):
     """
     垂直拼接图片。
@@ -762,3 +813,33 @@ def color_in_range(img: MatLike, lower: List[int], upper: List[int],
         return part
     else:
         return connection_erase(part, noise_threshold)
+
+
+def __debug_merge_points():
+    """
+    使用稠密的合成得分图 对比逐点合并和 merge_points 的结果与耗时 两者需要完全一致
+    """
+    import time
+    rng = np.random.default_rng(0)
+    score_map = cv2.GaussianBlur(rng.random((1000, 1000), dtype=np.float32), (0, 0), 3)
+    score_map = cv2.normalize(score_map, None, 0, 1, cv2.NORM_MINMAX)
+    threshold = 0.6
+
+    t1 = time.time()
+    old_list = MatchResultList(only_best=False)
+    for pt in zip(*np.where(score_map >= threshold)[::-1]):
+        old_list.append(MatchResult(score_map[pt[1], pt[0]], pt[0], pt[1], 10, 10))
+    t2 = time.time()
+    py, px = np.nonzero(score_map >= threshold)
+    merged = merge_points(px.tolist(), py.tolist(), score_map[py, px].tolist())
+    t3 = time.time()
+
+    same = len(merged) == len(old_list) and all(
+        (m[0], m[1], m[2]) == (int(o.x), int(o.y), float(o.confidence)) for m, o in zip(merged, old_list))
+    print('高于阈值的点 %d' % int(np.sum(score_map >= threshold)))
+    print('逐点合并 结果 %d 耗时 %.4f秒' % (len(old_list), t2 - t1))
+    print('merge_points 结果 %d 耗时 %.4f秒 与逐点合并一致 %s' % (len(merged), t3 - t2, same))
+
+
+if __name__ == '__main__':
+    __debug_merge_points()
@@ -0,0 +1,407 @@
+import atexit
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+
+
+class ImageEncoder:
+
+    FORMAT_PNG: str = 'png'
+    FORMAT_WEBP: str = 'webp'
+    FORMAT_NPY: str = 'npy'
+
+    def __init__(self, image_format: str = FORMAT_PNG, png_compression: int = 1, webp_quality: int = 100):
+        """
+        图片的编码方式
+        :param image_format: 格式 png / webp / npy
+        :param png_compression: png的压缩等级 0~9 越大越慢
+        :param webp_quality: webp的质量 1~100 大于100时为无损
+        """
+        self.image_format: str = image_format
+        self.png_compression: int = png_compression
+        self.webp_quality: int = webp_quality
+
+    @property
+    def suffix(self) -> str:
+        return '.' + self.image_format
+
+    def get_file_path(self, file_path: str) -> str:
+        """
+        按编码格式替换文件后缀
+        :param file_path: 原文件路径
+        :return:
+        """
+        return os.path.splitext(file_path)[0] + self.suffix
+
+    def write(self, image: MatLike, file_path: str) -> None:
+        """
+        编码并写入文件
+        :param image: RGB格式的图片
+        :param file_path: 文件路径 后缀需与格式一致
+        :return:
+        """
+        if self.image_format == ImageEncoder.FORMAT_NPY:  # 原始数据 不做颜色转换
+            np.save(file_path, image)
+            return
+
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        if self.image_format == ImageEncoder.FORMAT_WEBP:
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.webp_quality]
+        else:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        if not cv2.imwrite(file_path, image, params):
+            raise IOError(f'图片编码或写入失败 {file_path}')
+
+
+class DebugImageTask:
+
+    def __init__(self, file_path: str, image: MatLike, encoder: ImageEncoder,
+                 quota_dir: Optional[str], quota: int,
+                 after_write: Optional[Callable[[], None]] = None):
+        """
+        一个待写入的图片
+        """
+        self.file_path: str = file_path
+        self.image: MatLike = image
+        self.encoder: ImageEncoder = encoder
+        self.quota_dir: Optional[str] = quota_dir
+        self.quota: int = quota
+        self.after_write: Optional[Callable[[], None]] = after_write
+        self.submit_time: float = time.time()
+
+
+class DebugImageWriter:
+
+    DROP_NEWEST: str = 'drop_newest'
+    DROP_OLDEST: str = 'drop_oldest'
+
+    def __init__(self, max_queue_size: int = 32, drop_policy: str = DROP_NEWEST):
+        """
+        调试图片、样本图片的异步写入
+        编码和写入由后台线程完成 调用方只需要复制一份图片
+        队列满时按丢弃策略丢弃 需要保证写入的图片可以阻塞等待队列有空位
+        :param max_queue_size: 队列最大长度
+        :param drop_policy: 队列满时的丢弃策略 丢弃新提交的 或 丢弃最早提交的
+        """
+        self.enabled: bool = True
+        """是否启用异步写入 关闭时调用方同步写入"""
+
+        self.max_queue_size: int = max_queue_size
+        """队列最大长度"""
+
+        self.drop_policy: str = drop_policy
+        """队列满时的丢弃策略"""
+
+        self.default_encoder: ImageEncoder = ImageEncoder()
+        """没有指定编码方式时使用"""
+
+        self.submit_cnt: int = 0
+        """提交的图片数量"""
+
+        self.write_cnt: int = 0
+        """写入的图片数量"""
+
+        self.drop_cnt: int = 0
+        """队列满时丢弃的图片数量"""
+
+        self.error_cnt: int = 0
+        """写入失败的图片数量"""
+
+        self.remove_cnt: int = 0
+        """超出目录配额后删除的文件或文件夹数量"""
+
+        self.total_latency: float = 0
+        """从提交到写入完成的总耗时"""
+
+        self.max_latency: float = 0
+        """从提交到写入完成的最长耗时"""
+
+        self._queue: deque[DebugImageTask] = deque()
+        self._writing_path: Optional[str] = None  # 后台线程正在写入的文件
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._quota_lock = threading.Lock()
+        self._quota_dir_2_entries: dict[str, OrderedDict[str, None]] = {}  # 配额目录 -> 按时间排序的 由本写入器创建的子项
+        self._thread: Optional[threading.Thread] = None
+        self._running: bool = False
+
+    def submit(self, image: MatLike, file_path: str,
+               encoder: Optional[ImageEncoder] = None,
+               quota_dir: Optional[str] = None, quota: int = 0,
+               block: bool = False,
+               after_write: Optional[Callable[[], None]] = None) -> str:
+        """
+        提交一张待写入的图片
+        :param image: RGB格式的图片 会复制一份 调用方之后可以修改
+        :param file_path: 文件路径 后缀会按编码方式替换
+        :param encoder: 编码方式 不传入时使用默认
+        :param quota_dir: 配额目录 写入后只保留这个目录下由本写入器创建的最新若干个子项 子项可以是文件或文件夹 其它内容不会被删除
+        :param quota: 配额目录下最多保留的子项数量 0为不限制
+        :param block: 队列满时是否等待 不会被丢弃
+        :param after_write: 图片写入成功后 在写入线程中执行 例如写入同一个文件夹下的其它文件
+        :return: 实际写入的文件路径
+        """
+        if encoder is None:
+            encoder = self.default_encoder
+        task = DebugImageTask(encoder.get_file_path(file_path), image.copy(), encoder, quota_dir, quota,
+                              after_write=after_write)
+
+        if not self.enabled:
+            self._write(task)
+            return task.file_path
+
+        with self._cond:
+            self.submit_cnt += 1
+            if len(self._queue) >= self.max_queue_size:
+                if block:
+                    while self._running and len(self._queue) >= self.max_queue_size:
+                        self._cond.wait()
+                elif self.drop_policy == DebugImageWriter.DROP_OLDEST:
+                    self._queue.popleft()
+                    self.drop_cnt += 1
+                else:
+                    self.drop_cnt += 1
+                    return task.file_path
+            self._queue.append(task)
+            self._ensure_thread()
+            self._cond.notify_all()
+
+        return task.file_path
+
+    def flush(self, file_path: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        等待图片写入完成
+        :param file_path: 文件路径 不传入时等待全部图片
+        :param timeout: 最多等待的秒数 不传入时一直等待
+        :return: 是否已经写入完成
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._is_pending(file_path), timeout)
+
+    def _is_pending(self, file_path: Optional[str]) -> bool:
+        """
+        需要持有锁时调用 是否还有未写入的图片
+        :param file_path: 文件路径 为空时判断全部图片
+        :return:
+        """
+        if not self._running:
+            return False
+        if file_path is None:
+            return len(self._queue) > 0 or self._writing_path is not None
+        if self._writing_path == file_path:
+            return True
+        for task in self._queue:
+            if task.file_path == file_path:
+                return True
+        return False
+
+    def shutdown(self) -> None:
+        """
+        写入队列中剩余的图片 并停止后台线程
+        :return:
+        """
+        if not self.enabled:  # 已经停止
+            return
+        self.flush()
+        with self._cond:
+            self.enabled = False
+            self._running = False
+            to_write = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+
+        for task in to_write:  # 后台线程已经退出时 由当前线程写入
+            self._write(task)
+
+        if self.submit_cnt > 0:
+            log.info('调试图片写入统计 %s', self.get_stats_str())
+
+    def get_stats_str(self) -> str:
+        """
+        :return: 统计信息
+        """
+        with self._cond:
+            avg_latency = self.total_latency / self.write_cnt if self.write_cnt > 0 else 0
+            return ('提交 %d 写入 %d 丢弃 %d 失败 %d 轮换删除 %d 平均耗时 %.3f秒 最长耗时 %.3f秒' %
+                    (self.submit_cnt, self.write_cnt, self.drop_cnt, self.error_cnt, self.remove_cnt,
+                     avg_latency, self.max_latency))
+
+    def _ensure_thread(self) -> None:
+        """
+        需要持有锁时调用 确保后台线程已经启动
+        :return:
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='debug_image_writer', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """
+        后台线程 按提交顺序写入图片
+        :return:
+        """
+        while True:
+            with self._cond:
+                while self._running and len(self._queue) == 0:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                task = self._queue.popleft()
+                self._writing_path = task.file_path
+                self._cond.notify_all()  # 通知等待队列空位的提交方
+
+            self._write(task)
+
+            with self._cond:
+                self._writing_path = None
+                self._cond.notify_all()
+
+    def _write(self, task: DebugImageTask) -> None:
+        """
+        写入一张图片 并按配额删除旧的子项
+        :param task: 待写入的图片
+        :return:
+        """
+        entry_existed = False  # 写入前配额目录下的子项是否已经存在 已经存在的文件夹不是本写入器创建的
+        if task.quota_dir is not None and task.quota > 0:
+            entry_path = DebugImageWriter._get_quota_entry_path(task.quota_dir, task.file_path)
+            entry_existed = entry_path is not None and os.path.isdir(entry_path)
+
+        try:
+            os.makedirs(os.path.dirname(task.file_path), exist_ok=True)  # 所在目录可能已经被轮换删除
+            task.encoder.write(task.image, task.file_path)
+            if task.after_write is not None:
+                task.after_write()
+        except Exception:
+            log.error(f'图片写入失败 {task.file_path}', exc_info=True)
+            with self._cond:
+                self.error_cnt += 1
+            return
+
+        latency = time.time() - task.submit_time
+        with self._cond:
+            self.write_cnt += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+        if task.quota_dir is not None and task.quota > 0:
+            self._rotate(task.quota_dir, task.quota, task.file_path, entry_existed)
+
+    @staticmethod
+    def _get_quota_entry_path(quota_dir: str, file_path: str) -> Optional[str]:
+        """
+        :param quota_dir: 配额目录
+        :param file_path: 文件路径
+        :return: 文件所在的 配额目录下的子项 不在配额目录下时返回None
+        """
+        rel_path = os.path.relpath(file_path, quota_dir)
+        if rel_path.startswith('..'):
+            return None
+        return os.path.join(quota_dir, rel_path.split(os.sep)[0])
+
+    def _rotate(self, quota_dir: str, quota: int, file_path: str, entry_existed: bool) -> None:
+        """
+        配额目录下 由本写入器创建的子项超出配额时 删除最早的子项
+        创建过的子项按顺序记录在清单文件中 重新启动后可以继续轮换
+        手动放入的文件、写入前已经存在的文件夹都不会记录 也就不会被删除
+        :param quota_dir: 配额目录
+        :param quota: 最多保留的子项数量
+        :param file_path: 刚写入的文件路径
+        :param entry_existed: 写入前子项文件夹是否已经存在
+        :return:
+        """
+        entry_path = DebugImageWriter._get_quota_entry_path(quota_dir, file_path)
+        if entry_path is None:
+            return
+        entry = os.path.basename(entry_path)
+        is_dir_entry = os.path.normpath(entry_path) != os.path.normpath(file_path)
+        manifest_path = DebugImageWriter._get_quota_manifest_path(quota_dir)
+
+        with self._quota_lock:
+            entries = self._quota_dir_2_entries.get(quota_dir)
+            if entries is None:
+                entries = self._load_quota_manifest(quota_dir)
+                self._quota_dir_2_entries[quota_dir] = entries
+
+            if entry not in entries:
+                if is_dir_entry and entry_existed:  # 不是本写入器创建的文件夹
+                    return
+                entries[entry] = None
+                try:
+                    with open(manifest_path, 'a', encoding='utf-8') as file:
+                        file.write(entry + '\n')
+                except Exception:
+                    log.error(f'写入清单失败 {manifest_path}', exc_info=True)
+
+            while len(entries) > quota:
+                oldest, _ = entries.popitem(last=False)
+                oldest_path = os.path.join(quota_dir, oldest)
+                try:
+                    if os.path.isdir(oldest_path):
+                        shutil.rmtree(oldest_path)
+                    elif os.path.exists(oldest_path):
+                        os.remove(oldest_path)
+                    self.remove_cnt += 1
+                except Exception:
+                    log.error(f'删除旧文件失败 {oldest_path}', exc_info=True)
+
+    @staticmethod
+    def _get_quota_manifest_path(quota_dir: str) -> str:
+        """
+        配额目录的清单文件 统一放在 .debug/.quota 下 不放在配额目录中 避免读取样本时列出清单文件
+        :param quota_dir: 配额目录
+        :return: 清单文件路径
+        """
+        work_dir = os_utils.get_work_dir()
+        rel_path = os.path.relpath(os.path.abspath(quota_dir), work_dir)
+        if rel_path.startswith('..'):  # 不在工作目录下时 使用绝对路径区分
+            rel_path = os.path.abspath(quota_dir)
+        key = hashlib.md5(os.path.normcase(os.path.normpath(rel_path)).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(os_utils.get_path_under_work_dir('.debug', '.quota'),
+                            f'{os.path.basename(os.path.normpath(quota_dir))}_{key}.txt')
+
+    @staticmethod
+    def _load_quota_manifest(quota_dir: str) -> OrderedDict[str, None]:
+        """
+        读取配额目录的清单 只保留仍然存在的子项 有已经删除的子项时重写清单
+        :param quota_dir: 配额目录
+        :return: 按创建顺序的子项
+        """
+        entries: OrderedDict[str, None] = OrderedDict()
+        manifest_path = DebugImageWriter._get_quota_manifest_path(quota_dir)
+        if not os.path.exists(manifest_path):
+            return entries
+
+        line_cnt: int = 0
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    line_cnt += 1
+                    entry = line.strip()
+                    if len(entry) > 0 and os.path.exists(os.path.join(quota_dir, entry)):
+                        entries[entry] = None
+                        entries.move_to_end(entry)
+            if line_cnt != len(entries):
+                with open(manifest_path, 'w', encoding='utf-8') as file:
+                    file.writelines(entry + '\n' for entry in entries)
+        except Exception:
+            log.error(f'读取清单失败 {manifest_path}', exc_info=True)
+        return entries
+
+
+debug_image_writer = DebugImageWriter()
+atexit.register(debug_image_writer.shutdown)
@@ -3,12 +3,15 @@ import time
 from functools import lru_cache
 from typing import Optional
 
-import cv2
 from cv2.typing import MatLike
 
 from one_dragon.utils import os_utils, cv2_utils
+from one_dragon.utils.debug_image_writer import debug_image_writer
 from one_dragon.utils.log_utils import log
 
+DEBUG_IMAGE_QUOTA: int = 2000
+"""调试图片目录下最多保留的图片数量"""
+
 
 @lru_cache
 def get_debug_dir_path() -> str:
@@ -29,9 +32,16 @@ def get_debug_image(filename, suffix: str = '.png') -> MatLike:
 
 
 def save_debug_image(image, file_name: Optional[str] = None, prefix: str = '') -> str:
+    """
+    保存调试图片 由后台线程写入
+    :param image: RGB格式的图片
+    :param file_name: 文件名 不含后缀
+    :param prefix: 没有文件名时 使用的文件名前缀
+    :return: 文件名
+    """
     if file_name is None:
         file_name = '%s_%d' % (prefix, round(time.time() * 1000))
-    path = get_debug_image_path(file_name)
+    path = debug_image_writer.submit(image, get_debug_image_path(file_name),
+                                     quota_dir=get_debug_image_dir_path(), quota=DEBUG_IMAGE_QUOTA)
     log.debug('临时图片保存 %s', path)
-    cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
     return file_name
@@ -0,0 +1,34 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class LazyProvider(Generic[T]):
+
+    def __init__(self, factory: Callable[[], T]):
+        """
+        第一次使用时才创建的对象 多个线程同时使用时只会创建一次
+        :param factory: 创建对象的方法
+        """
+        self._factory: Callable[[], T] = factory
+        self._value: Optional[T] = None
+        self._loaded: bool = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> T:
+        """
+        获取对象 未创建时在当前线程创建
+        :return:
+        """
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                self._value = self._factory()
+                self._loaded = True
+        return self._value
@@ -1,13 +1,150 @@
+import atexit
 import logging
 import os
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+from typing import Optional
 
 from one_dragon.utils import os_utils
 
+_LAZY_ARG_TYPES = (str, int, float, bool, type(None))
+
+
+class LazyQueueHandler(QueueHandler):
+
+    def __init__(self, max_queue_size: int = 10000):
+        """
+        把日志放入有界队列 由后台线程格式化并写入 调用方不会被磁盘阻塞
+        参数都是不可变的简单类型时 格式化也延迟到后台线程
+        队列满时 警告以下的日志直接丢弃并计数 警告及以上的日志等待队列有空位
+        :param max_queue_size: 队列最大长度
+        """
+        QueueHandler.__init__(self, queue.Queue(maxsize=max_queue_size))
+        self.drop_cnt: int = 0
+        """队列满时丢弃的日志数量"""
+
+        self._unreported_drop_cnt: int = 0
+        self._drop_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        参数中有可变对象时 先在调用方线程生成消息 避免之后被修改
+        其余情况保留原始记录 由后台线程的处理器格式化
+        """
+        if record.args:
+            args = record.args.values() if isinstance(record.args, dict) else record.args
+            if not all(isinstance(arg, _LAZY_ARG_TYPES) for arg in args):
+                record.msg = record.getMessage()
+                record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.drop_cnt += 1
+                self._unreported_drop_cnt += 1
+            return
+
+        if self._unreported_drop_cnt > 0:
+            with self._drop_lock:
+                cnt = self._unreported_drop_cnt
+                self._unreported_drop_cnt = 0
+            if cnt > 0:
+                drop_record = logging.LogRecord(record.name, logging.WARNING, record.pathname, record.lineno,
+                                                '日志队列已满 丢弃 %d 条日志', (cnt,), None)
+                self.queue.put(drop_record)
+
+
+class RepeatedLogFilter(logging.Filter):
+
+    def __init__(self, interval: float = 10, burst: int = 5, max_keys: int = 1024):
+        """
+        限制重复日志的频率 同一条消息在一个时间窗口内最多输出若干次
+        消息以原始模板和参数判断是否相同 不需要格式化
+        窗口结束后的第一条 会附带期间省略的数量 警告及以上的日志不受限制
+        :param interval: 时间窗口的秒数
+        :param burst: 一个窗口内最多输出的次数
+        :param max_keys: 最多记录多少种消息 超过时清理已过期的
+        """
+        logging.Filter.__init__(self)
+        self.interval: float = interval
+        self.burst: int = burst
+        self.max_keys: int = max_keys
+
+        self.suppress_cnt: int = 0
+        """被省略的日志数量"""
+
+        self._key_2_window: dict[tuple, list] = {}  # 消息 -> [窗口开始时间, 窗口内次数, 省略次数]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.levelno, record.msg, record.args)
+        try:
+            hash(key)
+        except TypeError:  # 参数不可哈希 不做限制
+            return True
+
+        now = record.created
+        with self._lock:
+            window = self._key_2_window.get(key)
+            if window is None or now - window[0] > self.interval:
+                suppressed = window[2] if window is not None else 0
+                if len(self._key_2_window) >= self.max_keys:
+                    self._remove_expired(now)
+                self._key_2_window[key] = [now, 1, 0]
+                if suppressed > 0:
+                    record.msg = f'{record.msg} (前{self.interval:.0f}秒内重复 {suppressed} 条已省略)'
+                return True
+
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+
+            window[2] += 1
+            self.suppress_cnt += 1
+            return False
+
+    def _remove_expired(self, now: float) -> None:
+        """
+        需要持有锁时调用 清理已过期的消息窗口
+        :param now: 当前时间
+        :return:
+        """
+        expired = [key for key, window in self._key_2_window.items() if now - window[0] > self.interval]
+        for key in expired:
+            self._key_2_window.pop(key)
+        if len(self._key_2_window) >= self.max_keys:
+            self._key_2_window.clear()
+
+
+class BlockingQueueListener(QueueListener):
+    """
+    停止时等待队列有空位再放入结束标记 队列满时也能正常停止
+    """
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+_log_listener: Optional[QueueListener] = None
+
 
 def get_logger():
+    global _log_listener
     logger = logging.getLogger('OneDragon')
     logger.handlers.clear()
+    logger.filters.clear()
     logger.setLevel(logging.INFO)
 
     formatter = logging.Formatter('[%(asctime)s.%(msecs)03d] [%(filename)s %(lineno)d] [%(levelname)s]: %(message)s', '%H:%M:%S')
@@ -16,16 +153,36 @@ def get_logger():
     archive_handler = TimedRotatingFileHandler(log_file_path, when='midnight', interval=1, backupCount=3, encoding='utf-8')
     archive_handler.setLevel(logging.INFO)
     archive_handler.setFormatter(formatter)
-    logger.addHandler(archive_handler)
 
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+
+    # 文件和控制台由后台线程写入 调用方只负责放入队列
+    if _log_listener is not None:
+        _log_listener.stop()
+    queue_handler = LazyQueueHandler()
+    queue_handler.setLevel(logging.INFO)
+    _log_listener = BlockingQueueListener(queue_handler.queue, archive_handler, console_handler, respect_handler_level=True)
+    _log_listener.start()
+    logger.addHandler(queue_handler)
+    logger.addFilter(RepeatedLogFilter())
 
     return logger
 
 
+def stop_log_listener() -> None:
+    """
+    写入队列中剩余的日志 并停止后台线程
+    :return:
+    """
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    _log_listener = None
+
+
 def set_log_level(level: int) -> None:
     """
     显示日志等级
@@ -35,6 +192,9 @@ def set_log_level(level: int) -> None:
     log.setLevel(level)
     for handler in log.handlers:
         handler.setLevel(level)
+    if _log_listener is not None:
+        for handler in _log_listener.handlers:
+            handler.setLevel(level)
 
 
 def mask_text(text: str) -> str:
@@ -52,3 +212,61 @@ def mask_text(text: str) -> str:
 
 
 log = get_logger()
+atexit.register(stop_log_listener)
+
+
+def __debug_queue_handler(total: int = 2000, write_seconds: float = 0.002, stall_every: int = 200,
+                          stall_seconds: float = 0.2):
+    """
+    对比同步写入和队列写入 每次调用的平均耗时和最长耗时
+    使用一个每次写入都会变慢 并且定期卡顿的处理器 模拟缓慢的磁盘
+    """
+
+    class SlowHandler(logging.Handler):
+
+        def __init__(self):
+            logging.Handler.__init__(self)
+            self.cnt: int = 0
+
+        def emit(self, record: logging.LogRecord) -> None:
+            self.format(record)
+            self.cnt += 1
+            time.sleep(stall_seconds if self.cnt % stall_every == 0 else write_seconds)
+
+    formatter = logging.Formatter('[%(asctime)s.%(msecs)03d] [%(filename)s %(lineno)d] [%(levelname)s]: %(message)s', '%H:%M:%S')
+
+    def run(name: str, use_queue: bool) -> None:
+        logger = logging.getLogger(f'OneDragonBenchmark-{name}')
+        logger.propagate = False
+        logger.handlers.clear()
+        logger.setLevel(logging.DEBUG)
+        slow_handler = SlowHandler()
+        slow_handler.setFormatter(formatter)
+        listener = None
+        if use_queue:
+            queue_handler = LazyQueueHandler(max_queue_size=total)
+            listener = BlockingQueueListener(queue_handler.queue, slow_handler)
+            listener.start()
+            logger.addHandler(queue_handler)
+        else:
+            logger.addHandler(slow_handler)
+
+        cost_list = []
+        for i in range(total):
+            t1 = time.perf_counter()
+            logger.debug('计算当前坐标为 %s 使用缩放 %.2f 置信度 %.2f', (i, i), 1.0, 0.9)
+            cost_list.append(time.perf_counter() - t1)
+
+        t1 = time.perf_counter()
+        if listener is not None:
+            listener.stop()
+        drain = time.perf_counter() - t1
+        print('%s 平均每次 %.1f微秒 最长 %.1f毫秒 结束时等待写入 %.2f秒' %
+              (name, sum(cost_list) / total * 1e6, max(cost_list) * 1e3, drain))
+
+    run('同步写入', False)
+    run('队列写入', True)
+
+
+if __name__ == '__main__':
+    __debug_queue_handler()
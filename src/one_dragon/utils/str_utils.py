@@ -1,5 +1,6 @@
 import difflib
 import re
+from functools import lru_cache
 from typing import Optional, List, Tuple
 
 
@@ -38,7 +39,7 @@ def find_by_lcs(source: str, target: str, percent: float = 0.3,
     source_usage = source.lower() if ignore_case else source
     target_usage = target.lower() if ignore_case else target
 
-    common_length = longest_common_subsequence_length(source_usage, target_usage)
+    common_length = longest_common_subsequence_length(source_usage, target_usage)  # source一般是固定的目标 放在前面缓存
 
     return common_length >= len(source) * percent
 
@@ -46,25 +47,77 @@ def find_by_lcs(source: str, target: str, percent: float = 0.3,
 def longest_common_subsequence_length(str1: str, str2: str) -> int:
     """
     找两个字符串的最长公共子序列长度
+    str1 会编译成位并行的模式并缓存 多次调用时应把不变的字符串放在 str1
     :param str1:
     :param str2:
     :return: 长度
     """
-    m = len(str1)
-    n = len(str2)
-
-    # 创建一个二维数组用于存储中间结果
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    return get_lcs_pattern_set((str1,)).lcs_length(str2)[0]
+
+
+class LcsPatternSet:
+
+    def __init__(self, pattern_list: Tuple[str, ...]):
+        """
+        多个模式串的位并行最长公共子序列 (Allison-Dix / Hyyrö)
+        所有模式串拼接在一个整数中 每个模式串占用 len(pattern) 位 之后跟一个保护位
+        对文本的每个字符 一次整数运算就能同时更新全部模式串的状态
+        V + U 的进位最多进入保护位 计算后清空保护位 不会影响下一个模式串
+        :param pattern_list: 模式串列表
+        """
+        self.pattern_list: Tuple[str, ...] = pattern_list
+        self.char_2_mask: dict[str, int] = {}  # 字符 -> 在所有模式串中出现的位置
+        self.segment_list: List[Tuple[int, int]] = []  # 每个模式串的 (起始位, 长度)
+
+        offset = 0
+        for pattern in pattern_list:
+            for idx, c in enumerate(pattern):
+                self.char_2_mask[c] = self.char_2_mask.get(c, 0) | (1 << (offset + idx))
+            self.segment_list.append((offset, len(pattern)))
+            offset += len(pattern) + 1
+
+        self.all_mask: int = 0
+        """所有模式串的位 不包含保护位"""
+        for start, length in self.segment_list:
+            self.all_mask |= ((1 << length) - 1) << start
+
+    def lcs_length(self, text: str) -> List[int]:
+        """
+        计算文本与每个模式串的最长公共子序列长度
+        :param text: 文本
+        :return: 与模式串列表顺序一致的长度
+        """
+        all_mask = self.all_mask
+        char_2_mask = self.char_2_mask
+        v = all_mask  # 为0的位 代表对应位置的字符已在公共子序列中
+        for c in text:
+            u = v & char_2_mask.get(c, 0)
+            v = ((v + u) | (v - u)) & all_mask
+
+        unused = ~v & all_mask
+        return [((unused >> start) & ((1 << length) - 1)).bit_count() for start, length in self.segment_list]
+
+
+@lru_cache(maxsize=1024)
+def get_lcs_pattern_set(pattern_list: Tuple[str, ...]) -> LcsPatternSet:
+    """
+    获取编译后的模式串 OCR的目标词通常是固定的 缓存后可以重复使用
+    :param pattern_list: 模式串列表
+    :return:
+    """
+    return LcsPatternSet(pattern_list)
 
-    # 动态规划求解
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if str1[i - 1] == str2[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1] + 1
-            else:
-                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
 
-    return dp[m][n]
+def longest_common_subsequence_length_batch(word: str, target_word_list: List[str]) -> List[int]:
+    """
+    一次计算一个词与多个目标词的最长公共子序列长度
+    :param word: 候选词
+    :param target_word_list: 目标词列表
+    :return: 与目标词列表顺序一致的长度
+    """
+    if len(target_word_list) == 0:
+        return []
+    return get_lcs_pattern_set(tuple(target_word_list)).lcs_length(word)
 
 
 def get_positive_digits(v: str, err: Optional[int] = None) -> Optional[int]:
@@ -115,8 +168,9 @@ def find_best_match_by_lcs(word: str, target_word_list: List[str],
     target_idx: Optional[int] = None
     target_lcs_percent: Optional[float] = None
 
+    lcs_list = longest_common_subsequence_length_batch(word, target_word_list)
     for idx, target_word in enumerate(target_word_list):
-        lcs = longest_common_subsequence_length(word, target_word)
+        lcs = lcs_list[idx]
         if lcs == 0:  # 至少要有一个匹配
             continue
         lcs_percent = lcs * 1.0 / len(target_word)
@@ -171,3 +225,58 @@ def with_chinese(s: str) -> bool:
     判断一个字符串是否包含中文
     """
     return _WITH_CHINESE_PATTERN.search(s) is not None
+
+
+def __lcs_length_dp(str1: str, str2: str) -> int:
+    """
+    原来的动态规划实现 用于校验
+    """
+    dp = [[0] * (len(str2) + 1) for _ in range(len(str1) + 1)]
+    for i in range(1, len(str1) + 1):
+        for j in range(1, len(str2) + 1):
+            if str1[i - 1] == str2[j - 1]:
+                dp[i][j] = dp[i - 1][j - 1] + 1
+            else:
+                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
+    return dp[len(str1)][len(str2)]
+
+
+def __debug_lcs(cnt: int = 20000):
+    """
+    随机字符串校验结果与动态规划一致 并对比中文词列表上的耗时
+    """
+    import random
+    import time
+
+    rnd = random.Random(0)
+    alphabet = '开拓者星穹列车黑塔空间站雅利洛贝洛伯格仙舟罗浮丹恒aAbB1 '
+    for _ in range(cnt):
+        str1 = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 20)))
+        str2 = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 20)))
+        assert longest_common_subsequence_length(str1, str2) == __lcs_length_dp(str1, str2), (str1, str2)
+
+        target_list = [''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 10))) for _ in range(rnd.randint(0, 5))]
+        expected = [__lcs_length_dp(str1, i) for i in target_list]
+        assert longest_common_subsequence_length_batch(str1, target_list) == expected, (str1, target_list)
+    print('校验通过 %d 组' % cnt)
+
+    target_list = ['黑塔空间站', '主控舱段', '基座舱段', '收容舱段', '支援舱段', '禁闭舱段',
+                   '雅利洛-VI', '行政区', '城郊雪原', '边缘通路', '残响回廊', '永冬岭', '造物之柱',
+                   '旧武器试验场', '铆钉镇', '机械聚落', '大矿区', '仙舟「罗浮」', '星槎海中枢',
+                   '流云渡', '迴星港', '长乐天', '金人巷', '太卜司', '工造司', '丹鼎司', '鳞渊境']
+    word_list = ['星搓海中枢', '残响回麻', '工造司', '金入巷', '支援舱段', '城郊雪源', '丹鼎', '鳞渊境']
+
+    t1 = time.time()
+    for _ in range(200):
+        for word in word_list:
+            [__lcs_length_dp(word, i) for i in target_list]
+    t2 = time.time()
+    for _ in range(200):
+        for word in word_list:
+            longest_common_subsequence_length_batch(word, target_list)
+    t3 = time.time()
+    print('动态规划 %.3f秒 位并行 %.3f秒' % (t2 - t1, t3 - t2))
+
+
+if __name__ == '__main__':
+    __debug_lcs()
@@ -1,13 +1,15 @@
 import time
 
-import onnxruntime as ort
 import os
 import urllib.request
 import zipfile
-from typing import Optional, List
+from typing import Optional, List, TYPE_CHECKING
 
 from one_dragon.yolo.log_utils import log
 
+if TYPE_CHECKING:
+    import onnxruntime as ort
+
 _GH_PROXY_URL = 'https://ghfast.top'
 
 
@@ -34,7 +36,7 @@ class OnnxModelLoader:
         self.gpu: bool = gpu  # 是否使用GPU加速
 
         # 从模型中读取到的输入输出信息
-        self.session: ort.InferenceSession = None
+        self.session: Optional['ort.InferenceSession'] = None
         self.input_names: List[str] = []
         self.onnx_input_width: int = 0
         self.onnx_input_height: int = 0
@@ -126,6 +128,7 @@ class OnnxModelLoader:
         加载模型
         :return:
         """
+        import onnxruntime as ort  # 加载模型时才需要 避免启动时导入
         availables = ort.get_available_providers()
         providers = ['DmlExecutionProvider' if self.gpu else 'CPUExecutionProvider']
         if self.gpu and 'DmlExecutionProvider' not in availables:
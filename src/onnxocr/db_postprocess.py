@@ -22,8 +22,6 @@ from __future__ import print_function
 import numpy as np
 import cv2
 # import paddle
-from shapely.geometry import Polygon
-import pyclipper
 
 
 class DBPostProcess(object):
@@ -149,6 +147,8 @@ class DBPostProcess(object):
         return np.array(boxes, dtype="int32"), scores
 
     def unclip(self, box, unclip_ratio):
+        from shapely.geometry import Polygon  # 识别到文本框时才需要 避免加载模型时导入
+        import pyclipper
         poly = Polygon(box)
         distance = poly.area * unclip_ratio / poly.length
         offset = pyclipper.PyclipperOffset()
@@ -12,6 +12,7 @@ from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
 from one_dragon.utils import cv2_utils, cal_utils, os_utils
+from one_dragon.utils.debug_image_writer import debug_image_writer, ImageEncoder
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 from sr_od.app.sim_uni.sim_uni_const import SimUniLevelTypeEnum
@@ -28,6 +29,7 @@ from sr_od.sr_map.sr_map_def import Region
 _FLOOR_LIST = [-4, -3, -2, -1, 0, 1, 2, 3]
 
 _EXECUTOR = ThreadPoolExecutor(thread_name_prefix='sr_large_map_recorder', max_workers=32)
+PART_IMAGE_ENCODER = ImageEncoder(ImageEncoder.FORMAT_PNG)  # 格子图片之后会被读取合并 固定使用png
 
 class OverlapResultWrapper:
 
@@ -872,17 +874,19 @@ class LargeMapRecorder(SrApplication):
     @staticmethod
     def get_part_image(region: Region, row: int, col: int) -> MatLike:
         """
-        地图格子的图片
+        地图格子的图片 刚保存的图片需要等待写入完成
         """
-        return cv2_utils.read_image(LargeMapRecorder.get_part_image_path(region, row, col))
+        path = LargeMapRecorder.get_part_image_path(region, row, col)
+        debug_image_writer.flush(path)
+        return cv2_utils.read_image(path)
 
     @staticmethod
     def save_part_image(region: Region, row: int, col: int, image: MatLike) -> None:
         """
-        地图格子的图片
+        地图格子的图片 由后台线程写入 格子图片不能丢失 队列满时等待
         """
         path = LargeMapRecorder.get_part_image_path(region, row, col)
-        cv2_utils.save_image(image, path)
+        debug_image_writer.submit(image, path, encoder=PART_IMAGE_ENCODER, block=True)
 
     @staticmethod
     def get_row_image_path(region: Region, row: int) -> str:
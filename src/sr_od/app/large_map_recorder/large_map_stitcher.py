@@ -0,0 +1,327 @@
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, Future
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import List, Optional, Tuple
+
+from one_dragon.utils import cv2_utils
+from one_dragon.utils.log_utils import log
+from sr_od.sr_map.sr_map_def import Region
+
+
+def _to_gray(img: MatLike) -> MatLike:
+    """
+    转化成用于计算偏移量的灰度图
+    :param img: RGB图片
+    :return:
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
+    return gray.astype(np.float32)
+
+
+def _overlap_score(gray1: MatLike, gray2: MatLike, step: int, axis: int, min_overlap: int) -> float:
+    """
+    第二张图相对第一张图偏移 step 时 重叠部分的相似度
+    :param gray1: 第一张图
+    :param gray2: 第二张图
+    :param step: 偏移量
+    :param axis: 1=水平 0=垂直
+    :param min_overlap: 最小的重叠长度
+    :return: 相似度 无法计算时返回-1
+    """
+    size = gray1.shape[axis]
+    overlap = size - step
+    if step <= 0 or overlap < min_overlap:
+        return -1
+    if axis == 1:
+        part1 = gray1[:, step:]
+        part2 = gray2[:, :overlap]
+    else:
+        part1 = gray1[step:, :]
+        part2 = gray2[:overlap, :]
+    score = cv2.matchTemplate(part1, part2, cv2.TM_CCOEFF_NORMED)[0, 0]
+    return float(score) if np.isfinite(score) else -1
+
+
+def estimate_step(path1: str, path2: str, axis: int, min_overlap: int = 50) -> Tuple[float, float]:
+    """
+    计算两张相邻截图之间的偏移量 即第二张图的起点在第一张图中的位置
+    先用相位相关估算偏移量 再在附近用重叠部分的相似度精确定位 并用抛物线拟合得到亚像素的结果
+    放在模块层级 方便在子进程中运行 只传入路径 避免在进程间传输图片
+    :param path1: 第一张图的路径 左边或上边
+    :param path2: 第二张图的路径 右边或下边
+    :param axis: 1=水平 0=垂直
+    :param min_overlap: 最小的重叠长度
+    :return: 偏移量, 重叠部分的相似度 失败时返回 -1, -1
+    """
+    img1 = cv2_utils.read_image(path1)
+    img2 = cv2_utils.read_image(path2)
+    if img1 is None or img2 is None or img1.shape != img2.shape:
+        return -1, -1
+
+    gray1 = _to_gray(img1)
+    gray2 = _to_gray(img2)
+    if np.std(gray1) < 1 or np.std(gray2) < 1:  # 空白图 无法计算
+        return -1, -1
+
+    height, width = gray1.shape[:2]
+    size = gray1.shape[axis]
+    window = cv2.createHanningWindow((width, height), cv2.CV_32F)
+    # 传入窗口时 phaseCorrelate 会原地乘上窗口 传入副本 保证后续的相似度计算使用原图
+    shift, _ = cv2.phaseCorrelate(gray1.copy(), gray2.copy(), window)
+    # 第二张图的内容 相对第一张图向左(上)移动了 step 相位相关得到的偏移量是以图片大小为周期的
+    step = int(round(-shift[0 if axis == 1 else 1])) % size
+
+    # 在估算值附近 找重叠部分相似度最高的位置 周期性导致的方向歧义 也一并比较
+    best_step = -1
+    best_score = -1
+    score_map = {}
+    for center in {step, size - step}:
+        for candidate in range(center - 2, center + 3):
+            score = _overlap_score(gray1, gray2, candidate, axis, min_overlap)
+            score_map[candidate] = score
+            if score > best_score:
+                best_step = candidate
+                best_score = score
+
+    if best_step == -1:
+        return -1, -1
+
+    # 抛物线拟合 得到亚像素的偏移量
+    sub_step = float(best_step)
+    left = score_map.get(best_step - 1)
+    right = score_map.get(best_step + 1)
+    if left is None:
+        left = _overlap_score(gray1, gray2, best_step - 1, axis, min_overlap)
+    if right is None:
+        right = _overlap_score(gray1, gray2, best_step + 1, axis, min_overlap)
+    if left > -1 and right > -1:
+        denominator = left - 2 * best_score + right
+        if denominator < 0:
+            sub_step += 0.5 * (left - right) / denominator
+
+    return sub_step, best_score
+
+
+class LargeMapStitcher:
+
+    def __init__(self, region_list: List[Region], max_row: int, max_col: int,
+                 min_score: float = 0.8,
+                 blend: bool = False,
+                 max_workers: Optional[int] = None):
+        """
+        大地图截图的离线拼接
+        读取 LargeMapRecorder 保存的格子截图 用相位相关计算各行各列的偏移量 再按位置写入预先分配的画布
+        多个楼层使用同一个网格 偏移量一起投票
+        :param region_list: 需要拼接的区域 通常是同一个区域的各个楼层
+        :param max_row: 最大行数
+        :param max_col: 最大列数
+        :param min_score: 重叠部分的相似度低于这个值时 不参与投票
+        :param blend: 是否在重叠部分做渐变融合 否则后面的格子直接覆盖前面的
+        :param max_workers: 计算偏移量的进程数
+        """
+        self.region_list: List[Region] = region_list
+        self.max_row: int = max_row
+        self.max_col: int = max_col
+        self.min_score: float = min_score
+        self.blend: bool = blend
+        self.max_workers: Optional[int] = max_workers
+
+        self.col_step_list: List[float] = []
+        """每列与前一列的偏移量 下标从1开始 与 LargeMapRecorder 一致"""
+
+        self.row_step_list: List[float] = []
+        """每行与前一行的偏移量 下标从1开始 与 LargeMapRecorder 一致"""
+
+    def estimate_steps(self) -> bool:
+        """
+        计算各行各列的偏移量
+        :return: 是否计算成功
+        """
+        col_future_list: List[Tuple[int, Future]] = []
+        row_future_list: List[Tuple[int, Future]] = []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for region in self.region_list:
+                for row in range(1, self.max_row + 1):
+                    for col in range(1, self.max_col + 1):
+                        path = get_part_image_path(region, row, col)
+                        if col > 1:
+                            prev_path = get_part_image_path(region, row, col - 1)
+                            col_future_list.append((col, executor.submit(estimate_step, prev_path, path, 1)))
+                        if row > 1:
+                            prev_path = get_part_image_path(region, row - 1, col)
+                            row_future_list.append((row, executor.submit(estimate_step, prev_path, path, 0)))
+
+            self.col_step_list = self._vote_steps(col_future_list, self.max_col, '列')
+            self.row_step_list = self._vote_steps(row_future_list, self.max_row, '行')
+
+        return self.col_step_list is not None and self.row_step_list is not None
+
+    def _vote_steps(self, future_list: List[Tuple[int, Future]], max_idx: int, name: str) -> Optional[List[float]]:
+        """
+        按行或列 取所有有效偏移量的中位数
+        没有有效偏移量的行列 使用全部有效偏移量的中位数
+        :param future_list: 行列下标 和 计算偏移量的结果
+        :param max_idx: 最大行列数
+        :param name: 日志显示用
+        :return: 每行或列的偏移量 下标从1开始
+        """
+        idx_steps: List[List[float]] = [[] for _ in range(max_idx + 1)]
+        all_steps: List[float] = []
+        for idx, future in future_list:
+            step, score = future.result()
+            if step < 0 or score < self.min_score:
+                continue
+            idx_steps[idx].append(step)
+            all_steps.append(step)
+
+        if max_idx > 1 and len(all_steps) == 0:
+            log.error('没有有效的%s偏移量', name)
+            return None
+
+        step_list: List[float] = [0, 0]
+        for idx in range(2, max_idx + 1):
+            steps = idx_steps[idx] if len(idx_steps[idx]) > 0 else all_steps
+            step = float(np.median(steps))
+            log.info('%02d%s 与前偏移量 %.2f 有效数量 %d', idx, name, step, len(idx_steps[idx]))
+            step_list.append(step)
+
+        return step_list
+
+    @staticmethod
+    def _get_positions(step_list: List[float], max_idx: int) -> List[int]:
+        """
+        由偏移量计算每行或列的起点
+        先累加亚像素的偏移量再取整 避免误差累积
+        :param step_list: 偏移量 下标从1开始
+        :param max_idx: 最大行列数
+        :return: 起点 下标从1开始
+        """
+        positions = [0, 0]
+        total = 0.0
+        for idx in range(2, max_idx + 1):
+            total += step_list[idx]
+            positions.append(int(round(total)))
+        return positions
+
+    def stitch(self, region: Region) -> Optional[MatLike]:
+        """
+        拼接一个区域的大地图
+        逐个读取格子截图 写入预先分配好的画布 不需要同时持有全部截图
+        :param region: 区域
+        :return: 拼接后的图片
+        """
+        first = cv2_utils.read_image(get_part_image_path(region, 1, 1))
+        if first is None:
+            log.error('%s 缺少第一个格子的截图', region.display_name)
+            return None
+
+        tile_height, tile_width = first.shape[:2]
+        x_list = LargeMapStitcher._get_positions(self.col_step_list, self.max_col)
+        y_list = LargeMapStitcher._get_positions(self.row_step_list, self.max_row)
+        canvas_height = y_list[self.max_row] + tile_height
+        canvas_width = x_list[self.max_col] + tile_width
+
+        if self.blend:
+            canvas = np.zeros((canvas_height, canvas_width, first.shape[2]), dtype=np.float32)
+            weight_canvas = np.zeros((canvas_height, canvas_width, 1), dtype=np.float32)
+            weight = LargeMapStitcher._get_feather_weight(tile_height, tile_width)
+        else:
+            canvas = np.zeros((canvas_height, canvas_width, first.shape[2]), dtype=np.uint8)
+            weight_canvas = None
+            weight = None
+
+        for row in range(1, self.max_row + 1):
+            for col in range(1, self.max_col + 1):
+                tile = first if row == 1 and col == 1 else cv2_utils.read_image(get_part_image_path(region, row, col))
+                if tile is None:
+                    log.error('%s 缺少截图 %02d行 %02d列', region.display_name, row, col)
+                    continue
+                x = x_list[col]
+                y = y_list[row]
+                if self.blend:
+                    canvas[y:y + tile_height, x:x + tile_width] += tile.astype(np.float32) * weight
+                    weight_canvas[y:y + tile_height, x:x + tile_width] += weight
+                else:
+                    canvas[y:y + tile_height, x:x + tile_width] = tile
+
+        if self.blend:
+            np.maximum(weight_canvas, 1e-6, out=weight_canvas)
+            canvas /= weight_canvas
+            return np.clip(canvas + 0.5, 0, 255).astype(np.uint8)
+        else:
+            return canvas
+
+    @staticmethod
+    def _get_feather_weight(height: int, width: int) -> np.ndarray:
+        """
+        渐变融合使用的权重 越靠近格子边缘权重越小
+        :param height: 格子高度
+        :param width: 格子宽度
+        :return:
+        """
+        y_weight = np.minimum(np.arange(1, height + 1), np.arange(height, 0, -1)).astype(np.float32)
+        x_weight = np.minimum(np.arange(1, width + 1), np.arange(width, 0, -1)).astype(np.float32)
+        return np.minimum(y_weight[:, None], x_weight[None, :])[:, :, None]
+
+
+def get_part_image_path(region: Region, row: int, col: int) -> str:
+    """
+    格子截图的路径 与 LargeMapRecorder 保存的位置一致
+    """
+    from sr_od.app.large_map_recorder.large_map_recorder_app import LargeMapRecorder
+    return LargeMapRecorder.get_part_image_path(region, row, col)
+
+
+def __debug(planet_name: str, region_name: str, max_row: int, max_col: int):
+    """
+    使用已经录制的格子截图 对比当前的合并结果
+    当前的合并结果需要先用 LargeMapRecorder 的 merge 模式生成
+    """
+    from one_dragon.utils.i18_utils import gt
+    from sr_od.app.large_map_recorder.large_map_recorder_app import LargeMapRecorder
+    from sr_od.context.sr_context import SrContext
+    ctx = SrContext()
+
+    planet = ctx.map_data.best_match_planet_by_name(gt(planet_name))
+    region = ctx.map_data.best_match_region_by_name(gt(region_name), planet=planet)
+    app = LargeMapRecorder(ctx, region, max_row=max_row, max_column=max_col)
+
+    tracemalloc.start()
+    t1 = time.time()
+    stitcher = LargeMapStitcher(app.region_list, max_row, max_col)
+    if not stitcher.estimate_steps():
+        return
+    t2 = time.time()
+    result_list = []
+    for r in app.region_list:
+        result_list.append(stitcher.stitch(r))
+    t3 = time.time()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    log.info('偏移量计算 耗时 %.2f秒', t2 - t1)
+    log.info('拼接 耗时 %.2f秒 内存峰值 %.2fMB', t3 - t2, peak / 1024 / 1024)
+
+    for r, result in zip(app.region_list, result_list):
+        if result is None:
+            continue
+        merge_path = LargeMapRecorder.get_merge_image_path(r, max_row)
+        if not os.path.exists(merge_path):
+            log.info('%d层 没有当前的合并结果 %s', r.floor, merge_path)
+            continue
+        merge = cv2_utils.read_image(merge_path)
+        height = min(merge.shape[0], result.shape[0])
+        width = min(merge.shape[1], result.shape[1])
+        diff = cv2.absdiff(merge[:height, :width], result[:height, :width])
+        log.info('%d层 当前合并size %s 新合并size %s 平均像素误差 %.2f 误差大于10的像素占比 %.4f',
+                 r.floor, merge.shape, result.shape,
+                 float(np.mean(diff)), float(np.mean(np.max(diff, axis=2) > 10)))
+
+
+if __name__ == '__main__':
+    __debug('翁法罗斯', '「命运重渊」雅努萨波利斯', 8, 1)
@@ -8,7 +8,10 @@ from cv2.typing import MatLike
 from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.base.matcher.match_result import MatchResult
 from one_dragon.utils import cv2_utils
+from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
+from sr_od.app.sim_uni import sim_uni_card_index
+from sr_od.app.sim_uni.sim_uni_card_layout import SimUniCardLayoutProbe
 from sr_od.app.sim_uni.sim_uni_challenge_config import SimUniChallengeConfig
 from sr_od.app.sim_uni.sim_uni_const import match_best_bless_by_ocr, SimUniBless, SimUniBlessEnum, SimUniBlessLevel
 from sr_od.context.sr_context import SrContext
@@ -40,6 +43,19 @@ BLESS_BEFORE_LEVEL_RECT_LIST: List[List[Rect]] = [
 ]
 
 
+BLESS_CNT_2_RECT_LIST: dict[int, List[List[Rect]]] = {
+    3: BLESS_3_RECT_LIST,
+    2: BLESS_2_RECT_LIST,
+    1: BLESS_1_RECT_LIST,
+}
+
+# 命途的文字短且居中 用于判断祝福数量
+BLESS_LAYOUT_PROBE: SimUniCardLayoutProbe = SimUniCardLayoutProbe({
+    cnt: [bless_rect_list[1] for bless_rect_list in rect_list]
+    for cnt, rect_list in BLESS_CNT_2_RECT_LIST.items()
+})
+
+
 def get_bless_pos(ctx: SrContext, screen: MatLike,
                   before_level_start: bool, bless_cnt_type: int = 3) -> List[MatchResult]:
     """
@@ -55,7 +71,14 @@ def get_bless_pos(ctx: SrContext, screen: MatLike,
     """
     if before_level_start:
         return get_bless_pos_by_rect_list(ctx, screen, BLESS_BEFORE_LEVEL_RECT_LIST)
-    else:  # 这么按顺序写 可以保证最多只识别3次祝福
+    else:
+        bless_cnt = BLESS_LAYOUT_PROBE.probe(screen)  # 先判断祝福数量 判断正确时只需要识别一种布局
+        if bless_cnt is not None and bless_cnt <= bless_cnt_type:
+            bless_list = get_bless_pos_by_rect_list(ctx, screen, BLESS_CNT_2_RECT_LIST[bless_cnt])
+            if len(bless_list) > 0:
+                return bless_list
+
+        # 无法判断数量时 这么按顺序写 可以保证最多只识别3次祝福
         bless_3 = get_bless_pos_by_rect_list(ctx, screen, BLESS_3_RECT_LIST)
         if len(bless_3) > 0 and bless_cnt_type >= 3:
             return bless_3
@@ -71,20 +94,46 @@ def get_bless_pos(ctx: SrContext, screen: MatLike,
     return []
 
 
-def get_bless_pos_by_rect_list(ctx: SrContext, screen: MatLike, rect_list: List[List[Rect]]) -> List[MatchResult]:
+def get_bless_pos_by_rect_list(ctx: SrContext, screen: MatLike, rect_list: List[List[Rect]],
+                               use_index: Optional[bool] = None) -> List[MatchResult]:
+    """
+    识别指定区域中的祝福
+    启用图片索引时 先用图片索引一次识别全部标题 索引无法确定的祝福 再使用OCR识别命途和标题
+    :param ctx: 上下文
+    :param screen: 游戏画面
+    :param rect_list: 每个祝福的名字、命途区域
+    :param use_index: 是否使用图片索引 不传入时按模拟宇宙的配置
+    :return: MatchResult.data 中是对应的祝福 Bless
+    """
     bless_list: List[MatchResult] = []
+    if use_index is None:
+        use_index = ctx.sim_uni_config.use_card_index
 
-    for bless_rect_list in rect_list:
-        path_part = cv2_utils.crop_image_only(screen, bless_rect_list[1])
-        path_ocr = ctx.ocr.run_ocr_single_line(path_part)
-        # cv2_utils.show_image(path_black_part, wait=0)
-        if path_ocr is None or len(path_ocr) == 0:
-            break  # 其中有一个位置识别不到就认为不是使用这些区域了 加速这里的判断
+    bless_index = sim_uni_card_index.get_index(sim_uni_card_index.INDEX_BLESS)
+    title_part_list = [cv2_utils.crop_image_only(screen, bless_rect_list[0]) for bless_rect_list in rect_list]
+    if use_index:
+        label_list = bless_index.classify_batch(title_part_list)
+    else:
+        label_list = [None for _ in rect_list]
 
-        title_part = cv2_utils.crop_image_only(screen, bless_rect_list[0])
-        title_ocr = ctx.ocr.run_ocr_single_line(title_part)
+    for bless_rect_list, title_part, label in zip(rect_list, title_part_list, label_list):
+        if label is not None:
+            bless = SimUniBlessEnum[label].value
+        else:
+            path_part = cv2_utils.crop_image_only(screen, bless_rect_list[1])
+            path_ocr = ctx.ocr.run_ocr_single_line(path_part)
+            # cv2_utils.show_image(path_black_part, wait=0)
+            if path_ocr is None or len(path_ocr) == 0:
+                break  # 其中有一个位置识别不到就认为不是使用这些区域了 加速这里的判断
 
-        bless = match_best_bless_by_ocr(title_ocr, path_ocr)
+            title_ocr = ctx.ocr.run_ocr_single_line(title_part)
+
+            bless = match_best_bless_by_ocr(title_ocr, path_ocr)
+
+            if bless is not None and use_index and title_ocr == gt(bless.title, 'ocr'):  # OCR完全一致的祝福加入索引 下次可以直接识别
+                bless_label = sim_uni_card_index.get_bless_label(bless)
+                if bless_label is not None:
+                    bless_index.add(bless_label, title_part, save_sample=ctx.env_config.is_debug)
 
         if bless is not None:
             log.info('识别到祝福 %s', bless)
@@ -164,4 +213,115 @@ def get_bless_by_priority(bless_list: List[SimUniBless], config: Optional[SimUni
             target_idx = idx
             target_priority = idx_priority[idx]
 
-    return target_idx
\ No newline at end of file
+    return target_idx
+
+
+def __debug_card_index(corpus_dir: str):
+    """
+    使用保存的选择祝福画面 对比纯OCR与图片索引的结果和耗时
+    先全部使用纯OCR识别一次作为基准 再使用索引运行一次 让索引学习OCR的结果 最后使用索引识别并计时
+    没有离线索引文件时 属于在样本内的评估
+    模拟宇宙配置 use_card_index 默认关闭 需要在真实画面上验证并记录准确率后 才考虑默认开启
+    :param corpus_dir: 游戏画面的文件夹
+    """
+    import os
+    ctx = SrContext()
+    ctx.init_by_config()
+    ctx.ocr.init_model()
+
+    screen_list = []
+    for file_name in sorted(os.listdir(corpus_dir)):
+        if file_name.endswith('.png'):
+            screen_list.append(cv2_utils.read_image(os.path.join(corpus_dir, file_name)))
+
+    def run(use_index: bool):
+        result_list = []
+        t1 = time.time()
+        for screen in screen_list:
+            bless_list = []
+            for rect_list in [BLESS_3_RECT_LIST, BLESS_2_RECT_LIST, BLESS_1_RECT_LIST]:
+                bless_list = get_bless_pos_by_rect_list(ctx, screen, rect_list, use_index=use_index)
+                if len(bless_list) > 0:
+                    break
+            result_list.append([i.data for i in bless_list])
+        return result_list, time.time() - t1
+
+    ocr_result, ocr_seconds = run(False)
+    run(True)  # 模拟运行中学习
+    index_result, index_seconds = run(True)
+
+    same_cnt = sum(1 for a, b in zip(ocr_result, index_result) if a == b)
+    index = sim_uni_card_index.get_index(sim_uni_card_index.INDEX_BLESS)
+    print('画面数量 %d 结果一致 %d' % (len(screen_list), same_cnt))
+    print('纯OCR 平均 %.3f秒 图片索引 平均 %.3f秒' % (ocr_seconds / max(1, len(screen_list)),
+                                                 index_seconds / max(1, len(screen_list))))
+    print('索引命中 %d 未命中 %d' % (index.hit_cnt, index.miss_cnt))
+
+
+def __debug_layout_probe(corpus_dir: str):
+    """
+    使用保存的选择祝福画面 每种数量的画面放在以数量命名的子文件夹中 例如 corpus_dir/3/xxx.png
+    检查数量判断是否正确 并对比按顺序识别与先判断数量两种方式的结果和OCR次数
+    :param corpus_dir: 游戏画面的文件夹
+    """
+    import os
+    ctx = SrContext()
+    ctx.init_by_config()
+    ctx.ocr.init_model()
+
+    ocr_cnt = [0]
+    run_ocr_single_line = ctx.ocr.run_ocr_single_line
+
+    def count_ocr(*args, **kwargs):
+        ocr_cnt[0] += 1
+        return run_ocr_single_line(*args, **kwargs)
+
+    ctx.ocr.run_ocr_single_line = count_ocr
+
+    def by_sequence(screen: MatLike) -> List[MatchResult]:
+        for rect_list in [BLESS_3_RECT_LIST, BLESS_2_RECT_LIST, BLESS_1_RECT_LIST]:
+            bless_list = get_bless_pos_by_rect_list(ctx, screen, rect_list, use_index=False)
+            if len(bless_list) > 0:
+                return bless_list
+        return []
+
+    for cnt_dir in sorted(os.listdir(corpus_dir)):
+        if not cnt_dir.isdigit():
+            continue
+        expected_cnt = int(cnt_dir)
+        probe_correct = 0
+        same_result = 0
+        total = 0
+        sequence_ocr = 0
+        probe_ocr = 0
+        for file_name in sorted(os.listdir(os.path.join(corpus_dir, cnt_dir))):
+            screen = cv2_utils.read_image(os.path.join(corpus_dir, cnt_dir, file_name))
+            if screen is None:
+                continue
+            total += 1
+            if BLESS_LAYOUT_PROBE.probe(screen) == expected_cnt:
+                probe_correct += 1
+
+            ocr_cnt[0] = 0
+            sequence_result = by_sequence(screen)
+            sequence_ocr += ocr_cnt[0]
+
+            ocr_cnt[0] = 0
+            bless_cnt = BLESS_LAYOUT_PROBE.probe(screen)
+            probe_result = []
+            if bless_cnt is not None:
+                probe_result = get_bless_pos_by_rect_list(ctx, screen, BLESS_CNT_2_RECT_LIST[bless_cnt], use_index=False)
+            if len(probe_result) == 0:
+                probe_result = by_sequence(screen)
+            probe_ocr += ocr_cnt[0]
+
+            if [i.data for i in sequence_result] == [i.data for i in probe_result]:
+                same_result += 1
+
+        print('%d个祝福 画面 %d 数量判断正确 %d 结果一致 %d OCR次数 按顺序 %d 先判断数量 %d' %
+              (expected_cnt, total, probe_correct, same_result, sequence_ocr, probe_ocr))
+
+
+if __name__ == '__main__':
+    import sys
+    __debug_card_index(sys.argv[1])
@@ -11,7 +11,8 @@ from one_dragon.base.operation.operation_round_result import OperationRoundResul
 from one_dragon.utils import cv2_utils
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
-from sr_od.app.sim_uni import sim_uni_screen_state
+from sr_od.app.sim_uni import sim_uni_screen_state, sim_uni_card_index
+from sr_od.app.sim_uni.sim_uni_card_layout import SimUniCardLayoutProbe
 from sr_od.app.sim_uni.sim_uni_challenge_config import SimUniChallengeConfig
 from sr_od.app.sim_uni.sim_uni_const import match_best_curio_by_ocr, SimUniCurio, SimUniCurioEnum
 from sr_od.context.sr_context import SrContext
@@ -38,6 +39,15 @@ class SimUniChooseCurio(SrOperation):
         Rect(780, 280, 1120, 320),
     ]
 
+    CURIO_CNT_2_RECT_LIST: ClassVar[dict[int, List[Rect]]] = {
+        3: CURIO_RECT_3_LIST,
+        2: CURIO_RECT_2_LIST,
+        1: CURIO_RECT_1_LIST,
+    }
+
+    # 奇物名字居中 用于判断奇物数量
+    CURIO_LAYOUT_PROBE: ClassVar[SimUniCardLayoutProbe] = SimUniCardLayoutProbe(CURIO_CNT_2_RECT_LIST)
+
     CURIO_NAME_RECT: ClassVar[Rect] = Rect(315, 280, 1590, 320)  # 奇物名字的框
 
     CONFIRM_BTN: ClassVar[Rect] = Rect(1500, 950, 1840, 1000)  # 确认选择
@@ -100,6 +110,12 @@ class SimUniChooseCurio(SrOperation):
         :param screen: 屏幕截图
         :return: MatchResult.data 中是对应的奇物 SimUniCurio
         """
+        curio_cnt = SimUniChooseCurio.CURIO_LAYOUT_PROBE.probe(screen)  # 先判断奇物数量 判断正确时只需要识别一种布局
+        if curio_cnt is not None and curio_cnt <= self.curio_cnt_type:
+            curio_list = self._get_curio_pos_by_rect(screen, SimUniChooseCurio.CURIO_CNT_2_RECT_LIST[curio_cnt])
+            if len(curio_list) > 0:
+                return curio_list
+
         curio_list = self._get_curio_pos_by_rect(screen, SimUniChooseCurio.CURIO_RECT_3_LIST)
         if len(curio_list) > 0 and self.curio_cnt_type >= 3:
             return curio_list
@@ -117,18 +133,34 @@ class SimUniChooseCurio(SrOperation):
     def _get_curio_pos_by_rect(self, screen: MatLike, rect_list: List[Rect]) -> List[MatchResult]:
         """
         获取屏幕上的奇物的位置
+        配置启用图片索引时 先用图片索引一次识别全部名字 索引无法确定的奇物 再使用OCR识别
         :param screen: 屏幕截图
         :param rect_list: 指定区域
         :return: MatchResult.data 中是对应的奇物 SimUniCurio
         """
         curio_list: List[MatchResult] = []
 
-        for rect in rect_list:
-            title_part = cv2_utils.crop_image_only(screen, rect)
-            title_ocr = self.ctx.ocr.run_ocr_single_line(title_part)
-            # cv2_utils.show_image(title_part, wait=0)
+        use_index = self.ctx.sim_uni_config.use_card_index
+        curio_index = sim_uni_card_index.get_index(sim_uni_card_index.INDEX_CURIO)
+        title_part_list = [cv2_utils.crop_image_only(screen, rect) for rect in rect_list]
+        if use_index:
+            label_list = curio_index.classify_batch(title_part_list)
+        else:
+            label_list = [None for _ in rect_list]
+
+        for rect, title_part, label in zip(rect_list, title_part_list, label_list):
+            if label is not None:
+                curio = SimUniCurioEnum[label].value
+            else:
+                title_ocr = self.ctx.ocr.run_ocr_single_line(title_part)
+                # cv2_utils.show_image(title_part, wait=0)
+
+                curio = match_best_curio_by_ocr(title_ocr)
 
-            curio = match_best_curio_by_ocr(title_ocr)
+                if curio is not None and use_index and title_ocr == gt(curio.name, 'ocr'):  # OCR完全一致的奇物加入索引 下次可以直接识别
+                    curio_label = sim_uni_card_index.get_curio_label(curio)
+                    if curio_label is not None:
+                        curio_index.add(curio_label, title_part, save_sample=self.ctx.env_config.is_debug)
 
             if curio is None:  # 有一个识别不到就返回 提速
                 return curio_list
@@ -288,6 +320,12 @@ class SimUniDropCurio(SrOperation):
         :param screen: 屏幕截图
         :return: MatchResult.data 中是对应的奇物 SimUniCurio
         """
+        curio_cnt = SimUniChooseCurio.CURIO_LAYOUT_PROBE.probe(screen)  # 先判断奇物数量 判断正确时只需要识别一种布局
+        if curio_cnt is not None and curio_cnt <= self.curio_cnt_type:
+            curio_list = self._get_curio_pos_by_rect(screen, SimUniChooseCurio.CURIO_CNT_2_RECT_LIST[curio_cnt])
+            if len(curio_list) > 0:
+                return curio_list
+
         curio_list = self._get_curio_pos_by_rect(screen, SimUniChooseCurio.CURIO_RECT_3_LIST)
         if len(curio_list) > 0 and self.curio_cnt_type >= 3:
             return curio_list
@@ -305,18 +343,34 @@ class SimUniDropCurio(SrOperation):
     def _get_curio_pos_by_rect(self, screen: MatLike, rect_list: List[Rect]) -> List[MatchResult]:
         """
         获取屏幕上的奇物的位置
+        配置启用图片索引时 先用图片索引一次识别全部名字 索引无法确定的奇物 再使用OCR识别
         :param screen: 屏幕截图
         :param rect_list: 指定区域
         :return: MatchResult.data 中是对应的奇物 SimUniCurio
         """
         curio_list: List[MatchResult] = []
 
-        for rect in rect_list:
-            title_part = cv2_utils.crop_image_only(screen, rect)
-            title_ocr = self.ctx.ocr.run_ocr_single_line(title_part)
-            # cv2_utils.show_image(title_part, wait=0)
+        use_index = self.ctx.sim_uni_config.use_card_index
+        curio_index = sim_uni_card_index.get_index(sim_uni_card_index.INDEX_CURIO)
+        title_part_list = [cv2_utils.crop_image_only(screen, rect) for rect in rect_list]
+        if use_index:
+            label_list = curio_index.classify_batch(title_part_list)
+        else:
+            label_list = [None for _ in rect_list]
+
+        for rect, title_part, label in zip(rect_list, title_part_list, label_list):
+            if label is not None:
+                curio = SimUniCurioEnum[label].value
+            else:
+                title_ocr = self.ctx.ocr.run_ocr_single_line(title_part)
+                # cv2_utils.show_image(title_part, wait=0)
+
+                curio = match_best_curio_by_ocr(title_ocr)
 
-            curio = match_best_curio_by_ocr(title_ocr)
+                if curio is not None and use_index and title_ocr == gt(curio.name, 'ocr'):  # OCR完全一致的奇物加入索引 下次可以直接识别
+                    curio_label = sim_uni_card_index.get_curio_label(curio)
+                    if curio_label is not None:
+                        curio_index.add(curio_label, title_part, save_sample=self.ctx.env_config.is_debug)
 
             if curio is None:  # 有一个识别不到就返回 提速
                 return curio_list
@@ -50,6 +50,12 @@ class SimUniApp(SrApplication):
         self.not_found_in_survival_times: int = 0  # 在生存索引中找不到模拟宇宙的次数
         self.all_finished: bool = False
 
+    def prefetch_for_application(self) -> None:
+        """
+        一条龙中 在上一个应用运行时 预热模型和大地图
+        """
+        self.ctx.prefetch_for_sim_uni()
+
     @node_from(from_name='自动宇宙')
     @node_from(from_name='异常退出')
     @operation_node(name='检查运行次数', is_start_node=True)
@@ -0,0 +1,314 @@
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.utils import os_utils
+from one_dragon.utils.debug_image_writer import debug_image_writer, ImageEncoder
+from one_dragon.utils.log_utils import log
+from sr_od.app.sim_uni.sim_uni_const import SimUniBless, SimUniBlessEnum, SimUniBlessLevel, SimUniCurio, \
+    SimUniCurioEnum
+
+_NORM_WIDTH: int = 256  # 标准化后的标题宽度
+_NORM_HEIGHT: int = 32  # 标准化后的标题高度
+_MIN_TEXT_PIXELS: int = 50  # 少于这个数量的文字像素 认为没有标题
+_SAMPLE_ENCODER: ImageEncoder = ImageEncoder(ImageEncoder.FORMAT_PNG)
+
+INDEX_BLESS: str = 'bless'
+INDEX_CURIO: str = 'curio'
+
+
+def normalize_title(image: MatLike) -> Optional[MatLike]:
+    """
+    标题图片的标准化 二值化后按文字的范围裁剪 保持宽高比缩放到固定高度 靠左放置
+    不同卡片布局的标题框位置不一样 按文字范围裁剪后可以得到一致的结果
+    :param image: RGB格式的标题图片
+    :return: 标准化后的图片 没有文字时返回None
+    """
+    if image is None or image.size == 0:
+        return None
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if cv2.countNonZero(binary) > binary.size // 2:  # 文字作为前景
+        binary = cv2.bitwise_not(binary)
+
+    points = cv2.findNonZero(binary)
+    if points is None or len(points) < _MIN_TEXT_PIXELS:
+        return None
+
+    x, y, w, h = cv2.boundingRect(points)
+    text = binary[y:y + h, x:x + w]
+    scale = min(_NORM_WIDTH / w, _NORM_HEIGHT / h)
+    resized_w = max(1, min(_NORM_WIDTH, int(round(w * scale))))
+    resized_h = max(1, min(_NORM_HEIGHT, int(round(h * scale))))
+    resized = cv2.resize(text, (resized_w, resized_h), interpolation=cv2.INTER_AREA)
+
+    norm = np.zeros((_NORM_HEIGHT, _NORM_WIDTH), dtype=np.uint8)
+    norm[:resized_h, :resized_w] = resized
+    return norm
+
+
+def cal_hash(norm: MatLike) -> np.ndarray:
+    """
+    差异哈希 64位
+    :param norm: 标准化后的图片
+    :return: 8个字节
+    """
+    small = cv2.resize(norm, (9, 8), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+
+@lru_cache
+def _get_hog() -> cv2.HOGDescriptor:
+    return cv2.HOGDescriptor((_NORM_WIDTH, _NORM_HEIGHT), (16, 16), (8, 8), (8, 8), 9)
+
+
+def cal_feature(norm: MatLike) -> np.ndarray:
+    """
+    HOG特征 已经归一化 两个特征的点积就是余弦相似度
+    :param norm: 标准化后的图片
+    :return:
+    """
+    feature = _get_hog().compute(norm).reshape(-1).astype(np.float32)
+    length = float(np.linalg.norm(feature))
+    return feature / length if length > 0 else feature
+
+
+class SimUniCardIndex:
+
+    def __init__(self, index_name: str,
+                 feature_threshold: float = 0.9,
+                 hash_threshold: int = 12,
+                 margin: float = 0.03,
+                 max_sample_per_label: int = 5):
+        """
+        模拟宇宙祝福、奇物卡片标题的图片索引
+        每个样本保存标题的差异哈希和HOG特征 识别时一次计算全部卡片和全部样本的相似度
+        只有足够相似、哈希足够接近、并且明显比其它种类更相似时才认为识别成功 其余情况交给OCR
+        OCR识别成功的卡片会加入索引 调试模式下会保存样本 可以离线生成索引文件
+        :param index_name: 索引名称 bless / curio
+        :param feature_threshold: 最低的余弦相似度
+        :param hash_threshold: 最大的哈希距离
+        :param margin: 与其它种类的最高相似度的最小差距 索引中只有一个种类时无法满足
+        :param max_sample_per_label: 运行中每个种类最多加入多少个样本
+        """
+        self.index_name: str = index_name
+        self.feature_threshold: float = feature_threshold
+        self.hash_threshold: int = hash_threshold
+        self.margin: float = margin
+        self.max_sample_per_label: int = max_sample_per_label
+
+        self.labels: List[str] = []
+        self.hashes: np.ndarray = np.zeros((0, 8), dtype=np.uint8)
+        self.features: Optional[np.ndarray] = None
+
+        self.hit_cnt: int = 0
+        """识别成功的次数"""
+
+        self.miss_cnt: int = 0
+        """识别失败 需要使用OCR的次数"""
+
+        self._label_cnt: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_index_path(index_name: str) -> str:
+        return os.path.join(os_utils.get_work_dir(), 'assets', 'models', 'sim_uni_card_index', f'{index_name}.npz')
+
+    @staticmethod
+    def get_sample_dir(index_name: str, label: Optional[str] = None) -> str:
+        if label is None:
+            return os_utils.get_path_under_work_dir('.debug', 'sim_uni_card', index_name)
+        return os_utils.get_path_under_work_dir('.debug', 'sim_uni_card', index_name, label)
+
+    @property
+    def size(self) -> int:
+        return len(self.labels)
+
+    def load(self) -> None:
+        """
+        加载离线生成的索引文件 不存在时为空索引
+        :return:
+        """
+        path = SimUniCardIndex.get_index_path(self.index_name)
+        if not os.path.exists(path):
+            return
+        try:
+            data = np.load(path)
+            with self._lock:
+                self.labels = [str(i) for i in data['labels']]
+                self.hashes = data['hashes']
+                self.features = data['features']
+                self._label_cnt = {}
+        except Exception:
+            log.error('加载模拟宇宙卡片索引失败 %s', path, exc_info=True)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        保存索引文件
+        :param path: 文件路径 不传入时使用默认路径
+        :return:
+        """
+        if path is None:
+            path = SimUniCardIndex.get_index_path(self.index_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            np.savez_compressed(path, labels=np.array(self.labels), hashes=self.hashes,
+                                features=self.features if self.features is not None else np.zeros((0, 0), np.float32))
+
+    def add(self, label: str, image: MatLike, save_sample: bool = False) -> bool:
+        """
+        加入一个样本
+        :param label: 种类 即枚举的名称
+        :param image: RGB格式的标题图片
+        :param save_sample: 是否保存样本图片 用于离线生成索引
+        :return: 是否加入成功
+        """
+        norm = normalize_title(image)
+        if norm is None:
+            return False
+
+        if save_sample:
+            debug_image_writer.submit(image,
+                                      os.path.join(SimUniCardIndex.get_sample_dir(self.index_name, label),
+                                                   '%d.png' % round(time.time() * 1000)),
+                                      encoder=_SAMPLE_ENCODER,
+                                      quota_dir=SimUniCardIndex.get_sample_dir(self.index_name, label), quota=20)
+
+        with self._lock:
+            if self._label_cnt.get(label, 0) >= self.max_sample_per_label:
+                return False
+            self._label_cnt[label] = self._label_cnt.get(label, 0) + 1
+            feature = cal_feature(norm).reshape(1, -1)
+            self.labels.append(label)
+            self.hashes = np.vstack([self.hashes, cal_hash(norm).reshape(1, -1)])
+            self.features = feature if self.features is None or self.features.size == 0 \
+                else np.vstack([self.features, feature])
+        return True
+
+    def classify_batch(self, image_list: List[MatLike]) -> List[Optional[str]]:
+        """
+        一次识别多个标题
+        :param image_list: RGB格式的标题图片
+        :return: 每个标题对应的种类 无法确定时为None
+        """
+        result: List[Optional[str]] = [None for _ in image_list]
+        with self._lock:
+            if len(self.labels) == 0:
+                self.miss_cnt += len(image_list)
+                return result
+            labels = self.labels
+            hashes = self.hashes
+            features = self.features
+
+        norm_idx_list: List[int] = []
+        norm_hash_list: List[np.ndarray] = []
+        norm_feature_list: List[np.ndarray] = []
+        for idx, image in enumerate(image_list):
+            norm = normalize_title(image)
+            if norm is None:
+                continue
+            norm_idx_list.append(idx)
+            norm_hash_list.append(cal_hash(norm))
+            norm_feature_list.append(cal_feature(norm))
+
+        if len(norm_idx_list) > 0:
+            similarity = np.stack(norm_feature_list) @ features.T  # (标题数量, 样本数量)
+            for row, idx in enumerate(norm_idx_list):
+                best = int(np.argmax(similarity[row]))
+                best_score = float(similarity[row, best])
+                if best_score < self.feature_threshold:
+                    continue
+
+                hash_distance = int(np.unpackbits(np.bitwise_xor(hashes[best], norm_hash_list[row])).sum())
+                if hash_distance > self.hash_threshold:
+                    continue
+
+                best_label = labels[best]
+                other_score = max((float(similarity[row, i]) for i in range(len(labels)) if labels[i] != best_label),
+                                  default=None)
+                if other_score is None:  # 只有一个种类时 无法判断与其它种类的差距 不能认为已经区分开
+                    continue
+                if best_score - other_score < self.margin:
+                    continue
+
+                result[idx] = best_label
+
+        hit = sum(1 for i in result if i is not None)
+        with self._lock:
+            self.hit_cnt += hit
+            self.miss_cnt += len(image_list) - hit
+        return result
+
+
+@lru_cache
+def get_index(index_name: str) -> SimUniCardIndex:
+    """
+    获取索引 第一次使用时加载索引文件
+    :param index_name: 索引名称
+    :return:
+    """
+    index = SimUniCardIndex(index_name)
+    index.load()
+    log.debug('模拟宇宙卡片索引 %s 样本数量 %d', index_name, index.size)
+    return index
+
+
+def get_bless_label(bless: SimUniBless) -> Optional[str]:
+    """
+    祝福对应的索引种类
+    只有命途、没有录入具体名称的祝福 标题无法区分 不加入索引
+    :param bless: 祝福
+    :return:
+    """
+    if bless.level == SimUniBlessLevel.WHOLE:
+        return None
+    for bless_enum in SimUniBlessEnum:
+        if bless_enum.value is bless:
+            return bless_enum.name
+    return None
+
+
+def get_curio_label(curio: SimUniCurio) -> Optional[str]:
+    """
+    奇物对应的索引种类
+    :param curio: 奇物
+    :return:
+    """
+    for curio_enum in SimUniCurioEnum:
+        if curio_enum.value is curio:
+            return curio_enum.name
+    return None
+
+
+def build_index_from_samples(index_name: str, save: bool = True) -> SimUniCardIndex:
+    """
+    离线使用调试模式下保存的样本 生成索引文件
+    每个种类使用全部样本 不受运行中的数量限制
+    :param index_name: 索引名称
+    :param save: 是否保存索引文件
+    :return:
+    """
+    index = SimUniCardIndex(index_name, max_sample_per_label=99999)
+    sample_dir = SimUniCardIndex.get_sample_dir(index_name)
+    for label in sorted(os.listdir(sample_dir)):
+        label_dir = os.path.join(sample_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        if label not in SimUniBlessEnum.__members__ and label not in SimUniCurioEnum.__members__:
+            continue
+        for file_name in sorted(os.listdir(label_dir)):
+            image = cv2.imread(os.path.join(label_dir, file_name))
+            if image is None:
+                continue
+            index.add(label, cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+    if save:
+        index.save()
+    log.info('生成模拟宇宙卡片索引 %s 样本数量 %d', index_name, index.size)
+    return index
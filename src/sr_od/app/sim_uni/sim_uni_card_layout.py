@@ -0,0 +1,72 @@
+from typing import List, Optional
+
+import cv2
+from cv2.typing import MatLike
+
+from one_dragon.base.geometry.rectangle import Rect
+
+
+class SimUniCardLayoutProbe:
+
+    def __init__(self, cnt_2_rect_list: dict[int, List[Rect]],
+                 half_width: int = 30, min_density: float = 0.02, min_ratio: float = 2):
+        """
+        在OCR之前判断画面上有几张卡片(祝福、奇物)
+        不同数量的卡片 文字都在卡片的中间 且中心位置各不相同
+        因此只需要在每个可能的中心位置 取一个窄的窗口计算边缘密度 有文字的窗口边缘明显更多
+        选择 有文字的中心都在其中 没有文字的中心都不在其中 的卡片数量
+        :param cnt_2_rect_list: 卡片数量 -> 每张卡片上用于判断的文字区域 应选择居中的短文字
+        :param half_width: 窗口的一半宽度
+        :param min_density: 有文字的窗口 最低的边缘密度
+        :param min_ratio: 有文字的窗口中最低的边缘密度 需要是其它窗口中最高的多少倍
+        """
+        self.cnt_2_center_x_list: dict[int, List[int]] = {}
+        self.center_x_list: List[int] = []
+        self.y1: int = min(rect.y1 for rect_list in cnt_2_rect_list.values() for rect in rect_list)
+        self.y2: int = max(rect.y2 for rect_list in cnt_2_rect_list.values() for rect in rect_list)
+        self.half_width: int = half_width
+        self.min_density: float = min_density
+        self.min_ratio: float = min_ratio
+
+        for cnt, rect_list in cnt_2_rect_list.items():
+            self.cnt_2_center_x_list[cnt] = [(rect.x1 + rect.x2) // 2 for rect in rect_list]
+            for center_x in self.cnt_2_center_x_list[cnt]:
+                if center_x not in self.center_x_list:
+                    self.center_x_list.append(center_x)
+
+    def get_density(self, screen: MatLike) -> dict[int, float]:
+        """
+        每个中心位置窗口的边缘密度
+        :param screen: 游戏画面
+        :return: 中心横坐标 -> 边缘密度
+        """
+        x1 = max(0, min(self.center_x_list) - self.half_width)
+        x2 = min(screen.shape[1], max(self.center_x_list) + self.half_width)
+        row = cv2.cvtColor(screen[self.y1:self.y2, x1:x2], cv2.COLOR_RGB2GRAY)
+        edge = cv2.Canny(row, 50, 150)
+
+        result: dict[int, float] = {}
+        for center_x in self.center_x_list:
+            window = edge[:, max(0, center_x - self.half_width - x1):center_x + self.half_width - x1]
+            result[center_x] = cv2.countNonZero(window) / window.size if window.size > 0 else 0
+        return result
+
+    def probe(self, screen: MatLike) -> Optional[int]:
+        """
+        判断卡片数量
+        :param screen: 游戏画面
+        :return: 卡片数量 无法判断时返回None
+        """
+        density = self.get_density(screen)
+        best_cnt: Optional[int] = None
+        best_ratio: float = 0
+        for cnt, center_x_list in self.cnt_2_center_x_list.items():
+            min_in = min(density[x] for x in center_x_list)
+            max_out = max((density[x] for x in self.center_x_list if x not in center_x_list), default=0)
+            if min_in < self.min_density:
+                continue
+            ratio = min_in / max_out if max_out > 0 else float('inf')
+            if ratio >= self.min_ratio and ratio > best_ratio:
+                best_cnt = cnt
+                best_ratio = ratio
+        return best_cnt
@@ -113,4 +113,21 @@ class SimUniConfig(YamlConfig):
         return YamlConfigAdapter(self, 'elite_daily_times', 15, 'str', 'int')
 
     def get_challenge_config_adapter(self, sim_uni_num: int) -> YamlConfigAdapter:
-        return YamlConfigAdapter(self, 'sim_uni_%02d' % sim_uni_num, '05')
\ No newline at end of file
+        return YamlConfigAdapter(self, 'sim_uni_%02d' % sim_uni_num, '05')
+
+    @property
+    def use_card_index(self) -> bool:
+        """
+        使用图片索引识别祝福和奇物 命中时跳过OCR
+        识别阈值还没有在真实画面上验证 默认关闭
+        :return:
+        """
+        return self.get('use_card_index', False)
+
+    @use_card_index.setter
+    def use_card_index(self, new_value: bool):
+        self.update('use_card_index', new_value)
+
+    @property
+    def use_card_index_adapter(self) -> YamlConfigAdapter:
+        return YamlConfigAdapter(self, 'use_card_index', False)
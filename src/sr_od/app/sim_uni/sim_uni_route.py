@@ -2,10 +2,11 @@ import cv2
 import numpy as np
 import os
 import shutil
-import yaml
 from cv2.typing import MatLike
 from typing import List, Optional, Tuple
 
+from one_dragon.base.config.yaml_data_cache import game_data_cache
+from one_dragon.base.config.yaml_save_worker import yaml_save_worker
 from one_dragon.base.geometry.point import Point
 from one_dragon.utils import cv2_utils, os_utils
 from one_dragon.utils.i18_utils import gt
@@ -79,9 +80,8 @@ class SimUniRoute:
         dir_path = self.get_route_dir_path()
         self.mm = cv2_utils.read_image(os.path.join(dir_path, 'mm.png'))
         self.mm2 = cv2_utils.read_image(os.path.join(dir_path, 'mm2.png'))
-        with open(os.path.join(dir_path, 'route.yml'), 'r', encoding='utf-8') as file:
-            route = yaml.safe_load(file)
-            self.load_from_route_yml(route)
+        route = game_data_cache.load(os.path.join(dir_path, 'route.yml'))
+        self.load_from_route_yml(route)
 
     @property
     def uid(self) -> str:
@@ -141,9 +141,20 @@ class SimUniRoute:
             cv2.imwrite(mm_path, self.mm)
 
         route_path = os.path.join(route_dir, 'route.yml')
+        yaml_save_worker.discard(route_path)  # 直接写入最新内容 不再需要后台保存
         with open(route_path, "w", encoding="utf-8") as file:
             file.write(self.get_route_text())
 
+    def save_async(self):
+        """
+        在后台保存路线配置 用于运行中更新已有路线的配置 不阻塞调用方
+        """
+        route_path = os.path.join(self.get_route_dir_path(), 'route.yml')
+        if yaml_save_worker.enabled:
+            yaml_save_worker.submit(route_path, self.get_route_text)
+        else:
+            yaml_save_worker.write(route_path, self.get_route_text)
+
     def get_route_text(self) -> str:
         """
         获取当前路线的文本
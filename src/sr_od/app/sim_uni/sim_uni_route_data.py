@@ -1,4 +1,8 @@
 import os
+import time
+
+import cv2
+import numpy as np
 from cv2.typing import MatLike
 from typing import List, Optional
 
@@ -11,11 +15,82 @@ from sr_od.app.sim_uni.sim_uni_const import SimUniLevelType
 from sr_od.sr_map.sr_map_data import SrMapData
 
 
+_MM_TEMPLATE_RECT: Rect = Rect(30, 30, 160, 160)  # 用于匹配的小地图中心部分
+_THUMBNAIL_SCALE: float = 0.25  # 粗筛使用的缩略图比例
+
+
+def get_mm_thumbnail(mm: MatLike) -> MatLike:
+    """
+    小地图的灰度缩略图 用于粗筛
+    :param mm: 小地图
+    :return:
+    """
+    gray = cv2.cvtColor(mm, cv2.COLOR_RGB2GRAY) if mm.ndim == 3 else mm
+    return cv2.resize(gray, None, fx=_THUMBNAIL_SCALE, fy=_THUMBNAIL_SCALE, interpolation=cv2.INTER_AREA)
+
+
+class SimUniRouteIndex:
+
+    def __init__(self, route_list: List[SimUniRoute]):
+        """
+        一个楼层类型下 所有路线开始点小地图的索引
+        保存每条路线小地图的灰度缩略图 匹配时先用缩略图粗筛出少量候选 再对候选做原图匹配
+        :param route_list: 路线列表
+        """
+        self.route_list: List[SimUniRoute] = route_list
+        self.thumbnail_list: List[List[MatLike]] = []  # 每条路线的 mm 和 mm2 缩略图
+
+        for route in route_list:
+            thumbnails = []
+            for route_mm in [route.mm, route.mm2]:
+                if route_mm is not None:
+                    thumbnails.append(get_mm_thumbnail(route_mm))
+            self.thumbnail_list.append(thumbnails)
+
+    def get_coarse_score_list(self, mm: MatLike) -> List[float]:
+        """
+        用缩略图匹配 计算每条路线的粗筛分数
+        :param mm: 开始点的小地图截图
+        :return: 与路线列表一一对应的分数
+        """
+        template = get_mm_thumbnail(cv2_utils.crop_image_only(mm, _MM_TEMPLATE_RECT))
+        score_list = []
+        for thumbnails in self.thumbnail_list:
+            best_score = -1.0
+            for thumbnail in thumbnails:
+                if thumbnail.shape[0] < template.shape[0] or thumbnail.shape[1] < template.shape[1]:
+                    continue
+                result = cv2.matchTemplate(thumbnail, template, cv2.TM_CCOEFF_NORMED)
+                score = float(np.max(np.nan_to_num(result, nan=-1.0, posinf=-1.0, neginf=-1.0)))
+                if score > best_score:
+                    best_score = score
+            score_list.append(best_score)
+        return score_list
+
+    def get_candidate_idx_list(self, mm: MatLike, top_k: int) -> List[int]:
+        """
+        粗筛出最有可能的路线
+        :param mm: 开始点的小地图截图
+        :param top_k: 候选数量
+        :return: 候选路线的下标 按路线列表原来的顺序排列
+        """
+        score_list = self.get_coarse_score_list(mm)
+        idx_list = sorted(range(len(score_list)), key=lambda i: score_list[i], reverse=True)
+        return sorted(idx_list[:top_k])
+
+
 class SimUniRouteData:
 
     def __init__(self, map_data: SrMapData):
         self.map_data: SrMapData = map_data
         self.level_type_2_route_list: dict[str, List[SimUniRoute]] = {}
+        self.level_type_2_route_index: dict[str, SimUniRouteIndex] = {}
+
+        self.match_top_k: int = 5
+        """粗筛后进行原图匹配的路线数量"""
+
+        self.match_shortlist_confidence: float = 0.8
+        """候选路线中最高的原图匹配置信度低于这个值时 再匹配剩余的路线 取全部路线中最高的"""
 
     def get_route_list(self, level_type: SimUniLevelType) -> List[SimUniRoute]:
         """
@@ -58,8 +133,23 @@ class SimUniRouteData:
 
         return SimUniRoute(level_type.route_id, self.map_data, int(sub))
 
+    def get_route_index(self, level_type: SimUniLevelType) -> SimUniRouteIndex:
+        """
+        获取楼层类型对应的路线索引 第一次使用时构建
+        :param level_type: 楼层类型
+        :return:
+        """
+        key = level_type.route_id
+        route_list = self.get_route_list(level_type)
+        index = self.level_type_2_route_index.get(key)
+        if index is None or index.route_list is not route_list:
+            index = SimUniRouteIndex(route_list)
+            self.level_type_2_route_index[key] = index
+        return index
+
     def clear_cache(self):
         self.level_type_2_route_list.clear()
+        self.level_type_2_route_index.clear()
 
     def match_best_sim_uni_route(self, uni_num: int, level_type: SimUniLevelType, mm: MatLike) -> Optional[SimUniRoute]:
         """
@@ -69,21 +159,76 @@ class SimUniRouteData:
         :param mm: 开始点的小地图截图
         :return:
         """
+        target_route, target_mr = self._match_route_by_index(uni_num, level_type, mm)
+
+        if target_route is not None and uni_num not in target_route.support_world:
+            target_route.add_support_world(uni_num)
+            target_route.save_async()
+
+        if target_mr is not None:
+            log.debug(f'当前匹配路线置信度 {target_mr.confidence:.2f}')
+
+        return target_route
+
+    def _match_route_by_index(self, uni_num: int, level_type: SimUniLevelType, mm: MatLike) -> tuple[Optional[SimUniRoute], Optional[MatchResult]]:
+        """
+        先用缩略图粗筛出候选路线进行原图匹配
+        候选中都匹配不上 或者最高置信度不够高时 再匹配剩余的路线 取全部路线中置信度最高的
+        不会更新路线配置
+        :param uni_num: 第几宇宙
+        :param level_type: 楼层类型
+        :param mm: 开始点的小地图截图
+        :return: 路线 和 匹配结果
+        """
         route_list = self.get_route_list(level_type)
+        index = self.get_route_index(level_type)
+        candidate_idx_list = index.get_candidate_idx_list(mm, self.match_top_k)
+        candidate_idx_set = set(candidate_idx_list)
+
+        target_route, target_mr = self._match_route_in_list(uni_num, [route_list[idx] for idx in candidate_idx_list], mm)
+        if target_mr is not None and target_mr.confidence >= self.match_shortlist_confidence:
+            return target_route, target_mr
+
+        other_route_list = [route for idx, route in enumerate(route_list) if idx not in candidate_idx_set]
+        other_route, other_mr = self._match_route_in_list(uni_num, other_route_list, mm)
+        if other_mr is not None and (target_mr is None or target_mr.confidence < other_mr.confidence):
+            return other_route, other_mr
+        return target_route, target_mr
+
+    def match_best_sim_uni_route_by_full_scan(self, uni_num: int, level_type: SimUniLevelType, mm: MatLike) -> Optional[SimUniRoute]:
+        """
+        根据开始点的小地图的截图 对所有路线进行原图匹配 找到最合适的路线
+        不会更新路线配置 用于验证粗筛的结果
+        :param uni_num: 第几宇宙
+        :param level_type: 楼层类型
+        :param mm: 开始点的小地图截图
+        :return:
+        """
+        target_route, _ = self._match_route_in_list(uni_num, self.get_route_list(level_type), mm)
+        return target_route
+
+    @staticmethod
+    def _match_route_in_list(uni_num: int, route_list: List[SimUniRoute], mm: MatLike) -> tuple[Optional[SimUniRoute], Optional[MatchResult]]:
+        """
+        在给定的路线中 找到原图匹配置信度最高的路线
+        :param uni_num: 第几宇宙
+        :param route_list: 路线列表
+        :param mm: 开始点的小地图截图
+        :return: 路线 和 匹配结果
+        """
         target_route: Optional[SimUniRoute] = None
         target_mr: Optional[MatchResult] = None
+        template = cv2_utils.crop_image_only(mm, _MM_TEMPLATE_RECT)
 
         for same_world in [True, False]:  # 先匹配当前世界的 再匹配其他世界的
             for route in route_list:
                 if (uni_num in route.support_world) != same_world:
                     continue
                 source = route.mm
-                template = cv2_utils.crop_image_only(mm, Rect(30, 30, 160, 160))
                 mr = cv2_utils.match_template(source, template, threshold=0.6, only_best=True)
 
                 if mr.max is None and route.mm2 is not None:
                     source = route.mm2
-                    template, _ = cv2_utils.crop_image(mm, Rect(30, 30, 160, 160))
                     mr = cv2_utils.match_template(source, template, threshold=0.6, only_best=True)
 
                 if mr.max is None:
@@ -93,11 +238,52 @@ class SimUniRouteData:
                     target_route = route
                     target_mr = mr.max
 
-        if target_route is not None and uni_num not in target_route.support_world:
-            target_route.add_support_world(uni_num)
-            target_route.save()
+        return target_route, target_mr
 
-        if target_mr is not None:
-            log.debug(f'当前匹配路线置信度 {target_mr.confidence:.2f}')
 
-        return target_route
+def __debug():
+    """
+    离线评估粗筛的效果
+    使用所有路线的开始点小地图 以及 .debug/images/sim_uni_mm 下保存的小地图截图
+    对比全量匹配和粗筛后匹配的结果是否一致 以及耗时
+    """
+    from one_dragon.utils import debug_utils
+    from sr_od.app.sim_uni.sim_uni_const import SimUniLevelTypeEnum
+    from sr_od.context.sr_context import SrContext
+    ctx = SrContext()
+    route_data = SimUniRouteData(ctx.map_data)
+    level_type = SimUniLevelTypeEnum.COMBAT.value
+    route_list = route_data.get_route_list(level_type)
+
+    mm_list: List[MatLike] = [route.mm for route in route_list]
+    mm_dir = os.path.join(debug_utils.get_debug_image_dir_path(), 'sim_uni_mm')
+    if os.path.exists(mm_dir):
+        for file_name in os.listdir(mm_dir):
+            if file_name.endswith('.png'):
+                mm_list.append(cv2_utils.read_image(os.path.join(mm_dir, file_name)))
+
+    route_data.get_route_index(level_type)  # 索引构建不计入耗时
+    full_scan_seconds = 0
+    index_seconds = 0
+    same_cnt = 0
+    for mm in mm_list:
+        for uni_num in range(3, 9):
+            t1 = time.time()
+            r1 = route_data.match_best_sim_uni_route_by_full_scan(uni_num, level_type, mm)
+            t2 = time.time()
+            r2, _ = route_data._match_route_by_index(uni_num, level_type, mm)
+            t3 = time.time()
+            full_scan_seconds += t2 - t1
+            index_seconds += t3 - t2
+            if (r1 is None and r2 is None) or (r1 is not None and r2 is not None and r1.uid == r2.uid):
+                same_cnt += 1
+
+    total = len(mm_list) * 6
+    print('路线数量 %d 测试次数 %d' % (len(route_list), total))
+    print('top-1 一致率 %.4f' % (same_cnt / total))
+    print('全量匹配 平均耗时 %.2f ms' % (full_scan_seconds * 1000 / total))
+    print('粗筛匹配 平均耗时 %.2f ms' % (index_seconds * 1000 / total))
+
+
+if __name__ == '__main__':
+    __debug()
@@ -3,13 +3,12 @@ import time
 from enum import Enum
 from typing import List, Set, Optional, Any
 
-from basic.i18_utils import gt
-from basic.log_utils import log
-from sr.const.character_const import is_attack_character, SILVERWOLF, is_survival_character, is_support_character, \
+from one_dragon.utils.i18_utils import gt
+from one_dragon.utils.log_utils import log
+from sr_od.app.treasures_lightward.treasures_lightward_const import TreasuresLightwardTypeEnum
+from sr_od.config.character_const import is_attack_character, SILVERWOLF, is_survival_character, is_support_character, \
     Character, get_character_by_id, CharacterCombatType, ATTACK_PATH_LIST, SURVIVAL_PATH_LIST, SUPPORT_PATH_LIST, \
     get_combat_type_by_id, CHARACTER_COMBAT_TYPE_LIST
-from sr.performance_recorder import record_performance
-from sr.treasures_lightward.treasures_lightward_const import TreasuresLightwardTypeEnum
 
 
 class TreasuresLightwardTeamModuleType:
@@ -685,12 +684,11 @@ class TreasuresLightwardMissionTeam:
                       )
 
 
-@record_performance
-def search_best_mission_team(
+def search_best_mission_team_by_dfs(
         node_combat_types: List[List[CharacterCombatType]],
         config_module_list: List[TreasuresLightwardTeamModule]) -> Optional[List[List[Character]]]:
     """
-    穷举配队组合
+    穷举配队组合 原来的实现 保留用于校验 search_best_mission_team 的结果
     :param node_combat_types: 节点对应属性
     :param config_module_list: 配队模块列表
     :return: 配队组合
@@ -786,3 +784,366 @@ def search_best_mission_team(
         return None
     else:
         return best_mission_team.final_character_list
+
+
+def _cal_node_score(items: List[TreasuresLightwardTeamModuleItem],
+                    with_silver: bool,
+                    combat_type_list: List[CharacterCombatType]) -> tuple[float, float, float, float, float, float]:
+    """
+    计算一个节点配队的得分 计算过程与 TreasuresLightwardNodeTeamScore 完全一致 但不需要构造配队对象
+    :param items: 节点中的角色 按模块加入的顺序
+    :param with_silver: 是否有银狼
+    :param combat_type_list: 节点需要的属性
+    :return: 人数得分, 输出位得分, 生存位得分, 辅助位得分, 属性得分, 总得分
+    """
+    combat_type_not_need_cnt = 0
+    if with_silver:
+        combat_type_not_need_cnt = len(set(item.character.combat_type for item in items
+                                           if item.character.combat_type not in combat_type_list))
+
+    attack_cnt = survival_cnt = support_cnt = 0
+    combat_type_attack_cnt = combat_type_attack_cnt_under_silver = 0
+    combat_type_other_cnt = combat_type_other_cnt_under_silver = 0
+    for item in items:
+        in_origin = item.character.combat_type in combat_type_list
+        if item.is_attack:
+            attack_cnt += 1
+            if in_origin:
+                combat_type_attack_cnt += 1
+            elif with_silver:  # 有银狼时 不在原属性里的都在调整后的属性里
+                combat_type_attack_cnt_under_silver += 1
+        elif item.is_survival or item.is_support:
+            if item.is_survival:
+                survival_cnt += 1
+            else:
+                support_cnt += 1
+            if in_origin:
+                combat_type_other_cnt += 1
+            elif with_silver:
+                combat_type_other_cnt_under_silver += 1
+
+    cnt_score = (attack_cnt + survival_cnt + support_cnt) * 1e8
+
+    attack_score = 0
+    if attack_cnt > 0:
+        attack_score += 1e6
+    if combat_type_attack_cnt > 0:
+        attack_score += 1e7
+    elif combat_type_attack_cnt_under_silver > 0 and combat_type_not_need_cnt > 0:
+        attack_score += 0.9 * 1e7 / combat_type_not_need_cnt
+
+    survival_score = 0
+    if survival_cnt > 0:
+        survival_score += 1e5
+
+    support_score = support_cnt * 1e4
+
+    combat_type_score = (combat_type_attack_cnt + combat_type_other_cnt) * 1e3
+    if combat_type_not_need_cnt > 0:
+        combat_type_score += 0.9 * (combat_type_attack_cnt_under_silver + combat_type_other_cnt_under_silver) * 1e3 / combat_type_not_need_cnt
+
+    total_score = cnt_score + attack_score + survival_score + support_score + combat_type_score
+    return cnt_score, attack_score, survival_score, support_score, combat_type_score, total_score
+
+
+def search_best_mission_team(
+        node_combat_types: List[List[CharacterCombatType]],
+        config_module_list: List[TreasuresLightwardTeamModule]) -> Optional[List[List[Character]]]:
+    """
+    穷举配队组合 搜索顺序和剪枝条件与 search_best_mission_team_by_dfs 一致 结果也完全一致
+    - 角色使用位运算表示 判断冲突不需要遍历
+    - 节点得分按(节点, 模块组合)缓存 不需要每次重新构造得分对象
+    - 增加得分上限的剪枝 剩余模块全部按最好的情况加入也不可能超过最佳配队时 直接返回
+    - 找到更好的配队时只记录各节点使用的模块下标 不需要深拷贝
+    :param node_combat_types: 节点对应属性
+    :param config_module_list: 配队模块列表
+    :return: 配队组合
+    """
+    total_node_cnt: int = len(node_combat_types)
+
+    # 先排序 保证可以按阶段搜索
+    sorted_config_module_list = sorted(config_module_list, key=lambda x: x.module_node_phase)
+    module_cnt: int = len(sorted_config_module_list)
+
+    character_bit: dict[str, int] = {}
+    module_mask: List[int] = []  # 模块中角色的位
+    module_size: List[int] = []  # 模块中角色的数量
+    module_phase: List[int] = []  # 模块的配队节点状态
+    module_with_silver: List[bool] = []  # 模块中是否有银狼
+    for module in sorted_config_module_list:
+        mask = 0
+        for item in module.character_list:
+            if item.character_id not in character_bit:
+                character_bit[item.character_id] = 1 << len(character_bit)
+            mask |= character_bit[item.character_id]
+        module_mask.append(mask)
+        module_size.append(len(module.character_list))
+        module_phase.append(module.module_node_phase)
+        module_with_silver.append(module.with_silver)
+
+    suffix_size: List[int] = [0] * (module_cnt + 1)  # 从某个模块开始 剩余模块的角色数量
+    for i in range(module_cnt - 1, -1, -1):
+        suffix_size[i] = suffix_size[i + 1] + module_size[i]
+
+    node_modules: List[List[int]] = [[] for _ in range(total_node_cnt)]  # 各节点使用的模块下标
+    node_mask: List[int] = [0] * total_node_cnt
+    node_cnt: List[int] = [0] * total_node_cnt
+    node_phase: List[int] = [0] * total_node_cnt
+    used_mask: int = 0
+
+    node_score_cache: dict[tuple, tuple] = {}
+
+    def get_node_score(node_idx: int) -> tuple:
+        key = (node_idx, tuple(node_modules[node_idx]))
+        score = node_score_cache.get(key)
+        if score is None:
+            items = []
+            with_silver = False
+            for module_idx in node_modules[node_idx]:
+                items += sorted_config_module_list[module_idx].character_list
+                with_silver = with_silver or module_with_silver[module_idx]
+            score = _cal_node_score(items, with_silver, node_combat_types[node_idx])
+            node_score_cache[key] = score
+        return score
+
+    def get_mission_score() -> List[float]:
+        """
+        :return: 人数得分, 输出位得分, 生存位得分, 辅助位得分, 属性得分, 总得分 各节点按顺序累加
+        """
+        mission_score = [0, 0, 0, 0, 0, 0]
+        for node_idx in range(total_node_cnt):
+            node_score = get_node_score(node_idx)
+            for i in range(6):
+                mission_score[i] += node_score[i]
+        return mission_score
+
+    best_modules: Optional[List[tuple]] = None
+    best_score: Optional[List[float]] = None
+
+    def cal_upper_bound(current_module_idx: int) -> float:
+        """
+        当前配队继续搜索下去 能得到的总得分上限
+        模块按阶段排序 剩余模块都处于生存阶段后 输出位和银狼不会再变化 输出分和属性分的变化有上限
+        :param current_module_idx: 当前使用的模块下标
+        :return:
+        """
+        remain_character_cnt = 0  # 剩余模块中 与已选角色不冲突的角色数量
+        for module_idx in range(current_module_idx, module_cnt):
+            if module_mask[module_idx] & used_mask == 0:
+                remain_character_cnt += module_size[module_idx]
+        remain_phase = module_phase[current_module_idx] if current_module_idx < module_cnt else NODE_PHASE_SUPPORT + 1
+
+        total_slot_cnt = 0
+        upper_bound = 0
+        for node_idx in range(total_node_cnt):
+            slot_cnt = 4 - node_cnt[node_idx]
+            total_slot_cnt += slot_cnt
+            cnt_score, attack_score, survival_score, support_score, combat_type_score, _ = get_node_score(node_idx)
+            upper_bound += cnt_score
+            if remain_phase >= NODE_PHASE_SURVIVAL:
+                upper_bound += attack_score + combat_type_score + slot_cnt * 1e3
+            else:
+                upper_bound += 1e6 + 1e7 + 4 * 1e3
+            if remain_phase >= NODE_PHASE_SUPPORT:
+                upper_bound += survival_score
+            else:
+                upper_bound += 1e5
+            upper_bound += support_score + slot_cnt * 1e4
+
+        upper_bound += min(total_slot_cnt, remain_character_cnt) * 1e8
+        return upper_bound
+
+    def impossibly_greater(current_module_idx: int) -> bool:
+        """
+        当前配队是否不可能比之前最好的记录更好了 判断与 search_best_mission_team_by_dfs 一致
+        :param current_module_idx: 当前使用的模块下标
+        :return:
+        """
+        if best_score is None:
+            return False
+
+        character_cnt = sum(node_cnt)
+        if cal_upper_bound(current_module_idx) + 1 < best_score[5]:  # 剩余模块全部按最好的情况加入 也追不上最佳配队
+            return True
+
+        if 0 in node_cnt:  # 未完成配队
+            return False
+
+        _, attack_score, survival_score, support_score, combat_type_score, _ = get_mission_score()
+        all_node_after_attack_and_silver: bool = True  # 所有节点都选过输出和银狼了
+        all_node_after_survival: bool = True  # 所有节点都选过生存位了
+        for phase in node_phase:
+            if phase <= 1:
+                all_node_after_attack_and_silver = False
+            if phase <= 2:
+                all_node_after_survival = False
+
+        if all_node_after_attack_and_silver and attack_score < best_score[1]:
+            return True
+        elif all_node_after_survival:
+            if survival_score < best_score[2]:
+                return True
+            elif support_score + (8 - character_cnt) * 1e4 < best_score[3]:
+                return True
+            elif support_score + (8 - character_cnt) * 1e4 == best_score[3]:
+                if combat_type_score + (8 - character_cnt) * 1e3 < best_score[4]:
+                    return True
+
+        return False
+
+    def dfs(current_module_idx: int):
+        """
+        递归遍历配队组合
+        :param current_module_idx: 当前使用的模块下标
+        :return:
+        """
+        nonlocal best_modules, best_score, used_mask
+        if current_module_idx == module_cnt:
+            if 0 not in node_cnt:
+                mission_score = get_mission_score()
+                if best_score is None or mission_score[5] > best_score[5]:
+                    best_score = mission_score
+                    best_modules = [tuple(i) for i in node_modules]
+            return
+
+        if impossibly_greater(current_module_idx):
+            return
+
+        module_idx = current_module_idx
+        mask = module_mask[module_idx]
+        size = module_size[module_idx]
+        next_node_phase = module_phase[module_idx]
+
+        for node_idx in range(total_node_cnt):  # 使用当前模块加入
+            if next_node_phase < node_phase[node_idx]:
+                continue
+            if node_cnt[node_idx] + size > 4:  # 超过人数限制
+                continue
+            if used_mask & mask != 0:  # 角色已经在其他配队中
+                continue
+
+            node_modules[node_idx].append(module_idx)
+            node_mask[node_idx] |= mask
+            node_cnt[node_idx] = bin(node_mask[node_idx]).count('1')
+            used_mask |= mask
+            temp_phase = node_phase[node_idx]
+            node_phase[node_idx] = next_node_phase
+
+            dfs(module_idx + 1)
+
+            node_modules[node_idx].pop()
+            node_mask[node_idx] &= ~mask
+            node_cnt[node_idx] = bin(node_mask[node_idx]).count('1')
+            used_mask &= ~mask
+            node_phase[node_idx] = temp_phase
+
+        # 不使用当前模块加入
+        dfs(module_idx + 1)
+
+    start_time = time.time()
+    dfs(0)  # 搜索
+    log.info('组合配队完成 耗时 %.2f秒', time.time() - start_time)
+
+    if best_modules is None:
+        return None
+
+    best_mission_team = TreasuresLightwardMissionTeam(node_combat_types)
+    for node_idx in range(total_node_cnt):
+        for module_idx in best_modules[node_idx]:
+            best_mission_team.add_to_node(node_idx, sorted_config_module_list[module_idx])
+    return best_mission_team.final_character_list
+
+
+def __debug_random_module_list(rand, module_cnt: int) -> List[TreasuresLightwardTeamModule]:
+    """
+    随机生成配队模块 每个模块1~4个角色 随机指定角色类型、位置和可用属性
+    :param rand: random.Random
+    :param module_cnt: 模块数量
+    :return:
+    """
+    from sr_od.config import character_const
+    all_character_list = [i for i in vars(character_const).values() if isinstance(i, Character)]
+    all_combat_type_id_list = [i.id for i in CHARACTER_COMBAT_TYPE_LIST]
+    module_list = []
+    for _ in range(module_cnt):
+        character_list = [
+            {
+                'character_id': c.id,
+                'character_type': rand.choice(['AUTO', 'AUTO', 'AUTO', 'ATTACK', 'SURVIVAL', 'SUPPORT']),
+                'pos': rand.choice(['AUTO', 'AUTO', 'FIRST', 'SECOND']),
+            }
+            for c in rand.sample(all_character_list, rand.choice([1, 1, 2, 2, 3, 4]))
+        ]
+        combat_type_list = rand.sample(all_combat_type_id_list, rand.randint(1, len(all_combat_type_id_list)))
+        module_list.append(TreasuresLightwardTeamModule(character_list=character_list, combat_type_list=combat_type_list))
+    return module_list
+
+
+def __debug_to_id(mission_team: Optional[List[List[Character]]]) -> Optional[List[List[Optional[str]]]]:
+    if mission_team is None:
+        return None
+    return [[None if c is None else c.id for c in node_team] for node_team in mission_team]
+
+
+def __debug_check(corpus_cnt: int = 200, seed: int = 0):
+    """
+    随机生成配队模块 对比 search_best_mission_team 与 search_best_mission_team_by_dfs 的结果
+    原来的搜索在模块较多时很慢 这里每组只有1~14个模块
+    """
+    import logging
+    import random
+    log.setLevel(logging.WARNING)
+    rand = random.Random(seed)
+    mismatch_cnt = 0
+    dfs_seconds = 0
+    new_seconds = 0
+    for case_idx in range(corpus_cnt):
+        module_list = __debug_random_module_list(rand, rand.randint(1, 14))
+        node_combat_types = [rand.sample(CHARACTER_COMBAT_TYPE_LIST, rand.randint(1, 3)) for _ in range(2)]
+
+        start_time = time.time()
+        dfs_result = search_best_mission_team_by_dfs(node_combat_types, module_list)
+        dfs_seconds += time.time() - start_time
+
+        start_time = time.time()
+        new_result = search_best_mission_team(node_combat_types, module_list)
+        new_seconds += time.time() - start_time
+
+        if __debug_to_id(dfs_result) != __debug_to_id(new_result):
+            mismatch_cnt += 1
+            print('结果不一致', case_idx, __debug_to_id(dfs_result), __debug_to_id(new_result))
+    print('共 %d 组 不一致 %d 组 原来耗时 %.2f秒 现在耗时 %.2f秒' % (corpus_cnt, mismatch_cnt, dfs_seconds, new_seconds))
+
+
+def __debug_benchmark(module_cnt_list: List[int] = None, seed: int = 1):
+    """
+    随机生成10~40个配队模块 统计 search_best_mission_team 的耗时
+    原来的搜索只在15个模块以内运行和比较
+    """
+    import logging
+    import random
+    log.setLevel(logging.WARNING)
+    if module_cnt_list is None:
+        module_cnt_list = [10, 15, 20, 30, 40]
+    rand = random.Random(seed)
+    for module_cnt in module_cnt_list:
+        module_list = __debug_random_module_list(rand, module_cnt)
+        node_combat_types = [rand.sample(CHARACTER_COMBAT_TYPE_LIST, 2) for _ in range(2)]
+
+        start_time = time.time()
+        new_result = search_best_mission_team(node_combat_types, module_list)
+        new_seconds = time.time() - start_time
+        if module_cnt > 15:
+            print('%d个模块 耗时 %.3f秒' % (module_cnt, new_seconds))
+            continue
+
+        start_time = time.time()
+        dfs_result = search_best_mission_team_by_dfs(node_combat_types, module_list)
+        dfs_seconds = time.time() - start_time
+        print('%d个模块 耗时 %.3f秒 原来耗时 %.3f秒 结果一致 %s' % (
+            module_cnt, new_seconds, dfs_seconds, __debug_to_id(dfs_result) == __debug_to_id(new_result)))
+
+
+if __name__ == '__main__':
+    __debug_check()
+    __debug_benchmark()
@@ -11,8 +11,10 @@ from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 from sr_od.app.sr_application import SrApplication
 from sr_od.app.world_patrol.world_patrol_route import WorldPatrolRoute
+from sr_od.app.world_patrol.world_patrol_route_planner import WorldPatrolRoutePlanner
 from sr_od.app.world_patrol.world_patrol_run_route import WorldPatrolRunRoute
-from sr_od.app.world_patrol.world_patrol_whitelist_config import load_all_whitelist_list, WorldPatrolWhitelist
+from sr_od.app.world_patrol.world_patrol_whitelist_config import load_all_whitelist_list, WorldPatrolWhitelist, \
+    WorldPatrolWhiteListType
 from sr_od.context.sr_context import SrContext
 from sr_od.operations.back_to_normal_world_plus import BackToNormalWorldPlus
 from sr_od.operations.cancel_mission_trace import CancelMissionTrace
@@ -38,6 +40,13 @@ class WorldPatrolApp(SrApplication):
         self.team_num: Optional[int] = team_num
         self.param_whitelist: WorldPatrolWhitelist = whitelist
 
+    def prefetch_for_application(self) -> None:
+        """
+        一条龙中 在上一个应用运行时 预热模型和大地图 并读取全部路线文件到缓存
+        """
+        self.ctx.prefetch_for_world_patrol()
+        self.ctx.world_patrol_route_data.load_all_route()
+
     @operation_node(name='加载路线', is_start_node=True)
     def load_route_list(self) -> OperationRoundResult:
         whitelist = self.param_whitelist
@@ -52,6 +61,11 @@ class WorldPatrolApp(SrApplication):
             whitelist=whitelist,
             finished=[] if self.ignore_record else self.ctx.world_patrol_record.finished
         )
+        # 白名单需要按名单顺序运行
+        if (self.ctx.world_patrol_config.optimize_route_order
+                and (whitelist is None or whitelist.type != WorldPatrolWhiteListType.WHITE.value.value)):
+            planner = WorldPatrolRoutePlanner(self.ctx.world_patrol_record)
+            self.route_list = planner.plan(self.route_list)
         self.current_route_idx = 0
 
         if len(self.route_list) == 0:
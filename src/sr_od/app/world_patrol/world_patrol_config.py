@@ -83,4 +83,20 @@ class WorldPatrolConfig(YamlConfig):
 
     @property
     def max_consumable_cnt_adapter(self) -> YamlConfigAdapter:
-        return YamlConfigAdapter(self, 'max_consumable_cnt', 0, 'str', 'int')
\ No newline at end of file
+        return YamlConfigAdapter(self, 'max_consumable_cnt', 0, 'str', 'int')
+
+    @property
+    def optimize_route_order(self) -> bool:
+        """
+        按传送耗时重新排序路线 使用白名单时保持名单顺序
+        :return:
+        """
+        return self.get('optimize_route_order', True)
+
+    @optimize_route_order.setter
+    def optimize_route_order(self, new_value: bool):
+        self.update('optimize_route_order', new_value)
+
+    @property
+    def optimize_route_order_adapter(self) -> YamlConfigAdapter:
+        return YamlConfigAdapter(self, 'optimize_route_order', True)
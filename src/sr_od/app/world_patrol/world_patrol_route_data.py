@@ -87,7 +87,7 @@ class WorldPatrolRouteData:
         :param whitelist: 传入后 按名单筛选路线
         :param finished_unique_id: 传入后 排除已经完成的路线
         """
-        yaml_op = YamlOperator(yaml_path)
+        yaml_op = YamlOperator(yaml_path, use_cache=True)
         route_filename = os.path.basename(yaml_path)
 
         planet_name = yaml_op.get('planet', None)
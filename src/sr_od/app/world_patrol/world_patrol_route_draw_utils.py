@@ -1,13 +1,15 @@
 import time
 
 import cv2
-from typing import Tuple, Optional
+from cv2.typing import MatLike
+from typing import Tuple, Optional, List
 
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.matcher.match_result import MatchResult
 from one_dragon.utils import cal_utils
 from one_dragon.utils.log_utils import log
 from sr_od.app.world_patrol.world_patrol_route import WorldPatrolRoute, WorldPatrolRouteOperation
+from sr_od.app.world_patrol.world_patrol_route_renderer import RouteDrawItem, WorldPatrolRouteRenderer
 from sr_od.config import operation_const
 from sr_od.context.sr_context import SrContext
 from sr_od.operations.move import cal_pos_utils
@@ -116,17 +118,48 @@ def get_route_image(ctx: SrContext, route: WorldPatrolRoute):
     :param route: 路线 在传送点还没有选的时候 可能为空
     :return:
     """
+    to_display_region, item_list = get_route_draw_items(ctx, route)
+
+    display_image = ctx.map_data.get_large_map_info(to_display_region).raw.copy()
+    for item in item_list:
+        item.draw(display_image)
+
+    return display_image
+
+
+def render_route_image(ctx: SrContext, renderer: WorldPatrolRouteRenderer, route: WorldPatrolRoute,
+                       scale: float = 1) -> MatLike:
+    """
+    使用增量绘制获取路线的图片 与 get_route_image 的结果一致 但不需要每次复制整张大地图
+    :param ctx: 上下文
+    :param renderer: 绘制器
+    :param route: 路线
+    :param scale: 缩放比例
+    :return: 绘制器的画布 下次绘制时会被修改
+    """
+    to_display_region, item_list = get_route_draw_items(ctx, route)
+    raw = ctx.map_data.get_large_map_info(to_display_region).raw
+    return renderer.render(to_display_region.prl_id, raw, item_list, scale)
+
+
+def get_route_draw_items(ctx: SrContext, route: WorldPatrolRoute) -> Tuple[Region, List[RouteDrawItem]]:
+    """
+    获取路线需要画出的图形
+    :param ctx: 上下文
+    :param route: 路线
+    :return: 显示的区域 和 按绘制顺序排列的图形
+    """
     to_display_region, _ = get_last_pos(ctx, route)
     current_region = route.tp.region
 
-    display_image = ctx.map_data.get_large_map_info(to_display_region).raw.copy()
+    item_list: List[RouteDrawItem] = []
 
     last_point = None
     if route.tp is not None:
         last_point = route.tp.tp_pos.tuple()
         if current_region.pr_id == to_display_region.pr_id:  # 只画出最后一个区域的地图
-            cv2.circle(display_image, route.tp.lm_pos.tuple(), 15, color=(100, 255, 100), thickness=2)
-            cv2.circle(display_image, route.tp.tp_pos.tuple(), 5, color=(0, 255, 0), thickness=2)
+            item_list.append(RouteDrawItem.circle(route.tp.lm_pos.tuple(), 15, color=(100, 255, 100), thickness=2))
+            item_list.append(RouteDrawItem.circle(route.tp.tp_pos.tuple(), 5, color=(0, 255, 0), thickness=2))
     for route_item in route.route_list:
         if route_item.op in [operation_const.OP_MOVE, operation_const.OP_SLOW_MOVE, operation_const.OP_NO_POS_MOVE]:
             if route_item.op == operation_const.OP_NO_POS_MOVE:
@@ -134,36 +167,36 @@ def get_route_image(ctx: SrContext, route: WorldPatrolRoute):
             else:
                 pos = route_item.data
             if current_region.pr_id == to_display_region.pr_id:
-                cv2.circle(display_image, pos[:2], 5, color=(0, 0, 255), thickness=-1)
+                item_list.append(RouteDrawItem.circle(pos[:2], 5, color=(0, 0, 255), thickness=-1))
                 if last_point is not None:
-                    cv2.line(display_image, last_point[:2], pos[:2],
-                             color=(255, 0, 0) if route_item.op == operation_const.OP_MOVE else (255, 255, 0),
-                             thickness=2)
-                cv2.putText(display_image, str(route_item.idx), (pos[0] - 5, pos[1] - 13),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 1, cv2.LINE_AA)
+                    item_list.append(RouteDrawItem.line(last_point[:2], pos[:2],
+                                                        color=(255, 0, 0) if route_item.op == operation_const.OP_MOVE else (255, 255, 0),
+                                                        thickness=2))
+                item_list.append(RouteDrawItem.put_text(str(route_item.idx), (pos[0] - 5, pos[1] - 13),
+                                                        0.6, (0, 0, 255), 1))
             last_point = pos
         elif route_item.op == operation_const.OP_PATROL:
             if current_region.pr_id == to_display_region.pr_id:
                 if last_point is not None:
-                    cv2.circle(display_image, last_point[:2], 10, color=(0, 255, 255), thickness=2)
+                    item_list.append(RouteDrawItem.circle(last_point[:2], 10, color=(0, 255, 255), thickness=2))
         elif route_item.op == operation_const.OP_DISPOSABLE:
             if current_region.pr_id == to_display_region.pr_id:
                 if last_point is not None:
-                    cv2.circle(display_image, last_point[:2], 10, color=(67, 34, 49), thickness=2)
+                    item_list.append(RouteDrawItem.circle(last_point[:2], 10, color=(67, 34, 49), thickness=2))
         elif route_item.op in [operation_const.OP_INTERACT, operation_const.OP_CATAPULT, operation_const.OP_GAMEPLAY_INTERACT]:
             if current_region.pr_id == to_display_region.pr_id:
                 if last_point is not None:
-                    cv2.circle(display_image, last_point[:2], 12, color=(255, 0, 255), thickness=2)
+                    item_list.append(RouteDrawItem.circle(last_point[:2], 12, color=(255, 0, 255), thickness=2))
         elif route_item.op == operation_const.OP_WAIT:
             if current_region.pr_id == to_display_region.pr_id:
                 if last_point is not None:
-                    cv2.circle(display_image, last_point[:2], 14, color=(255, 255, 255), thickness=2)
+                    item_list.append(RouteDrawItem.circle(last_point[:2], 14, color=(255, 255, 255), thickness=2))
         elif route_item.op == operation_const.OP_UPDATE_POS:
             pos = route_item.data
             if current_region.pr_id == to_display_region.pr_id:
-                cv2.circle(display_image, pos[:2], 5, color=(0, 0, 255), thickness=-1)
-                cv2.putText(display_image, str(route_item.idx), (pos[0] - 5, pos[1] - 13),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 1, cv2.LINE_AA)
+                item_list.append(RouteDrawItem.circle(pos[:2], 5, color=(0, 0, 255), thickness=-1))
+                item_list.append(RouteDrawItem.put_text(str(route_item.idx), (pos[0] - 5, pos[1] - 13),
+                                                        0.6, (0, 0, 255), 1))
             last_point = pos
             if len(pos) > 2:
                 current_region = ctx.map_data.region_with_another_floor(current_region, int(pos[2]))
@@ -172,7 +205,7 @@ def get_route_image(ctx: SrContext, route: WorldPatrolRoute):
         elif route_item.op in [operation_const.OP_BAN_TECH, operation_const.OP_ALLOW_TECH]:
             pass
 
-    return display_image
+    return to_display_region, item_list
 
 
 def add_move(ctx: SrContext, route: WorldPatrolRoute, x: int, y: int, floor: int):
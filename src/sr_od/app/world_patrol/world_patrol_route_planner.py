@@ -0,0 +1,304 @@
+import time
+from typing import List, Optional, Tuple
+
+from one_dragon.utils.log_utils import log
+from sr_od.app.world_patrol.world_patrol_route import WorldPatrolRoute
+from sr_od.app.world_patrol.world_patrol_run_record import WorldPatrolRunRecord
+from sr_od.config import operation_const
+
+
+class WorldPatrolRoutePlanner:
+
+    DEFAULT_ROUTE_SECONDS: float = 90
+    """没有运行记录时 路线的预计耗时"""
+
+    START_SECONDS: float = 30
+    """第一条路线前 打开地图并选择星球区域的耗时"""
+
+    SAME_REGION_SECONDS: float = 8
+    """同一区域内传送的耗时"""
+
+    SWITCH_FLOOR_SECONDS: float = 3
+    """同一区域内 需要额外切换楼层的耗时"""
+
+    SAME_PLANET_SECONDS: float = 15
+    """同一星球内 切换区域后传送的耗时"""
+
+    CROSS_PLANET_SECONDS: float = 25
+    """切换星球和区域后传送的耗时"""
+
+    def __init__(self, run_record: Optional[WorldPatrolRunRecord] = None,
+                 max_improve_rounds: int = 50,
+                 max_improve_seconds: float = 0.3):
+        """
+        锄大地路线的排序
+        每条路线的耗时来自运行记录 路线之间的耗时按传送时是否需要切换楼层、区域、星球估算
+        把排序看作一个有固定起点的非对称旅行商问题 用最近邻得到初始顺序 再用 2-opt 和 or-opt 改进
+        整个过程不使用随机数 相同输入总是得到相同的顺序 改进超时时保留当前已经改进的顺序
+        :param run_record: 运行记录
+        :param max_improve_rounds: 改进的最大轮数
+        :param max_improve_seconds: 改进的最长耗时 每次改进都会减少耗时 超时后直接使用当前的顺序
+        """
+        self.run_record: Optional[WorldPatrolRunRecord] = run_record
+        self.max_improve_rounds: int = max_improve_rounds
+        self.max_improve_seconds: float = max_improve_seconds
+
+    def get_route_seconds(self, route: WorldPatrolRoute) -> float:
+        """
+        路线本身的预计耗时
+        :param route: 路线
+        :return:
+        """
+        if self.run_record is None:
+            return WorldPatrolRoutePlanner.DEFAULT_ROUTE_SECONDS
+        seconds = self.run_record.get_estimate_time(route.unique_id)
+        return float(seconds) if seconds > 0 else WorldPatrolRoutePlanner.DEFAULT_ROUTE_SECONDS
+
+    def get_transition_seconds(self, prev_route: Optional[WorldPatrolRoute], next_route: WorldPatrolRoute) -> float:
+        """
+        上一条路线结束后 传送到下一条路线开始点的预计耗时
+        地图会停留在上一条路线结束时的区域和楼层 因此耗时与方向有关
+        :param prev_route: 上一条路线 为空时代表第一条路线
+        :param next_route: 下一条路线
+        :return:
+        """
+        if prev_route is None:
+            return WorldPatrolRoutePlanner.START_SECONDS
+
+        next_region = next_route.tp.region
+        prev_region = prev_route.tp.region
+        if prev_region.planet.np_id != next_region.planet.np_id:
+            return WorldPatrolRoutePlanner.CROSS_PLANET_SECONDS
+        if prev_region.pr_id != next_region.pr_id:
+            return WorldPatrolRoutePlanner.SAME_PLANET_SECONDS
+        if WorldPatrolRoutePlanner.get_end_floor(prev_route) != next_region.floor:
+            return WorldPatrolRoutePlanner.SAME_REGION_SECONDS + WorldPatrolRoutePlanner.SWITCH_FLOOR_SECONDS
+        return WorldPatrolRoutePlanner.SAME_REGION_SECONDS
+
+    @staticmethod
+    def get_end_floor(route: WorldPatrolRoute) -> int:
+        """
+        路线结束时所在的楼层
+        只有 move, slow_move, update_pos 的第3个数据是楼层 no_pos_move 的第3个数据是移动时间
+        :param route: 路线
+        :return:
+        """
+        floor = route.tp.region.floor
+        for op in route.route_list:
+            if op.op in [operation_const.OP_MOVE, operation_const.OP_SLOW_MOVE, operation_const.OP_UPDATE_POS]:
+                if op.data is not None and len(op.data) > 2:
+                    floor = op.data[2]
+        return floor
+
+    def get_total_seconds(self, route_list: List[WorldPatrolRoute]) -> float:
+        """
+        按顺序运行全部路线的预计耗时
+        :param route_list: 路线列表
+        :return:
+        """
+        total = 0
+        prev_route = None
+        for route in route_list:
+            total += self.get_transition_seconds(prev_route, route) + self.get_route_seconds(route)
+            prev_route = route
+        return total
+
+    def plan(self, route_list: List[WorldPatrolRoute]) -> List[WorldPatrolRoute]:
+        """
+        对路线重新排序 使得预计总耗时最少
+        :param route_list: 路线列表
+        :return: 排序后的路线列表
+        """
+        if len(route_list) <= 1:
+            return list(route_list)
+
+        cost = self._build_cost_matrix(route_list)
+        path = self._nearest_neighbour(cost)
+        deadline = time.time() + self.max_improve_seconds
+        for _ in range(self.max_improve_rounds):
+            improved = self._improve_by_two_opt(cost, path, deadline)
+            improved = self._improve_by_or_opt(cost, path, deadline) or improved
+            if not improved or time.time() > deadline:
+                break
+
+        result = [route_list[node - 1] for node in path[1:]]
+
+        before = self.get_total_seconds(route_list)
+        after = self.get_total_seconds(result)
+        log.info('锄大地路线排序 预计耗时 排序前 %.0f秒 排序后 %.0f秒', before, after)
+        if after > before:  # 改进只会减少耗时 保险起见保留原顺序
+            return list(route_list)
+        return result
+
+    def _build_cost_matrix(self, route_list: List[WorldPatrolRoute]) -> List[List[float]]:
+        """
+        节点0 代表开始 节点i 代表第i条路线
+        cost[i][j] = 从i结束后到j开始的传送耗时 + j本身的耗时
+        :param route_list: 路线列表
+        :return:
+        """
+        n = len(route_list)
+        cost: List[List[float]] = [[0.0] * (n + 1) for _ in range(n + 1)]
+        route_seconds = [self.get_route_seconds(route) for route in route_list]
+        for j in range(1, n + 1):
+            cost[0][j] = self.get_transition_seconds(None, route_list[j - 1]) + route_seconds[j - 1]
+        for i in range(1, n + 1):
+            for j in range(1, n + 1):
+                if i != j:
+                    cost[i][j] = self.get_transition_seconds(route_list[i - 1], route_list[j - 1]) + route_seconds[j - 1]
+        return cost
+
+    @staticmethod
+    def _nearest_neighbour(cost: List[List[float]]) -> List[int]:
+        """
+        从开始节点出发 每次选择耗时最少的下一条路线 耗时一样时选择原顺序靠前的
+        :param cost: 耗时矩阵
+        :return: 节点顺序 第一个是开始节点0
+        """
+        n = len(cost) - 1
+        visited = [False] * (n + 1)
+        visited[0] = True
+        path = [0]
+        current = 0
+        for _ in range(n):
+            best_node = -1
+            for node in range(1, n + 1):
+                if visited[node]:
+                    continue
+                if best_node == -1 or cost[current][node] < cost[current][best_node]:
+                    best_node = node
+            visited[best_node] = True
+            path.append(best_node)
+            current = best_node
+        return path
+
+    @staticmethod
+    def _improve_by_two_opt(cost: List[List[float]], path: List[int], deadline: float) -> bool:
+        """
+        2-opt 反转一段路线 非对称时反转后的耗时用反向边的前缀和计算
+        找到第一个能减少耗时的反转后 修改路线并重新开始
+        :param cost: 耗时矩阵
+        :param path: 节点顺序 会被修改
+        :param deadline: 超过这个时间后停止
+        :return: 是否有改进
+        """
+        n = len(path) - 1
+        improved = False
+        while True:
+            forward, backward = WorldPatrolRoutePlanner._get_prefix_sum(cost, path)
+            move: Optional[Tuple[int, int]] = None
+            for i in range(1, n):
+                if time.time() > deadline:
+                    return improved
+                for j in range(i + 1, n + 1):
+                    old_cost = cost[path[i - 1]][path[i]] + forward[j] - forward[i]
+                    new_cost = cost[path[i - 1]][path[j]] + backward[j] - backward[i]
+                    if j < n:
+                        old_cost += cost[path[j]][path[j + 1]]
+                        new_cost += cost[path[i]][path[j + 1]]
+                    if new_cost < old_cost - 1e-6:
+                        move = (i, j)
+                        break
+                if move is not None:
+                    break
+
+            if move is None:
+                return improved
+            i, j = move
+            path[i:j + 1] = path[i:j + 1][::-1]
+            improved = True
+
+    @staticmethod
+    def _get_prefix_sum(cost: List[List[float]], path: List[int]) -> Tuple[List[float], List[float]]:
+        """
+        正向边和反向边耗时的前缀和
+        forward[k] = path[0]->path[1]->...->path[k] 的耗时
+        backward[k] = path[k]->path[k-1]->...->path[1] 的耗时 不包含开始节点
+        :param cost: 耗时矩阵
+        :param path: 节点顺序
+        :return:
+        """
+        forward = [0.0] * len(path)
+        backward = [0.0] * len(path)
+        for k in range(1, len(path)):
+            forward[k] = forward[k - 1] + cost[path[k - 1]][path[k]]
+            if k >= 2:
+                backward[k] = backward[k - 1] + cost[path[k]][path[k - 1]]
+        return forward, backward
+
+    @staticmethod
+    def _improve_by_or_opt(cost: List[List[float]], path: List[int], deadline: float) -> bool:
+        """
+        or-opt 把连续的1~3条路线 按原方向移动到其它位置
+        找到第一个能减少耗时的移动后 修改路线并重新开始
+        :param cost: 耗时矩阵
+        :param path: 节点顺序 会被修改
+        :param deadline: 超过这个时间后停止
+        :return: 是否有改进
+        """
+        improved = False
+        while True:
+            n = len(path) - 1
+            move: Optional[Tuple[int, int, int]] = None
+            for seg_len in range(1, 4):
+                for i in range(1, n - seg_len + 2):
+                    if time.time() > deadline:
+                        return improved
+                    last = i + seg_len - 1
+                    remove_gain = cost[path[i - 1]][path[i]]
+                    if last < n:
+                        remove_gain += cost[path[last]][path[last + 1]] - cost[path[i - 1]][path[last + 1]]
+                    for k in range(0, n + 1):
+                        if i - 1 <= k <= last:
+                            continue
+                        insert_cost = cost[path[k]][path[i]]
+                        if k < n:
+                            insert_cost += cost[path[last]][path[k + 1]] - cost[path[k]][path[k + 1]]
+                        if insert_cost < remove_gain - 1e-6:
+                            move = (i, last, k)
+                            break
+                    if move is not None:
+                        break
+                if move is not None:
+                    break
+
+            if move is None:
+                return improved
+            i, last, k = move
+            segment = path[i:last + 1]
+            rest = path[:i] + path[last + 1:]
+            insert_idx = k + 1 if k < i else k + 1 - len(segment)
+            path[:] = rest[:insert_idx] + segment + rest[insert_idx:]
+            improved = True
+
+
+def __debug():
+    """
+    使用全部路线 对比排序前后的预计耗时 并确认多次排序结果一致
+    """
+    from sr_od.context.sr_context import SrContext
+    ctx = SrContext()
+    route_list = ctx.world_patrol_route_data.load_all_route()
+    planner = WorldPatrolRoutePlanner(ctx.world_patrol_record)
+
+    result_1 = planner.plan(route_list)
+    result_2 = planner.plan(route_list)
+    print('路线数量 %d' % len(route_list))
+    print('排序前 预计耗时 %.0f秒' % planner.get_total_seconds(route_list))
+    print('排序后 预计耗时 %.0f秒' % planner.get_total_seconds(result_1))
+    print('排序结果一致 %s' % ([r.unique_id for r in result_1] == [r.unique_id for r in result_2]))
+    print('路线不重不漏 %s' % (sorted(r.unique_id for r in result_1) == sorted(r.unique_id for r in route_list)))
+
+    tp = route_list[0].tp
+    new_floor = tp.region.floor + 1
+    no_pos_end_route = WorldPatrolRoute(tp, {
+        'route': [
+            {'op': operation_const.OP_MOVE, 'data': [100, 100, new_floor]},
+            {'op': operation_const.OP_NO_POS_MOVE, 'data': [0, 426, 21]},
+        ]
+    }, '')
+    print('以no_pos_move结束的路线 结束楼层正确 %s' % (WorldPatrolRoutePlanner.get_end_floor(no_pos_end_route) == new_floor))
+
+
+if __name__ == '__main__':
+    __debug()
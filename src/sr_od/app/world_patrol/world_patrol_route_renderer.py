@@ -0,0 +1,341 @@
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Set, Any
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.base.geometry.rectangle import Rect
+
+
+class RouteDrawItem:
+
+    TYPE_CIRCLE: str = 'circle'
+    TYPE_LINE: str = 'line'
+    TYPE_TEXT: str = 'text'
+
+    def __init__(self, draw_type: str, points: Tuple[Tuple[int, int], ...],
+                 color: Tuple[int, int, int], thickness: int,
+                 radius: int = 0, text: str = '', font_scale: float = 0):
+        """
+        路线图上的一个图形 在原图坐标下描述 绘制时按缩放比例换算
+        :param draw_type: 图形种类
+        :param points: 圆心 / 线段的两个端点 / 文本的左下角
+        :param color: 颜色
+        :param thickness: 线宽 -1为填充
+        :param radius: 圆的半径
+        :param text: 文本
+        :param font_scale: 文本大小
+        """
+        self.draw_type: str = draw_type
+        self.points: Tuple[Tuple[int, int], ...] = tuple((int(p[0]), int(p[1])) for p in points)
+        self.color: Tuple[int, int, int] = color
+        self.thickness: int = thickness
+        self.radius: int = radius
+        self.text: str = text
+        self.font_scale: float = font_scale
+
+    @staticmethod
+    def circle(center, radius: int, color: Tuple[int, int, int], thickness: int) -> 'RouteDrawItem':
+        return RouteDrawItem(RouteDrawItem.TYPE_CIRCLE, (center,), color, thickness, radius=radius)
+
+    @staticmethod
+    def line(p1, p2, color: Tuple[int, int, int], thickness: int) -> 'RouteDrawItem':
+        return RouteDrawItem(RouteDrawItem.TYPE_LINE, (p1, p2), color, thickness)
+
+    @staticmethod
+    def put_text(text: str, org, font_scale: float, color: Tuple[int, int, int], thickness: int) -> 'RouteDrawItem':
+        return RouteDrawItem(RouteDrawItem.TYPE_TEXT, (org,), color, thickness, text=text, font_scale=font_scale)
+
+    def _key(self) -> tuple:
+        return self.draw_type, self.points, self.color, self.thickness, self.radius, self.text, self.font_scale
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, RouteDrawItem) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    @staticmethod
+    def _scale_thickness(thickness: int, scale: float) -> int:
+        if thickness < 0:
+            return thickness
+        return max(1, int(round(thickness * scale)))
+
+    def _scale_point(self, idx: int, scale: float, offset_x: int = 0, offset_y: int = 0) -> Tuple[int, int]:
+        p = self.points[idx]
+        return int(round(p[0] * scale)) - offset_x, int(round(p[1] * scale)) - offset_y
+
+    def get_bbox(self, scale: float) -> Rect:
+        """
+        绘制后影响的范围 只需要覆盖即可 不需要精确
+        :param scale: 缩放比例
+        :return: 缩放后的坐标范围
+        """
+        pad = RouteDrawItem._scale_thickness(max(self.thickness, 1), scale) + 2
+        if self.draw_type == RouteDrawItem.TYPE_CIRCLE:
+            x, y = self._scale_point(0, scale)
+            r = max(1, int(round(self.radius * scale))) + pad
+            return Rect(x - r, y - r, x + r, y + r)
+        elif self.draw_type == RouteDrawItem.TYPE_LINE:
+            x1, y1 = self._scale_point(0, scale)
+            x2, y2 = self._scale_point(1, scale)
+            return Rect(min(x1, x2) - pad, min(y1, y2) - pad, max(x1, x2) + pad, max(y1, y2) + pad)
+        else:
+            x, y = self._scale_point(0, scale)
+            (w, h), baseline = cv2.getTextSize(self.text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale * scale,
+                                               RouteDrawItem._scale_thickness(self.thickness, scale))
+            return Rect(x - pad, y - h - pad, x + w + pad, y + baseline + pad)
+
+    def draw(self, image: MatLike, scale: float = 1, offset_x: int = 0, offset_y: int = 0) -> None:
+        """
+        画到图片上 图片可以是画布的一部分 超出图片的部分会被裁剪
+        :param image: 图片
+        :param scale: 缩放比例
+        :param offset_x: 图片左上角在画布中的横坐标
+        :param offset_y: 图片左上角在画布中的纵坐标
+        :return:
+        """
+        thickness = RouteDrawItem._scale_thickness(self.thickness, scale)
+        if self.draw_type == RouteDrawItem.TYPE_CIRCLE:
+            radius = max(1, int(round(self.radius * scale)))
+            cv2.circle(image, self._scale_point(0, scale, offset_x, offset_y), radius,
+                       color=self.color, thickness=thickness)
+        elif self.draw_type == RouteDrawItem.TYPE_LINE:
+            cv2.line(image, self._scale_point(0, scale, offset_x, offset_y),
+                     self._scale_point(1, scale, offset_x, offset_y),
+                     color=self.color, thickness=thickness)
+        else:
+            cv2.putText(image, self.text, self._scale_point(0, scale, offset_x, offset_y),
+                        cv2.FONT_HERSHEY_SIMPLEX, self.font_scale * scale, self.color, thickness, cv2.LINE_AA)
+
+
+class WorldPatrolRouteRenderer:
+
+    def __init__(self, tile_size: int = 256, max_base_cache: int = 8):
+        """
+        画路线时使用的增量绘制
+        底图按区域和缩放比例缓存 路线作为一层图形 画在底图的副本(画布)上
+        路线在末尾增加图形时 只画新增的图形
+        路线在末尾删除或修改图形时 只把受影响的格子从底图恢复 再重画经过这些格子的图形
+        只有切换区域或缩放比例时 才需要复制整张底图
+        :param tile_size: 格子大小
+        :param max_base_cache: 最多缓存多少张底图
+        """
+        self.tile_size: int = tile_size
+        self.max_base_cache: int = max_base_cache
+
+        self._base_cache: OrderedDict[Tuple[str, float], MatLike] = OrderedDict()  # (区域, 缩放比例) -> 底图
+        self._base_source: dict[str, MatLike] = {}  # 区域 -> 生成底图的原图 原图变化时底图失效
+
+        self._canvas_key: Optional[Tuple[str, float]] = None
+        self._canvas_base: Optional[MatLike] = None  # 画布使用的底图
+        self._canvas: Optional[MatLike] = None
+        self._items: List[RouteDrawItem] = []
+        self._item_tiles: List[Set[Tuple[int, int]]] = []
+
+        self.full_render_cnt: int = 0
+        """复制整张底图重画的次数"""
+
+        self.tile_restore_cnt: int = 0
+        """从底图恢复的格子数量"""
+
+    def get_base_image(self, key: str, raw: MatLike, scale: float = 1) -> MatLike:
+        """
+        获取缩放后的底图 结果会缓存 调用方不应修改
+        :param key: 底图的唯一标识 例如区域ID
+        :param raw: 原图
+        :param scale: 缩放比例
+        :return:
+        """
+        if self._base_source.get(key) is not raw:  # 原图变化了 之前的底图都失效
+            for cache_key in [i for i in self._base_cache if i[0] == key]:
+                self._base_cache.pop(cache_key)
+            self._base_source[key] = raw
+
+        cache_key = (key, scale)
+        if cache_key in self._base_cache:
+            self._base_cache.move_to_end(cache_key)
+            return self._base_cache[cache_key]
+
+        if scale == 1:
+            base = raw
+        else:
+            base = cv2.resize(raw, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        self._base_cache[cache_key] = base
+        while len(self._base_cache) > self.max_base_cache:
+            old_key, _ = self._base_cache.popitem(last=False)
+            if not any(i[0] == old_key[0] for i in self._base_cache):
+                self._base_source.pop(old_key[0], None)
+        return base
+
+    def render(self, key: str, raw: MatLike, items: List[RouteDrawItem], scale: float = 1,
+               viewport: Optional[Rect] = None) -> MatLike:
+        """
+        绘制路线
+        :param key: 底图的唯一标识 例如区域ID
+        :param raw: 原图
+        :param items: 路线的全部图形 按绘制顺序排列
+        :param scale: 缩放比例
+        :param viewport: 需要显示的范围 缩放后的坐标 为空时返回整个画布
+        :return: 画布 或画布中显示范围的部分 下次绘制时会被修改
+        """
+        base = self.get_base_image(key, raw, scale)
+        canvas_key = (key, scale)
+        if self._canvas is None or self._canvas_key != canvas_key or self._canvas_base is not base:
+            self._render_full(canvas_key, base, items, scale)
+        else:
+            self._render_incremental(base, items, scale)
+
+        if viewport is None:
+            return self._canvas
+        height, width = self._canvas.shape[:2]
+        x1, y1 = max(0, viewport.x1), max(0, viewport.y1)
+        x2, y2 = min(width, viewport.x2), min(height, viewport.y2)
+        return self._canvas[y1:y2, x1:x2]
+
+    def _render_full(self, canvas_key: Tuple[str, float], base: MatLike,
+                     items: List[RouteDrawItem], scale: float) -> None:
+        """
+        复制整张底图 画上全部图形
+        """
+        self._canvas_key = canvas_key
+        self._canvas_base = base
+        self._canvas = base.copy()
+        self._items = []
+        self._item_tiles = []
+        for item in items:
+            self._add_item(item, scale)
+        self.full_render_cnt += 1
+
+    def _render_incremental(self, base: MatLike, items: List[RouteDrawItem], scale: float) -> None:
+        """
+        与上次绘制的图形比较 只处理变化的部分
+        """
+        same_cnt = 0
+        max_same_cnt = min(len(items), len(self._items))
+        while same_cnt < max_same_cnt and items[same_cnt] == self._items[same_cnt]:
+            same_cnt += 1
+
+        if same_cnt < len(self._items):  # 有图形被删除或修改 恢复受影响的格子
+            dirty_tiles: Set[Tuple[int, int]] = set()
+            for tiles in self._item_tiles[same_cnt:]:
+                dirty_tiles.update(tiles)
+            self._items = self._items[:same_cnt]
+            self._item_tiles = self._item_tiles[:same_cnt]
+            self._restore_tiles(base, dirty_tiles, scale)
+
+        for item in items[same_cnt:]:
+            self._add_item(item, scale)
+
+    def _add_item(self, item: RouteDrawItem, scale: float) -> None:
+        """
+        在画布上画一个图形 并记录它经过的格子
+        """
+        item.draw(self._canvas, scale)
+        self._items.append(item)
+        self._item_tiles.append(self._get_tiles(item.get_bbox(scale)))
+
+    def _get_tiles(self, rect: Rect) -> Set[Tuple[int, int]]:
+        """
+        范围经过的格子
+        """
+        height, width = self._canvas.shape[:2]
+        x1 = max(0, rect.x1) // self.tile_size
+        y1 = max(0, rect.y1) // self.tile_size
+        x2 = min(width - 1, rect.x2) // self.tile_size
+        y2 = min(height - 1, rect.y2) // self.tile_size
+        return {(tx, ty) for tx in range(x1, x2 + 1) for ty in range(y1, y2 + 1)}
+
+    def _restore_tiles(self, base: MatLike, tiles: Set[Tuple[int, int]], scale: float) -> None:
+        """
+        把格子恢复成底图 再按顺序重画经过这些格子的图形
+        图形在格子边缘被裁剪时 线条的光栅化可能与整张绘制有细微差别
+        因此先在一块能完整容纳这些图形的临时图片上重画 再只把格子部分复制回画布
+        """
+        if len(tiles) == 0:
+            return
+
+        to_redraw: List[RouteDrawItem] = []
+        rect_list: List[Rect] = []
+        for tx, ty in tiles:
+            rect_list.append(Rect(tx * self.tile_size, ty * self.tile_size,
+                                  (tx + 1) * self.tile_size, (ty + 1) * self.tile_size))
+        for item, item_tiles in zip(self._items, self._item_tiles):
+            if not item_tiles.isdisjoint(tiles):
+                to_redraw.append(item)
+                rect_list.append(item.get_bbox(scale))
+
+        height, width = self._canvas.shape[:2]
+        x1 = max(0, min(r.x1 for r in rect_list))
+        y1 = max(0, min(r.y1 for r in rect_list))
+        x2 = min(width, max(r.x2 for r in rect_list) + 1)
+        y2 = min(height, max(r.y2 for r in rect_list) + 1)
+
+        scratch = base[y1:y2, x1:x2].copy()
+        for item in to_redraw:
+            item.draw(scratch, scale, x1, y1)
+
+        for tx, ty in tiles:
+            tile_x1, tile_y1 = tx * self.tile_size, ty * self.tile_size
+            tile_x2, tile_y2 = min(width, tile_x1 + self.tile_size), min(height, tile_y1 + self.tile_size)
+            self._canvas[tile_y1:tile_y2, tile_x1:tile_x2] = scratch[tile_y1 - y1:tile_y2 - y1, tile_x1 - x1:tile_x2 - x1]
+        self.tile_restore_cnt += len(tiles)
+
+
+def __debug(width: int = 8000, height: int = 6000, point_cnt: int = 60):
+    """
+    不需要界面 使用合成的底图和路线 对比每次复制整张底图重画 与增量绘制的耗时 并确认结果一致
+    """
+    rng = np.random.default_rng(0)
+    raw = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    all_items: List[RouteDrawItem] = []
+    last_point = (width // 2, height // 2)
+    for i in range(point_cnt):
+        pos = (int(rng.integers(100, width - 100)), int(rng.integers(100, height - 100)))
+        all_items.append(RouteDrawItem.circle(pos, 5, (0, 0, 255), -1))
+        all_items.append(RouteDrawItem.line(last_point, pos, (255, 0, 0), 2))
+        all_items.append(RouteDrawItem.put_text(str(i), (pos[0] - 5, pos[1] - 13), 0.6, (0, 0, 255), 1))
+        last_point = pos
+
+    def full_draw(items: List[RouteDrawItem], scale: float) -> MatLike:
+        image = raw.copy() if scale == 1 else cv2.resize(raw, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        for item in items:
+            item.draw(image, scale)
+        return image
+
+    for scale in [1, 0.5]:
+        renderer = WorldPatrolRouteRenderer()
+        full_cost = 0
+        incremental_cost = 0
+        same = True
+        # 模拟逐个添加点 每添加5个点撤销1个 撤销前后都会绘制 撤销时需要恢复格子
+        items: List[RouteDrawItem] = []
+        step_list: List[List[RouteDrawItem]] = []
+        for i in range(0, len(all_items), 3):
+            items = items + all_items[i:i + 3]
+            step_list.append(items)
+            if i % 15 == 12:
+                items = items[:-3]
+                step_list.append(items)
+
+        for step_items in step_list:
+            t1 = time.perf_counter()
+            expected = full_draw(step_items, scale)
+            t2 = time.perf_counter()
+            actual = renderer.render('debug', raw, step_items, scale)
+            t3 = time.perf_counter()
+            full_cost += t2 - t1
+            incremental_cost += t3 - t2
+            same = same and np.array_equal(expected, actual)
+        step_cnt = len(step_list)
+
+        print('缩放 %.2f 步数 %d 整张重画 平均 %.2f毫秒 增量绘制 平均 %.2f毫秒 结果一致 %s 整张绘制次数 %d 恢复格子 %d' %
+              (scale, step_cnt, full_cost / step_cnt * 1000, incremental_cost / step_cnt * 1000, same,
+               renderer.full_render_cnt, renderer.tile_restore_cnt))
+
+
+if __name__ == '__main__':
+    __debug()
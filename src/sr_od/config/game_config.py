@@ -235,6 +235,22 @@ class GameConfig(BasicGameConfig):
     def use_quirky_snacks_adapter(self) -> YamlConfigAdapter:
         return YamlConfigAdapter(self, 'use_quirky_snacks', True)
 
+    @property
+    def move_pipeline(self) -> bool:
+        """
+        移动时 截图和小地图分析与坐标计算并行
+        :return:
+        """
+        return self.get('move_pipeline', False)
+
+    @move_pipeline.setter
+    def move_pipeline(self, new_value: bool):
+        self.update('move_pipeline', new_value)
+
+    @property
+    def move_pipeline_adapter(self) -> YamlConfigAdapter:
+        return YamlConfigAdapter(self, 'move_pipeline', False)
+
     @property
     def win_title(self) -> str:
         """
@@ -0,0 +1,146 @@
+import math
+import threading
+from typing import Optional, Tuple
+
+SpeedKey = Tuple[str, bool, bool]  # 角色, 是否疾跑, 是否在秘技持续时间内
+
+
+class MoveSpeedStat:
+
+    def __init__(self):
+        """
+        一种移动状态下的速度统计 使用指数加权 旧的样本会逐渐失去作用
+        """
+        self.cnt: int = 0
+        self.distance: float = 0  # 加权的总距离
+        self.seconds: float = 0  # 加权的总时间
+        self.residual_var: float = 0  # 实际距离与按均速计算的距离 差值的方差
+
+    @property
+    def speed(self) -> float:
+        return self.distance / self.seconds if self.seconds > 0 else 0
+
+
+class MoveSpeedEstimator:
+
+    def __init__(self, min_sample: int = 5, alpha: float = 0.1,
+                 std_times: float = 3, pos_error: float = 2,
+                 min_speed_ratio: float = 0.5, max_speed_ratio: float = 2):
+        """
+        根据确认过的坐标 在线估计每种移动状态下的实际速度
+        均速 = 总距离 / 总时间 识别间隔很短时坐标误差影响很大 按时间加权比直接平均速度稳定
+        最远距离 = 均速 * 时间 + std_times * 距离差值的标准差 + 坐标误差 样本足够之前使用固定速度
+        :param min_sample: 至少需要多少个样本才使用估计的速度
+        :param alpha: 新样本的权重
+        :param std_times: 最远距离使用多少倍标准差
+        :param pos_error: 坐标识别的误差 最远距离需要加上
+        :param min_speed_ratio: 样本速度 最少是固定速度的多少倍 太慢的可能是被卡住了
+        :param max_speed_ratio: 样本速度 最多是固定速度的多少倍 太快的可能是识别错误
+        """
+        self.min_sample: int = min_sample
+        self.alpha: float = alpha
+        self.std_times: float = std_times
+        self.pos_error: float = pos_error
+        self.min_speed_ratio: float = min_speed_ratio
+        self.max_speed_ratio: float = max_speed_ratio
+
+        self.key_2_stat: dict[SpeedKey, MoveSpeedStat] = {}
+        self._lock = threading.Lock()
+
+    def add_sample(self, key: SpeedKey, distance: float, seconds: float, default_speed: float) -> bool:
+        """
+        加入一个样本 两个确认的坐标之间 一直在同一种状态下移动
+        :param key: 移动状态
+        :param distance: 两个坐标的距离
+        :param seconds: 两个坐标的时间差
+        :param default_speed: 这种状态下的固定速度
+        :return: 是否加入
+        """
+        if seconds <= 0:
+            return False
+        speed = distance / seconds
+        if speed < default_speed * self.min_speed_ratio or speed > default_speed * self.max_speed_ratio:
+            return False
+
+        with self._lock:
+            stat = self.key_2_stat.get(key)
+            if stat is None:
+                stat = MoveSpeedStat()
+                self.key_2_stat[key] = stat
+
+            if stat.cnt > 0:
+                residual = distance - stat.speed * seconds
+                weight = 1 / (stat.cnt + 1) if stat.cnt < self.min_sample else self.alpha  # 样本少的时候使用普通的均值
+                stat.residual_var = (1 - weight) * (stat.residual_var + weight * residual * residual)
+                stat.distance = (1 - weight) * stat.distance + weight * distance
+                stat.seconds = (1 - weight) * stat.seconds + weight * seconds
+            else:
+                stat.distance = distance
+                stat.seconds = seconds
+            stat.cnt += 1
+        return True
+
+    def get_speed(self, key: SpeedKey) -> Optional[float]:
+        """
+        获取估计的均速
+        :param key: 移动状态
+        :return: 样本不足时返回None
+        """
+        with self._lock:
+            stat = self.key_2_stat.get(key)
+            if stat is None or stat.cnt < self.min_sample:
+                return None
+            return stat.speed
+
+    def cal_move_distance(self, key: SpeedKey, seconds: float) -> Optional[float]:
+        """
+        计算一段时间内最远可能的移动距离
+        :param key: 移动状态
+        :param seconds: 秒
+        :return: 样本不足时返回None
+        """
+        with self._lock:
+            stat = self.key_2_stat.get(key)
+            if stat is None or stat.cnt < self.min_sample:
+                return None
+            return stat.speed * seconds + self.std_times * math.sqrt(max(stat.residual_var, 0)) + self.pos_error
+
+
+def __debug_replay(true_speed: float = 24, noise: float = 1, cnt: int = 2000):
+    """
+    使用合成的坐标轨迹回放 对比固定速度和估计速度下 搜索范围的平均半径和命中率
+    轨迹的移动速度为 true_speed 识别坐标有 noise 像素的误差 每0.3~1.2秒识别一次
+    """
+    import random
+    rnd = random.Random(0)
+    default_speed = 30
+    estimator = MoveSpeedEstimator()
+    key: SpeedKey = ('', False, False)
+
+    fixed_radius_sum = 0
+    fixed_hit = 0
+    adaptive_radius_sum = 0
+    adaptive_hit = 0
+    for _ in range(cnt):
+        seconds = rnd.uniform(0.3, 1.2)
+        distance = true_speed * seconds * rnd.uniform(0.9, 1.05) + rnd.uniform(-noise, noise) * 2
+
+        fixed_radius = default_speed * max(seconds, 1)
+        fixed_radius_sum += fixed_radius
+        fixed_hit += 1 if distance <= fixed_radius else 0
+
+        adaptive_radius = estimator.cal_move_distance(key, max(seconds, 0.3))
+        if adaptive_radius is None:
+            adaptive_radius = fixed_radius
+        adaptive_radius_sum += adaptive_radius
+        adaptive_hit += 1 if distance <= adaptive_radius else 0
+
+        estimator.add_sample(key, distance, seconds, default_speed)
+
+    print('固定速度 平均半径 %.1f 命中率 %.4f' % (fixed_radius_sum / cnt, fixed_hit / cnt))
+    print('估计速度 平均半径 %.1f 命中率 %.4f' % (adaptive_radius_sum / cnt, adaptive_hit / cnt))
+    print('估计均速 %.2f' % estimator.get_speed(key))
+
+
+if __name__ == '__main__':
+    __debug_replay()
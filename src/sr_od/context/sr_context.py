@@ -1,9 +1,11 @@
 import time
 
-from typing import Optional, List
+from typing import Optional, List, TYPE_CHECKING
 
+from one_dragon.base.config.yaml_data_cache import game_data_cache
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
-from one_dragon.utils import i18_utils
+from one_dragon.utils import i18_utils, thread_utils
+from one_dragon.utils.lazy_utils import LazyProvider
 from sr_od.app.assignments.assignments_run_record import AssignmentsRunRecord
 from sr_od.app.buy_xianzhou_parcel.buy_xianzhou_parcel_run_record import BuyXianZhouParcelRunRecord
 from sr_od.app.claim_email.email_run_record import EmailRunRecord
@@ -15,7 +17,6 @@ from sr_od.app.relic_salvage.relic_salvage_config import RelicSalvageConfig
 from sr_od.app.relic_salvage.relic_salvage_run_record import RelicSalvageRunRecord
 from sr_od.app.sim_uni.sim_uni_challenge_config import SimUniChallengeConfig, SimUniChallengeConfigData
 from sr_od.app.sim_uni.sim_uni_config import SimUniConfig
-from sr_od.app.sim_uni.sim_uni_route_data import SimUniRouteData
 from sr_od.app.sim_uni.sim_uni_run_record import SimUniRunRecord
 from sr_od.app.support_character.support_character_run_record import SupportCharacterRunRecord
 from sr_od.app.trailblaze_power.trailblaze_power_config import TrailblazePowerConfig
@@ -23,7 +24,6 @@ from sr_od.app.trailblaze_power.trailblaze_power_run_record import TrailblazePow
 from sr_od.app.trick_snack.trick_snack_config import TrickSnackConfig
 from sr_od.app.trick_snack.trick_snack_record import TrickSnackRunRecord
 from sr_od.app.world_patrol.world_patrol_config import WorldPatrolConfig
-from sr_od.app.world_patrol.world_patrol_route_data import WorldPatrolRouteData
 from sr_od.app.world_patrol.world_patrol_run_record import WorldPatrolRunRecord
 from sr_od.config.character_const import Character, TECHNIQUE_ATTACK, TECHNIQUE_BUFF, TECHNIQUE_BUFF_ATTACK, FEIXIAO, \
     TECHNIQUE_BUFF_ATTACK_DISAPPEAR
@@ -32,9 +32,13 @@ from sr_od.config.yolo_config import YoloConfig
 from sr_od.context.context_pos_info import ContextPosInfo
 from sr_od.context.preheat_context import SrPreheatContext
 from sr_od.context.sr_pc_controller import SrPcController
-from sr_od.interastral_peace_guide.guide_data import SrGuideData
-from sr_od.screen_state.yolo_screen_detector import YoloScreenDetector
-from sr_od.sr_map.sr_map_data import SrMapData
+
+if TYPE_CHECKING:  # 游戏数据和模型在第一次使用时才导入和加载
+    from sr_od.app.sim_uni.sim_uni_route_data import SimUniRouteData
+    from sr_od.app.world_patrol.world_patrol_route_data import WorldPatrolRouteData
+    from sr_od.interastral_peace_guide.guide_data import SrGuideData
+    from sr_od.screen_state.yolo_screen_detector import YoloScreenDetector
+    from sr_od.sr_map.sr_map_data import SrMapData
 
 
 class TeamInfo:
@@ -172,10 +176,11 @@ class SrContext(OneDragonContext):
         self.is_pc: bool = True
         self.record_coordinate: bool = True  # 记录坐标
 
-        self.map_data: SrMapData = SrMapData()
-        self.world_patrol_route_data: WorldPatrolRouteData = WorldPatrolRouteData(self.map_data)
-        self.sim_uni_route_data: SimUniRouteData = SimUniRouteData(self.map_data)
-        self.guide_data: SrGuideData = SrGuideData()
+        # 游戏数据 第一次使用时加载 只用到部分功能时不需要全部加载
+        self._map_data: LazyProvider[SrMapData] = LazyProvider(self._create_map_data)
+        self._world_patrol_route_data: LazyProvider[WorldPatrolRouteData] = LazyProvider(self._create_world_patrol_route_data)
+        self._sim_uni_route_data: LazyProvider[SimUniRouteData] = LazyProvider(self._create_sim_uni_route_data)
+        self._guide_data: LazyProvider[SrGuideData] = LazyProvider(self._create_guide_data)
 
         self.pos_info: ContextPosInfo = ContextPosInfo()
         self.team_info: TeamInfo = TeamInfo()
@@ -189,15 +194,74 @@ class SrContext(OneDragonContext):
 
         # 共用配置
         self.yolo_config: YoloConfig = YoloConfig()
-        self.yolo_detector: YoloScreenDetector = YoloScreenDetector(
-            standard_resolution_h=self.project_config.screen_standard_height,
-            standard_resolution_w=self.project_config.screen_standard_width
-        )
+        self._yolo_detector: LazyProvider[YoloScreenDetector] = LazyProvider(self._create_yolo_detector)
         self.preheat_context = SrPreheatContext(self)
 
         # 实例独有的配置
         self.load_instance_config()
 
+    @staticmethod
+    def _create_map_data() -> 'SrMapData':
+        from sr_od.sr_map.sr_map_data import SrMapData
+        return SrMapData()
+
+    def _create_world_patrol_route_data(self) -> 'WorldPatrolRouteData':
+        from sr_od.app.world_patrol.world_patrol_route_data import WorldPatrolRouteData
+        return WorldPatrolRouteData(self.map_data)
+
+    def _create_sim_uni_route_data(self) -> 'SimUniRouteData':
+        from sr_od.app.sim_uni.sim_uni_route_data import SimUniRouteData
+        return SimUniRouteData(self.map_data)
+
+    @staticmethod
+    def _create_guide_data() -> 'SrGuideData':
+        from sr_od.interastral_peace_guide.guide_data import SrGuideData
+        return SrGuideData()
+
+    def _create_yolo_detector(self) -> 'YoloScreenDetector':
+        from sr_od.screen_state.yolo_screen_detector import YoloScreenDetector
+        return YoloScreenDetector(
+            standard_resolution_h=self.project_config.screen_standard_height,
+            standard_resolution_w=self.project_config.screen_standard_width
+        )
+
+    @property
+    def map_data(self) -> 'SrMapData':
+        return self._map_data.get()
+
+    @property
+    def world_patrol_route_data(self) -> 'WorldPatrolRouteData':
+        return self._world_patrol_route_data.get()
+
+    @property
+    def sim_uni_route_data(self) -> 'SimUniRouteData':
+        return self._sim_uni_route_data.get()
+
+    @property
+    def guide_data(self) -> 'SrGuideData':
+        return self._guide_data.get()
+
+    @property
+    def yolo_detector(self) -> 'YoloScreenDetector':
+        return self._yolo_detector.get()
+
+    def ensure_loaded(self) -> None:
+        """
+        加载全部游戏数据 之后的使用不会再有加载的耗时
+        """
+        for provider in [self._map_data, self._world_patrol_route_data, self._sim_uni_route_data,
+                         self._guide_data, self._yolo_detector]:
+            provider.get()
+        game_data_cache.save()  # 加载的游戏数据 写入缓存供下次启动使用
+
+    def async_init_game_data(self) -> None:
+        """
+        异步加载游戏数据 适用于启动后很可能用到全部功能的场景 例如完整的界面
+        :return:
+        """
+        f = self.preheat_context.executor.submit(self.ensure_loaded)
+        f.add_done_callback(thread_utils.handle_future_result)
+
     def init_by_config(self) -> None:
         """
         根据配置进行初始化
@@ -239,10 +303,15 @@ class SrContext(OneDragonContext):
         self.world_patrol_config: WorldPatrolConfig = WorldPatrolConfig(self.current_instance_idx)
         self.world_patrol_record: WorldPatrolRunRecord = WorldPatrolRunRecord(self.current_instance_idx, game_refresh_hour_offset)
 
-        self.power_config: TrailblazePowerConfig = TrailblazePowerConfig(self.guide_data, self.current_instance_idx)
-        self.power_record: TrailblazePowerRunRecord = TrailblazePowerRunRecord(self.power_config, self.current_instance_idx, game_refresh_hour_offset)
+        # 依赖指南数据 第一次使用时才创建
+        instance_idx = self.current_instance_idx
+        self._power_config: LazyProvider[TrailblazePowerConfig] = LazyProvider(
+            lambda: TrailblazePowerConfig(self.guide_data, instance_idx))
+        self._power_record: LazyProvider[TrailblazePowerRunRecord] = LazyProvider(
+            lambda: TrailblazePowerRunRecord(self.power_config, instance_idx, game_refresh_hour_offset))
 
-        self.echo_of_war_config: EchoOfWarConfig = EchoOfWarConfig(self.guide_data, self.current_instance_idx)
+        self._echo_of_war_config: LazyProvider[EchoOfWarConfig] = LazyProvider(
+            lambda: EchoOfWarConfig(self.guide_data, instance_idx))
         self.echo_of_war_run_record: EchoOfWarRunRecord = EchoOfWarRunRecord(self.current_instance_idx, game_refresh_hour_offset)
 
         self.sim_uni_challenge_config_data: SimUniChallengeConfigData = SimUniChallengeConfigData()
@@ -262,6 +331,18 @@ class SrContext(OneDragonContext):
         self.trick_snack_config: TrickSnackConfig = TrickSnackConfig(self.current_instance_idx)
         self.trick_snack_run_record: TrickSnackRunRecord = TrickSnackRunRecord(self.current_instance_idx, game_refresh_hour_offset)
 
+    @property
+    def power_config(self) -> TrailblazePowerConfig:
+        return self._power_config.get()
+
+    @property
+    def power_record(self) -> TrailblazePowerRunRecord:
+        return self._power_record.get()
+
+    @property
+    def echo_of_war_config(self) -> EchoOfWarConfig:
+        return self._echo_of_war_config.get()
+
     @property
     def sim_uni_challenge_config(self) -> Optional[SimUniChallengeConfig]:
         if self.sim_uni_info.world_num == 0 or self.sim_uni_config is None:
@@ -285,6 +366,31 @@ class SrContext(OneDragonContext):
             gpu=self.yolo_config.sim_uni_gpu
         )
 
+    def prefetch_for_world_patrol(self) -> None:
+        """
+        锄大地的同步预热 一条龙中在上一个应用运行时调用
+        完成后 init_for_world_patrol 只需要很少的时间
+        """
+        self.ocr.init_model()
+        self.preheat_context.preheat_for_world_patrol()
+        self.yolo_detector.init_world_patrol_model(
+            model_name=self.yolo_config.world_patrol,
+            gpu=self.yolo_config.world_patrol_gpu
+        )
+
+    def prefetch_for_sim_uni(self) -> None:
+        """
+        模拟宇宙的同步预热 一条龙中在上一个应用运行时调用
+        完成后 init_for_sim_uni 只需要很少的时间
+        """
+        self.ocr.init_model()
+        self.preheat_context.preheat_for_world_patrol()  # 与锄大地共用大地图
+        self._sim_uni_route_data.get()
+        self.yolo_detector.init_sim_uni_model(
+            model_name=self.yolo_config.sim_uni,
+            gpu=self.yolo_config.sim_uni_gpu
+        )
+
     def check_and_update_speed(self, world_patrol: bool) -> None:
         """
         根据当前1号位 判断移动速度
@@ -332,3 +438,35 @@ class SrContext(OneDragonContext):
         if self.ban_technique:
             return False
         return self.is_fx_world_patrol_tech and time.time() - self.last_use_tech_time > self.team_info.get_buff_lasting_seconds(1)
+
+
+def __debug_startup():
+    """
+    创建上下文和第一次使用各项游戏数据的耗时和内存
+    内存只统计python对象 使用 tracemalloc
+    """
+    import tracemalloc
+    tracemalloc.start()
+
+    def measure(name: str, func) -> None:
+        start_time = time.time()
+        before, _ = tracemalloc.get_traced_memory()
+        func()
+        after, _ = tracemalloc.get_traced_memory()
+        print('%s 耗时 %.3f秒 内存 %.1fMB' % (name, time.time() - start_time, (after - before) / 1024 / 1024))
+
+    holder = {}
+    measure('创建上下文', lambda: holder.update(ctx=SrContext()))
+    ctx: SrContext = holder['ctx']
+    measure('地图数据', lambda: ctx.map_data)
+    measure('锄大地路线', lambda: ctx.world_patrol_route_data)
+    measure('模拟宇宙路线', lambda: ctx.sim_uni_route_data)
+    measure('指南数据', lambda: ctx.guide_data)
+    measure('体力配置', lambda: ctx.power_record)
+    measure('目标检测', lambda: ctx.yolo_detector)
+    tracemalloc.stop()
+    ctx.after_app_shutdown()
+
+
+if __name__ == '__main__':
+    __debug_startup()
@@ -10,6 +10,7 @@ from one_dragon.base.geometry.point import Point
 from one_dragon.utils import cal_utils
 from one_dragon.utils.log_utils import log
 from sr_od.config.game_config import GameConfig
+from sr_od.context.move_speed_estimator import MoveSpeedEstimator, SpeedKey
 
 
 class SrPcController(PcControllerBase):
@@ -34,6 +35,9 @@ class SrPcController(PcControllerBase):
         self.is_running: bool = False  # 是否在疾跑
         self.start_move_time: float = 0
 
+        self.speed_estimator: MoveSpeedEstimator = MoveSpeedEstimator()
+        """根据识别的坐标 估计实际的移动速度"""
+
     def fill_uid_black(self, screen: MatLike) -> MatLike:
         lt = (30, 1030)
         rb = (200, 1080)
@@ -176,12 +180,17 @@ class SrPcController(PcControllerBase):
         """
         ctypes.windll.user32.mouse_event(PcControllerBase.MOUSEEVENTF_MOVE, 0, int(distance * self.turn_dx))
 
-    def cal_move_distance_by_time(self, seconds: float):
+    def cal_move_distance_by_time(self, seconds: float, speed_key: Optional[SpeedKey] = None):
         """
         根据时间计算移动距离
         :param seconds: 秒
+        :param speed_key: 移动状态 传入且有足够样本时 使用估计的速度
         :return:
         """
+        if speed_key is not None:
+            distance = self.speed_estimator.cal_move_distance(speed_key, seconds)
+            if distance is not None:
+                return distance
         return self.run_speed * seconds
 
     def switch_character(self, idx: int):
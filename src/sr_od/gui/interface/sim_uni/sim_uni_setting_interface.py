@@ -6,6 +6,7 @@ from one_dragon.base.config.config_item import ConfigItem
 from one_dragon_qt.widgets.column import Column
 from one_dragon_qt.widgets.vertical_scroll_interface import VerticalScrollInterface
 from one_dragon_qt.widgets.setting_card.combo_box_setting_card import ComboBoxSettingCard
+from one_dragon_qt.widgets.setting_card.switch_setting_card import SwitchSettingCard
 from one_dragon_qt.widgets.setting_card.text_setting_card import TextSettingCard
 from sr_od.app.sim_uni.sim_uni_const import SimUniWorldEnum
 from sr_od.context.sr_context import SrContext
@@ -39,6 +40,10 @@ class SimUniSettingInterface(VerticalScrollInterface):
         self.daily_plan_times_opt = TextSettingCard(icon=FluentIcon.CALENDAR, title='每日精英次数')
         content_widget.add_widget(self.daily_plan_times_opt)
 
+        self.use_card_index_opt = SwitchSettingCard(icon=FluentIcon.SEARCH, title='图片索引识别',
+                                                    content='实验功能 使用图片索引识别祝福和奇物 减少OCR')
+        content_widget.add_widget(self.use_card_index_opt)
+
         challenge_group = SettingCardGroup(title='挑战配置')
         content_widget.add_widget(challenge_group)
 
@@ -77,6 +82,7 @@ class SimUniSettingInterface(VerticalScrollInterface):
 
         self.weekly_plan_times_opt.init_with_adapter(self.ctx.sim_uni_config.elite_weekly_times_adapter)
         self.daily_plan_times_opt.init_with_adapter(self.ctx.sim_uni_config.elite_daily_times_adapter)
+        self.use_card_index_opt.init_with_adapter(self.ctx.sim_uni_config.use_card_index_adapter)
 
         for idx, opt in self.challenge_opt_list.items():
             opt.set_options_by_list([
@@ -1,5 +1,6 @@
 import yaml
 from PySide6.QtGui import QImage
+from cv2.typing import MatLike
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout
 from qfluentwidgets import PushButton, PlainTextEdit, SettingCardGroup, FluentIcon, LineEdit
 from scipy.constants import value
@@ -20,6 +21,7 @@ from one_dragon_qt.widgets.row import Row
 from sr_od.app.world_patrol import world_patrol_route_draw_utils
 from sr_od.app.world_patrol.world_patrol_app import WorldPatrolApp
 from sr_od.app.world_patrol.world_patrol_route import WorldPatrolRoute
+from sr_od.app.world_patrol.world_patrol_route_renderer import WorldPatrolRouteRenderer
 from sr_od.app.world_patrol.world_patrol_whitelist_config import WorldPatrolWhitelist
 from sr_od.config import operation_const
 from sr_od.context.sr_context import SrContext
@@ -44,6 +46,9 @@ class WorldPatrolDrawRouteInterface(VerticalScrollInterface):
         self.chosen_tp: Optional[SpecialPoint] = None
         self.chosen_route: Optional[WorldPatrolRoute] = None
 
+        self.route_renderer: WorldPatrolRouteRenderer = WorldPatrolRouteRenderer()  # 增量绘制 避免每次点击都复制整张大地图
+        self.large_map_canvas: Optional[MatLike] = None  # 正在显示的图片 QImage不持有数据 需要保留引用
+
     def get_content_widget(self) -> QWidget:
         """
         子界面内的内容组件 由子类实现
@@ -503,6 +508,10 @@ class WorldPatrolDrawRouteInterface(VerticalScrollInterface):
         self.existed_route_opt.set_items(config_list, self.chosen_route)
 
     def update_large_map_image(self) -> None:
+        size_value: float = self.image_size_opt.combo_box.currentData()
+        scale = 1 if size_value is None else size_value  # 由绘制器缩放 显示时不需要再缩放
+
+        img_to_show: Optional[MatLike] = None
         if self.chosen_route is None:
             if self.chosen_tp is None:
                 region = self.chosen_region_without_level
@@ -510,33 +519,23 @@ class WorldPatrolDrawRouteInterface(VerticalScrollInterface):
                     region = self.chosen_region_with_level
                 if region is not None:
                     lm_info = self.ctx.map_data.get_large_map_info(region)
-                    if lm_info.raw is None:
-                        img = QImage()
-                    else:
-                        img_to_show = lm_info.raw.copy()
-                        img = Cv2Image(img_to_show)
-                else:
-                    img = QImage()
+                    if lm_info.raw is not None:
+                        img_to_show = self.route_renderer.render(region.prl_id, lm_info.raw, [], scale)
             else:
                 route = WorldPatrolRoute(self.chosen_tp, {
                     "author": [],
                     "route": []
                 }, '')
-                img_to_show = world_patrol_route_draw_utils.get_route_image(self.ctx, route)
-                img = Cv2Image(img_to_show)
+                img_to_show = world_patrol_route_draw_utils.render_route_image(self.ctx, self.route_renderer,
+                                                                               route, scale)
         else:
-            img_to_show = world_patrol_route_draw_utils.get_route_image(self.ctx, self.chosen_route)
-            img = Cv2Image(img_to_show)
+            img_to_show = world_patrol_route_draw_utils.render_route_image(self.ctx, self.route_renderer,
+                                                                           self.chosen_route, scale)
 
+        img = QImage() if img_to_show is None else Cv2Image(img_to_show)
+        self.large_map_canvas = img_to_show
         self.large_map_image.setImage(img)
-        size_value: float = self.image_size_opt.combo_box.currentData()
-        if size_value is None:
-            display_width = img.width()
-            display_height = img.height()
-        else:
-            display_width = int(img.width() * size_value)
-            display_height = int(img.height() * size_value)
-        self.large_map_image.setFixedSize(display_width, display_height)
+        self.large_map_image.setFixedSize(img.width(), img.height())
 
     def on_route_selected(self, idx: int) -> None:
         self.chosen_route = self.existed_route_opt.itemData(idx)
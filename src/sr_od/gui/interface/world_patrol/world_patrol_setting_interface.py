@@ -39,6 +39,10 @@ class WorldPatrolSettingInterface(VerticalScrollInterface):
         self.whitelist_id_opt = ComboBoxSettingCard(icon=FluentIcon.PEOPLE, title='路线名单')
         content_widget.add_widget(self.whitelist_id_opt)
 
+        self.optimize_route_order_opt = SwitchSettingCard(icon=FluentIcon.GAME, title='优化路线顺序',
+                                                          content='减少切换星球和区域的次数 使用白名单时按名单顺序')
+        content_widget.add_widget(self.optimize_route_order_opt)
+
         self.tech_fight_opt = SwitchSettingCard(icon=FluentIcon.GAME, title='秘技开怪')
         content_widget.add_widget(self.tech_fight_opt)
 
@@ -64,6 +68,7 @@ class WorldPatrolSettingInterface(VerticalScrollInterface):
         self.character_1_opt.set_options_by_list(config_list)
         self.character_1_opt.init_with_adapter(self.ctx.world_patrol_config.character_1_adapter)
 
+        self.optimize_route_order_opt.init_with_adapter(self.ctx.world_patrol_config.optimize_route_order_adapter)
         self.tech_fight_opt.init_with_adapter(self.ctx.world_patrol_config.technique_fight_adapter)
         self.tech_only_opt.init_with_adapter(self.ctx.world_patrol_config.technique_only_adapter)
         self.max_consumable_cnt_opt.init_with_adapter(self.ctx.world_patrol_config.max_consumable_cnt_adapter)
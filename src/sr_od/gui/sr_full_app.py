@@ -157,6 +157,9 @@ if __name__ == '__main__':
     # 异步加载OCR
     _ctx.async_init_ocr()
 
+    # 异步加载游戏数据
+    _ctx.async_init_game_data()
+
     # 设置主题
     setTheme(Theme[_ctx.custom_config.theme.upper()])
 
@@ -36,7 +36,7 @@ class SrGuideData:
             os_utils.get_path_under_work_dir('assets', 'game_data'),
             'interastral_peace_guide_data.yml'
         )
-        yaml_data = YamlOperator(file_path)
+        yaml_data = YamlOperator(file_path, use_cache=True)
 
         for tab_data in yaml_data.data:
             self.init_tab(tab_data)
@@ -1,3 +1,4 @@
+import logging
 import math
 from concurrent.futures import Future
 
@@ -12,6 +13,7 @@ from one_dragon.base.geometry.point import Point
 from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
 from one_dragon.utils import cal_utils, cv2_utils, os_utils, thread_utils
+from one_dragon.utils.debug_image_writer import debug_image_writer, ImageEncoder
 from one_dragon.utils.log_utils import log
 from sr_od.context.sr_context import SrContext
 from sr_od.sr_map import mini_map_utils
@@ -21,6 +23,12 @@ from sr_od.sr_map.sr_map_def import Region
 
 cal_pos_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix='sr_od_cal_pos')
 
+TEST_CASE_IMAGE_ENCODER: ImageEncoder = ImageEncoder(ImageEncoder.FORMAT_PNG)
+"""测试样例的图片固定使用png 读取时按png读取"""
+
+TEST_CASE_QUOTA: int = 200
+"""每个区域最多保留的测试样例数量"""
+
 
 def get_mini_map_scale_list(running: bool, real_move_time: float = 0, is_debug: bool = False):
     """
@@ -212,7 +220,8 @@ def cal_character_pos(ctx: SrContext,
                                template_scale=result.template_scale,
                                win_name='overlap')
 
-    log.debug('计算当前坐标为 %s 使用缩放 %.2f 置信度 %.2f', result.center, result.template_scale, result.confidence)
+    if log.isEnabledFor(logging.DEBUG):  # 每轮都会调用 不输出时省去坐标对象的创建
+        log.debug('计算当前坐标为 %s 使用缩放 %.2f 置信度 %.2f', result.center, result.template_scale, result.confidence)
 
     return result
 
@@ -733,24 +742,44 @@ def is_valid_result(result: MatchResult, verify: VerifyPosInfo) -> bool:
 
 
 def save_as_test_case_async(mm: MatLike, region: Region, verify: VerifyPosInfo):
-    cal_pos_executor.submit(save_as_test_case, mm, region, verify)
+    """
+    保存成测试样例 创建文件夹、写入图片和验证信息都由调试图片的后台线程完成 不占用计算坐标的线程
+    """
+    _submit_test_case(mm, region, verify)
 
 
 def save_as_test_case(mm: MatLike, region: Region, verify: VerifyPosInfo):
     """
-    保存成测试样例
+    保存成测试样例 等待写入完成
     :param mm: 小地图图片
     :param region: 所属区域
     :param verify: 验证信息
     :return:
     """
-    now = os_utils.now_timestamp_str()
-    log.info('保存样例 %s %s', region.prl_id, now)
-    base = os_utils.get_path_under_work_dir('.debug', 'cal_pos_fail',
-                                            region.prl_id, now)
+    debug_image_writer.flush(_submit_test_case(mm, region, verify, block=True))
 
-    cv2_utils.save_image(mm, os.path.join(base, 'mm.png'))
 
-    with open(os.path.join(base, 'verify.yml'), 'w', encoding='utf-8') as file:
-        file.write(verify.yml_str)
+def _submit_test_case(mm: MatLike, region: Region, verify: VerifyPosInfo, block: bool = False) -> str:
+    """
+    提交测试样例的写入 样例文件夹由写入线程创建 因此会参与配额轮换
+    :param mm: 小地图图片
+    :param region: 所属区域
+    :param verify: 验证信息
+    :param block: 队列满时是否等待
+    :return: 图片的文件路径
+    """
+    now = os_utils.now_timestamp_str()
+    log.info('保存样例 %s %s', region.prl_id, now)
+    region_dir = os.path.join(os_utils.get_work_dir(), '.debug', 'cal_pos_fail', region.prl_id)
+    base = os.path.join(region_dir, now)
+    yml_str = verify.yml_str
+
+    def write_verify() -> None:
+        with open(os.path.join(base, 'verify.yml'), 'w', encoding='utf-8') as file:
+            file.write(yml_str)
+
+    return debug_image_writer.submit(mm, os.path.join(base, 'mm.png'),
+                                     encoder=TEST_CASE_IMAGE_ENCODER,
+                                     quota_dir=region_dir, quota=TEST_CASE_QUOTA,
+                                     block=block, after_write=write_verify)
 
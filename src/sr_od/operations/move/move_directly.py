@@ -1,4 +1,6 @@
+import logging
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from cv2.typing import MatLike
 from typing import ClassVar, Optional, Callable, List, Tuple
@@ -14,6 +16,7 @@ from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 from sr_od.app.world_patrol.world_patrol_enter_fight import WorldPatrolEnterFight
 from sr_od.config.game_config import RunModeEnum
+from sr_od.context.move_speed_estimator import SpeedKey
 from sr_od.context.sr_context import SrContext
 from sr_od.operations.move import cal_pos_utils, record_pos_utils
 from sr_od.operations.move.cal_pos_utils import VerifyPosInfo
@@ -26,6 +29,24 @@ from sr_od.sr_map.large_map_info import LargeMapInfo
 from sr_od.sr_map.mini_map_info import MiniMapInfo
 from sr_od.sr_map.sr_map_def import Region
 
+_move_prefetch_executor = ThreadPoolExecutor(thread_name_prefix='sr_od_move_prefetch', max_workers=1)
+
+
+class MoveFrame:
+
+    def __init__(self, screen: MatLike, capture_time: float, mm: MatLike, mm_info: Optional[MiniMapInfo]):
+        """
+        移动中的一帧画面 及其小地图分析结果
+        :param screen: 游戏画面
+        :param capture_time: 截图时间
+        :param mm: 小地图
+        :param mm_info: 小地图分析结果 分析失败时为空
+        """
+        self.screen: MatLike = screen
+        self.capture_time: float = capture_time
+        self.mm: MatLike = mm
+        self.mm_info: Optional[MiniMapInfo] = mm_info
+
 
 class MoveDirectly(SrOperation):
 
@@ -77,6 +98,13 @@ class MoveDirectly(SrOperation):
         self.technique_fight: bool = technique_fight  # 是否使用秘技进入战斗
         self.technique_only: bool = technique_only  # 是否只使用秘技进入战斗
 
+        self.pipeline: bool = self.ctx.game_config.move_pipeline  # 是否在计算坐标时 并行截取和分析下一帧
+        self._prefetch_future: Optional[Future[MoveFrame]] = None  # 正在截取的下一帧
+        self._prefetch_valid_time: float = 0  # 早于这个时间截取的帧已经过时 例如中途进行了战斗或脱困
+        self.pos_update_cnt: int = 0  # 成功计算坐标的次数
+        self.arrival_error: Optional[float] = None  # 到达时与目标点的距离
+        self.speed_sample_start: Optional[Tuple[Point, float, SpeedKey]] = None  # 速度样本的起点 坐标, 时间, 移动状态
+
     def handle_init(self):
         """
         执行前的初始化 由子类实现
@@ -95,6 +123,12 @@ class MoveDirectly(SrOperation):
             self.pos.append(self.start_pos)
         self.stop_move_time = None
 
+        self.discard_prefetch()
+        self._prefetch_valid_time = now
+        self.speed_sample_start = None
+        self.pos_update_cnt = 0
+        self.arrival_error = None
+
         return None
 
     @operation_node(name='画面识别', is_start_node=True)
@@ -108,13 +142,88 @@ class MoveDirectly(SrOperation):
         if stuck is not None:  # 只有脱困失败的情况会返回 round_fail
             return stuck
 
-        screen = self.screenshot()
+        if self.pipeline:
+            frame = self.get_pipeline_frame()
+            screen = frame.screen
+            now_time = frame.capture_time  # 使用截图的时间 计算坐标和记录时间都以画面为准
+        else:
+            frame = None
+            screen = self.screenshot()
 
         if common_screen_state.is_normal_in_world(self.ctx, screen):
-            return self.handle_in_world(screen, now_time)
+            return self.handle_in_world(screen, now_time, frame)
         else:
             return self.handle_not_in_world(screen, now_time)
 
+    def get_pipeline_frame(self) -> MoveFrame:
+        """
+        获取后台已经截取和分析好的一帧 并马上开始截取下一帧
+        同一时间只有一帧在后台处理 按截图顺序使用
+        后台的帧已经过时的话 在当前线程重新截取
+        :return:
+        """
+        future = self._prefetch_future
+        self._prefetch_future = None
+        frame = None
+        if future is not None:
+            try:
+                frame = future.result()
+            except Exception:
+                log.error('后台截图失败', exc_info=True)
+        if frame is None or frame.capture_time < self._prefetch_valid_time:
+            frame = self.capture_frame()
+
+        self.last_screenshot = frame.screen
+        self._prefetch_future = _move_prefetch_executor.submit(self.capture_frame, True)
+        return frame
+
+    def capture_frame(self, independent: bool = False) -> MoveFrame:
+        """
+        截图并分析小地图
+        :param independent: 是否使用独立的截图器 在后台线程截图时需要
+        :return:
+        """
+        capture_time = time.time()
+        screen = self.ctx.controller.screenshot(independent=independent)
+        mm = mini_map_utils.cut_mini_map(screen, self.ctx.game_config.mini_map_pos)
+        try:
+            mm_info = mini_map_utils.analyse_mini_map(mm)
+        except Exception:  # 不在大世界时 小地图可能无法分析
+            mm_info = None
+        return MoveFrame(screen, capture_time, mm, mm_info)
+
+    def discard_prefetch(self) -> None:
+        """
+        丢弃后台的帧 还没开始的截图直接取消 已经开始的等待完成 保证指令结束后不会再有后台截图
+        """
+        future = self._prefetch_future
+        self._prefetch_future = None
+        if future is None or future.cancel():
+            return
+        try:
+            future.result()
+        except Exception:
+            log.debug('后台截图失败', exc_info=True)
+
+    def invalidate_prefetch(self) -> None:
+        """
+        执行了战斗、脱困等其它指令后 之前截取的帧已经过时 速度样本也不再是连续移动的
+        """
+        self._prefetch_valid_time = time.time()
+        self.speed_sample_start = None
+
+    def get_speed_key(self) -> SpeedKey:
+        """
+        :return: 当前的移动状态 用于区分速度样本
+        """
+        team_info = self.ctx.team_info
+        character_id = ''
+        if (team_info.character_list is not None
+                and 0 <= team_info.current_active < len(team_info.character_list)
+                and team_info.character_list[team_info.current_active] is not None):
+            character_id = team_info.character_list[team_info.current_active].id
+        return character_id, self.ctx.controller.is_running, self.ctx.tech_used_in_lasting
+
     def handle_not_in_world(self, screen: MatLike, now_time: float) -> OperationRoundResult:
         """
         不在大世界中 进行处理
@@ -140,9 +249,12 @@ class MoveDirectly(SrOperation):
                                      technique_only=self.technique_only,
                                      first_state=first_state)
 
-    def handle_in_world(self, screen: MatLike, now_time: float) -> OperationRoundResult:
+    def handle_in_world(self, screen: MatLike, now_time: float, frame: Optional[MoveFrame] = None) -> OperationRoundResult:
         """
         在大世界中 进行处理
+        :param screen: 游戏画面
+        :param now_time: 画面的时间
+        :param frame: 并行模式下 已经分析好小地图的帧
         :return:
         """
         if self.ctx.world_patrol_fx_should_use_tech:
@@ -154,6 +266,7 @@ class MoveDirectly(SrOperation):
                 trick_snack=self.ctx.game_config.use_quirky_snacks,
             )
             op.execute()
+            self.invalidate_prefetch()
             return self.round_wait('飞霄使用秘技')
 
         # 先异步识别是否需要攻击
@@ -163,9 +276,12 @@ class MoveDirectly(SrOperation):
             submit, attack_future = self.ctx.yolo_detector.detect_should_attack_in_world_async(screen, now_time)
             log.debug('提交攻击检测 %s', submit)
 
-        mm = mini_map_utils.cut_mini_map(screen, self.ctx.game_config.mini_map_pos)
-
-        next_pos, mm_info = self.cal_pos(mm, now_time)  # 计算当前坐标
+        if frame is not None:
+            mm = frame.mm
+            next_pos, mm_info = self.cal_pos(mm, now_time, frame.mm_info)  # 计算当前坐标
+        else:
+            mm = mini_map_utils.cut_mini_map(screen, self.ctx.game_config.mini_map_pos)
+            next_pos, mm_info = self.cal_pos(mm, now_time)  # 计算当前坐标
 
         check_no_pos = self.check_no_pos(next_pos, now_time)  # 坐标计算失败处理
         if check_no_pos is None:
@@ -211,6 +327,7 @@ class MoveDirectly(SrOperation):
             if stuck_op_result.success:
                 self.last_rec_time += stuck_op_result.data
             self.last_move_stuck_time = time.time()
+            self.invalidate_prefetch()
         else:
             self.stuck_times = 0
 
@@ -251,6 +368,7 @@ class MoveDirectly(SrOperation):
             self.last_battle_exit_with_alert = op_result.status == WorldPatrolEnterFight.STATUS_EXIT_WITH_ALERT
 
         fight_end_time = time.time()
+        self.invalidate_prefetch()
 
         self.last_battle_time = fight_end_time
         self.last_rec_time += fight_end_time - fight_start_time  # 战斗可能很久 更改记录时间
@@ -258,39 +376,52 @@ class MoveDirectly(SrOperation):
 
         return self.round_wait()
 
-    def cal_pos(self, mm: MatLike, now_time: float) -> Tuple[Optional[Point], MiniMapInfo]:
+    def cal_pos(self, mm: MatLike, now_time: float,
+                mm_info: Optional[MiniMapInfo] = None) -> Tuple[Optional[Point], MiniMapInfo]:
         """
         根据上一次的坐标和行进距离 计算当前位置坐标
         :param mm: 小地图截图
         :param now_time: 当前时间
+        :param mm_info: 已经分析好的小地图信息 为空时进行分析
         :return:
         """
+        # 连续移动、上一轮识别到坐标、且有足够速度样本时 使用估计的速度缩小范围 否则使用固定速度
+        speed_key: Optional[SpeedKey] = None
+        if self.no_pos_times == 0 and self.stuck_times == 0 and not self.ctx.pos_info.pos_first_cal_pos_after_fight:
+            speed_key = self.get_speed_key()
+            if self.ctx.controller.speed_estimator.get_speed(speed_key) is None:
+                speed_key = None
+        min_move_time = 0.3 if speed_key is not None else 1
+
         # 根据上一次的坐标和行进距离 计算当前位置
         if self.last_rec_time > 0:
             if self.stop_move_time is not None:
                 move_time = self.stop_move_time - self.last_rec_time  # 停止移动后的时间不应该纳入计算
             else:
                 move_time = now_time - self.last_rec_time
-            if move_time < 1:
-                move_time = 1
+            if move_time < min_move_time:
+                move_time = min_move_time
         else:
-            move_time = 1
+            move_time = min_move_time
         if self.ctx.pos_info.pos_first_cal_pos_after_fight:
             move_time += 1  # 扩大范围 兼容攻击时产生的位移
 
-        log.debug('上次记录时间 %.2f 停止移动时间 %.2f 当前时间 %.2f',
-                  self.last_rec_time,
-                  0 if self.stop_move_time is None else self.stop_move_time,
-                  now_time)
+        if log.isEnabledFor(logging.DEBUG):  # 每轮都会调用 不输出时省去参数计算
+            log.debug('上次记录时间 %.2f 停止移动时间 %.2f 当前时间 %.2f',
+                      self.last_rec_time,
+                      0 if self.stop_move_time is None else self.stop_move_time,
+                      now_time)
 
-        move_distance = self.ctx.controller.cal_move_distance_by_time(move_time)
+        move_distance = self.ctx.controller.cal_move_distance_by_time(move_time, speed_key=speed_key)
         last_pos = self.pos[len(self.pos) - 1] if len(self.pos) > 0 else self.start_pos
         possible_pos = (last_pos.x, last_pos.y, move_distance)
-        log.debug('准备计算人物坐标 使用上一个坐标为 %s 移动时间 %.2f 是否在移动 %s', possible_pos,
-                  move_time, self.ctx.controller.is_moving)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('准备计算人物坐标 使用上一个坐标为 %s 移动时间 %.2f 是否在移动 %s', possible_pos,
+                      move_time, self.ctx.controller.is_moving)
         lm_rect = large_map_utils.get_large_map_rect_by_pos(self.lm_info.gray.shape, mm.shape[:2], possible_pos)
 
-        mm_info = mini_map_utils.analyse_mini_map(mm)
+        if mm_info is None:
+            mm_info = mini_map_utils.analyse_mini_map(mm)
 
         if len(self.pos) == 0:  # 第一个可以直接使用开始点 不进行计算
             return self.start_pos, mm_info
@@ -359,6 +490,7 @@ class MoveDirectly(SrOperation):
         :return:
         """
         if next_pos is None:
+            self.speed_sample_start = None
             if now_time - self.last_no_pos_time > 0.5:
                 self.ctx.controller.enter_running(False)  # 不疾跑避免跑远了
                 self.no_pos_times += 1
@@ -380,7 +512,9 @@ class MoveDirectly(SrOperation):
         :param next_pos:
         :return:
         """
-        if cal_utils.distance_between(next_pos, self.target) < MoveDirectly.arrival_distance:
+        distance = cal_utils.distance_between(next_pos, self.target)
+        if distance < MoveDirectly.arrival_distance:
+            self.arrival_error = distance
             if self.stop_afterwards:
                 self.ctx.controller.stop_moving_forward()
             self.ctx.pos_info.update_pos_after_move(next_pos, region=None if self.next_lm_info is None else self.next_lm_info.region)
@@ -396,8 +530,10 @@ class MoveDirectly(SrOperation):
         :return:
         """
         self.stop_move_time = None
+        self.pos_update_cnt += 1
         self.ctx.pos_info.update_pos_after_move(next_pos)
         if now_time - self.last_rec_time > self.rec_pos_interval:  # 隔一段时间才记录一个点
+            self.add_speed_sample(next_pos, now_time)
             self.ctx.controller.move_towards(next_pos, self.target, mm_info.angle,
                                              run=self.run_mode == RunModeEnum.BTN.value.value)
             # time.sleep(0.5)  # 如果使用小箭头计算方向 则需要等待人物转过来再进行下一轮
@@ -407,6 +543,26 @@ class MoveDirectly(SrOperation):
                 del self.pos[0]
             self.last_rec_time = now_time
 
+    def add_speed_sample(self, next_pos: Point, now_time: float) -> None:
+        """
+        上一个记录的坐标到现在 一直在同一种状态下移动时 加入速度样本
+        并把当前坐标作为下一个样本的起点
+        :param next_pos: 当前坐标
+        :param now_time: 当前时间
+        """
+        controller = self.ctx.controller
+        if not controller.is_moving:
+            self.speed_sample_start = None
+            return
+
+        speed_key = self.get_speed_key()
+        if self.speed_sample_start is not None and self.stuck_times == 0:
+            start_pos, start_time, start_key = self.speed_sample_start
+            if start_key == speed_key:
+                controller.speed_estimator.add_sample(speed_key, cal_utils.distance_between(start_pos, next_pos),
+                                                      now_time - start_time, controller.run_speed)
+        self.speed_sample_start = (next_pos, now_time, speed_key)
+
     def handle_pause(self, e=None):
         """
         暂停后的处理 由子类实现
@@ -421,8 +577,16 @@ class MoveDirectly(SrOperation):
         """
         self.last_rec_time += self.current_pause_time
         self.last_battle_time += self.current_pause_time
+        self.invalidate_prefetch()
 
     def after_operation_done(self, result: OperationResult):
         SrOperation.after_operation_done(self, result)
         if not result.success:
-            self.ctx.controller.stop_moving_forward()
\ No newline at end of file
+            self.ctx.controller.stop_moving_forward()
+
+        self.discard_prefetch()  # 后台的帧不再使用
+        used_time = time.time() - self.operation_start_time
+        log.debug('移动结束 并行识别 %s 坐标更新 %d 次 每秒 %.2f 次 到达误差 %s',
+                  self.pipeline, self.pos_update_cnt,
+                  self.pos_update_cnt / used_time if used_time > 0 else 0,
+                  'None' if self.arrival_error is None else '%.2f' % self.arrival_error)
\ No newline at end of file
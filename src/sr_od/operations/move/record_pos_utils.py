@@ -3,15 +3,23 @@ import time
 import os
 from typing import Optional
 
+import yaml
 from cv2.typing import MatLike
 import random
 
 from one_dragon.base.config.yaml_operator import YamlOperator
 from one_dragon.base.matcher.match_result import MatchResult
 from one_dragon.utils import os_utils, cv2_utils
+from one_dragon.utils.debug_image_writer import debug_image_writer, ImageEncoder
 from sr_od.sr_map.sr_map_data import SrMapData
 from sr_od.sr_map.sr_map_def import Region
 
+SAMPLE_IMAGE_ENCODER: ImageEncoder = ImageEncoder(ImageEncoder.FORMAT_PNG)
+"""样本图片固定使用png 读取时按png读取"""
+
+SAMPLE_QUOTA: int = 5000
+"""每个区域最多保留的样本数量"""
+
 
 def save_sample(region: Region, mm: MatLike, pos: MatchResult) -> None:
     """
@@ -20,18 +28,26 @@ def save_sample(region: Region, mm: MatLike, pos: MatchResult) -> None:
     if pos is None:
         return
     now = int(time.time() * 1000)
-    base_dir = os_utils.get_path_under_work_dir('.debug', 'gps', region.prl_id, str(now))
-
-    cv2_utils.save_image(mm, os.path.join(base_dir, 'mm.png'))
-    yml = YamlOperator(os.path.join(base_dir, 'pos.yml'))
-    yml.data = {
+    region_dir = os.path.join(os_utils.get_work_dir(), '.debug', 'gps', region.prl_id)
+    base_dir = os.path.join(region_dir, str(now))  # 样本文件夹由写入线程创建 因此会参与配额轮换
+    data = {
         'x': pos.x,
         'y': pos.y,
         'w': pos.w,
         'h': pos.h,
         'template_scale': pos.template_scale
     }
-    yml.save()
+    yml_str = yaml.dump(data, allow_unicode=True, sort_keys=False)
+
+    def write_pos() -> None:
+        # 直接写入 不经过 YamlOperator 的延迟保存 保证图片写入完成时样本也是完整的
+        with open(os.path.join(base_dir, 'pos.yml'), 'w', encoding='utf-8') as file:
+            file.write(yml_str)
+
+    debug_image_writer.submit(mm, os.path.join(base_dir, 'mm.png'),
+                              encoder=SAMPLE_IMAGE_ENCODER,
+                              quota_dir=region_dir, quota=SAMPLE_QUOTA,
+                              after_write=write_pos)
 
 
 def random_check(base_dir: Optional[str]) -> None:
@@ -1,7 +1,13 @@
+import threading
+import time
 from cv2.typing import MatLike
 from enum import Enum
+from typing import ClassVar, List, Optional, Tuple
 
+from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.base.screen import screen_utils
+from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_area_matcher import get_area_matcher
 from one_dragon.base.screen.screen_utils import FindAreaResultEnum
 from sr_od.context.sr_context import SrContext
 from sr_od.screen_state import common_screen_state
@@ -14,6 +20,143 @@ class ScreenState(Enum):
     BATTLE_SUCCESS: str = '挑战成功'
 
 
+class BattleAreaGroup:
+
+    def __init__(self, rect: Rect, color_range: Optional[List[List[int]]]):
+        """
+        截取范围相同的战斗结果区域 只需要OCR一次
+        :param rect: 截取范围
+        :param color_range: 颜色范围
+        """
+        self.rect: Rect = rect
+        self.color_range: Optional[List[List[int]]] = color_range
+        self.area_list: List[Tuple[ScreenArea, str]] = []  # 区域, 匹配后的画面状态 成功的在前
+
+        self.check_cnt: int = 0
+        """识别的次数"""
+
+        self.hit_cnt: int = 0
+        """识别到结果的次数"""
+
+        self.total_cost: float = 0
+        """识别的总耗时"""
+
+    @property
+    def prior(self) -> float:
+        """
+        :return: 识别到结果的概率 没有记录时为0.5
+        """
+        return (self.hit_cnt + 1) / (self.check_cnt + 2)
+
+
+class BattleScreenDetector:
+
+    SUCCESS_AREA_LIST: ClassVar[List[str]] = ['挑战成功-有奖励', '挑战成功-双倍奖励', '挑战成功-无奖励']
+    FAIL_AREA_LIST: ClassVar[List[str]] = ['战斗失败-有奖励', '战斗失败-双倍奖励', '战斗失败-无奖励']
+
+    def __init__(self):
+        """
+        战斗结果画面的识别 一次处理全部战斗结果区域
+        成功和失败的区域截取范围是一样的 按截取范围分组后 每组只OCR一次 再用所有区域的文本匹配
+        分组按历史的识别概率排序 更可能出现的先识别 识别到就不再继续
+        """
+        self._area_list: List[ScreenArea] = []  # 构建分组时使用的区域 画面重新加载后需要重新分组
+        self._group_list: List[BattleAreaGroup] = []
+        self._lock = threading.Lock()
+
+        self.area_hit_cnt: dict[str, int] = {}
+        """区域名称 -> 识别到的次数"""
+
+    def _get_group_list(self, ctx: SrContext) -> List[BattleAreaGroup]:
+        """
+        获取区域分组 画面重新加载后重新分组
+        :param ctx: 上下文
+        :return:
+        """
+        area_list = [ctx.screen_loader.get_area('战斗画面', area_name)
+                     for area_name in BattleScreenDetector.SUCCESS_AREA_LIST + BattleScreenDetector.FAIL_AREA_LIST]
+        with self._lock:
+            if len(area_list) == len(self._area_list) and all(a is b for a, b in zip(area_list, self._area_list)):
+                return self._group_list
+
+            group_map: dict[tuple, BattleAreaGroup] = {}
+            for idx, area in enumerate(area_list):
+                if area is None:
+                    continue
+                key = (area.rect.x1, area.rect.y1, area.rect.x2, area.rect.y2, str(area.color_range))
+                if key not in group_map:
+                    group_map[key] = BattleAreaGroup(area.rect, area.color_range)
+                state = ScreenState.BATTLE_SUCCESS.value if idx < len(BattleScreenDetector.SUCCESS_AREA_LIST) \
+                    else ScreenState.BATTLE_FAIL.value
+                group_map[key].area_list.append((area, state))
+
+            self._area_list = area_list
+            self._group_list = list(group_map.values())
+            return self._group_list
+
+    def detect(self, ctx: SrContext, screen: MatLike,
+               battle_success: bool = False, battle_fail: bool = False) -> Optional[str]:
+        """
+        识别战斗结果
+        :param ctx: 上下文
+        :param screen: 游戏画面
+        :param battle_success: 可能在战斗成功
+        :param battle_fail: 可能在战斗失败
+        :return: 战斗成功 / 战斗失败 都不是时返回None
+        """
+        group_list = self._get_group_list(ctx)
+        group_list = sorted(group_list, key=lambda g: g.prior, reverse=True)  # 稳定排序 概率一样时按原顺序
+
+        for group in group_list:
+            area_list = [(area, state) for area, state in group.area_list
+                         if (battle_success and state == ScreenState.BATTLE_SUCCESS.value)
+                         or (battle_fail and state == ScreenState.BATTLE_FAIL.value)]
+            if len(area_list) == 0:
+                continue
+
+            start_time = time.time()
+            first_matcher = get_area_matcher(area_list[0][0], ctx.template_loader)
+            to_ocr = first_matcher.get_ocr_image(first_matcher.crop(screen))
+            ocr_result_list = list(ctx.ocr.run_ocr(to_ocr).keys())
+
+            hit_area: Optional[ScreenArea] = None
+            hit_state: Optional[str] = None
+            for area, state in area_list:
+                matcher = get_area_matcher(area, ctx.template_loader)
+                if any(matcher.match_text(ocr_result) for ocr_result in ocr_result_list):
+                    hit_area = area
+                    hit_state = state
+                    break
+
+            with self._lock:
+                group.check_cnt += 1
+                group.total_cost += time.time() - start_time
+                if hit_area is not None:
+                    group.hit_cnt += 1
+                    self.area_hit_cnt[hit_area.area_name] = self.area_hit_cnt.get(hit_area.area_name, 0) + 1
+
+            if hit_state is not None:
+                return hit_state
+
+        return None
+
+    def get_stats_str(self) -> str:
+        """
+        :return: 每个分组的识别概率和平均耗时 以及每个区域识别到的次数
+        """
+        with self._lock:
+            group_str_list = []
+            for group in self._group_list:
+                avg_cost = group.total_cost / group.check_cnt if group.check_cnt > 0 else 0
+                group_str_list.append('%s 识别 %d 命中 %d 平均耗时 %.3f秒' % (
+                    ','.join(area.area_name for area, _ in group.area_list),
+                    group.check_cnt, group.hit_cnt, avg_cost))
+            return '; '.join(group_str_list) + ' 区域命中 %s' % self.area_hit_cnt
+
+
+battle_screen_detector = BattleScreenDetector()
+
+
 def is_battle_fail(ctx: SrContext, screen: MatLike) -> bool:
     """
     是否在战斗失败画面
@@ -21,11 +164,7 @@ def is_battle_fail(ctx: SrContext, screen: MatLike) -> bool:
     :param screen: 游戏画面
     :return:
     """
-    return (
-            screen_utils.find_area(ctx, screen, '战斗画面', '战斗失败-有奖励') == FindAreaResultEnum.TRUE
-            or screen_utils.find_area(ctx, screen, '战斗画面', '战斗失败-双倍奖励') == FindAreaResultEnum.TRUE
-            or screen_utils.find_area(ctx, screen, '战斗画面', '战斗失败-无奖励') == FindAreaResultEnum.TRUE
-    )
+    return battle_screen_detector.detect(ctx, screen, battle_fail=True) == ScreenState.BATTLE_FAIL.value
 
 
 def get_tp_battle_screen_state(
@@ -47,28 +186,108 @@ def get_tp_battle_screen_state(
     if in_world and common_screen_state.is_normal_in_world(ctx, screen):
         return common_screen_state.ScreenState.NORMAL_IN_WORLD.value
 
-    if battle_success:
-        success_area_list = [
-            '挑战成功-有奖励',
-            '挑战成功-双倍奖励',
-            '挑战成功-无奖励',
-        ]
-
-        for area_name in success_area_list:
-            result = screen_utils.find_area(ctx, screen, '战斗画面', area_name)
-            if result == FindAreaResultEnum.TRUE:
-                return ScreenState.BATTLE_SUCCESS.value
-
-    if battle_fail:
-        fail_area_list = [
-            '战斗失败-有奖励',
-            '战斗失败-双倍奖励',
-            '战斗失败-无奖励',
-        ]
-
-        for area_name in fail_area_list:
-            result = screen_utils.find_area(ctx, screen, '战斗画面', area_name)
-            if result == FindAreaResultEnum.TRUE:
-                return ScreenState.BATTLE_FAIL.value
-
-    return ScreenState.BATTLE.value
\ No newline at end of file
+    if battle_success or battle_fail:
+        state = battle_screen_detector.detect(ctx, screen, battle_success=battle_success, battle_fail=battle_fail)
+        if state is not None:
+            return state
+
+    return ScreenState.BATTLE.value
+
+
+def __debug_area_matcher():
+    """
+    对比区域识别 编译前后的耗时 不包含OCR本身
+    """
+    import time
+    import cv2
+    import numpy as np
+    from one_dragon.base.screen.screen_area_matcher import get_area_matcher
+    from one_dragon.utils import cv2_utils, str_utils, debug_utils
+    from one_dragon.utils.i18_utils import gt
+
+    ctx = SrContext()
+    screen = debug_utils.get_debug_image('1')
+    cnt = 1000
+
+    area = ctx.screen_loader.get_area('大世界', '角色图标')
+    matcher = get_area_matcher(area, ctx.template_loader)
+    t1 = time.time()
+    for _ in range(cnt):
+        part = cv2_utils.crop_image_only(screen, area.rect)
+        ctx.tm.match_template(part, area.template_sub_dir, area.template_id, threshold=area.template_match_threshold)
+    t2 = time.time()
+    for _ in range(cnt):
+        matcher.match_template(matcher.crop(screen))
+    t3 = time.time()
+    print('大世界-角色图标 原来 %.3f毫秒 编译后 %.3f毫秒' % ((t2 - t1) / cnt * 1000, (t3 - t2) / cnt * 1000))
+
+    for area_name in ['挑战成功-有奖励', '战斗失败-有奖励', '战斗失败-无奖励']:
+        area = ctx.screen_loader.get_area('战斗画面', area_name)
+        matcher = get_area_matcher(area, ctx.template_loader)
+        ocr_result = '挑战成功' if area_name.startswith('挑战') else '战斗失败'
+        t1 = time.time()
+        for _ in range(cnt):
+            part = cv2_utils.crop_image_only(screen, area.rect)
+            if area.color_range is not None:
+                mask = cv2.inRange(part,
+                                   np.array(area.color_range[0], dtype=np.uint8),
+                                   np.array(area.color_range[1], dtype=np.uint8))
+                mask = cv2_utils.dilate(mask, 2)
+                cv2.bitwise_and(part, part, mask=mask)
+            str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent)
+        t2 = time.time()
+        for _ in range(cnt):
+            matcher.get_ocr_image(matcher.crop(screen))
+            matcher.match_text(ocr_result)
+        t3 = time.time()
+        print('战斗画面-%s 原来 %.3f毫秒 编译后 %.3f毫秒' % (area_name, (t2 - t1) / cnt * 1000, (t3 - t2) / cnt * 1000))
+
+
+def __old_tp_battle_screen_state(ctx: SrContext, screen: MatLike) -> str:
+    """
+    原来逐个区域识别的实现 用于校验
+    """
+    for area_name in BattleScreenDetector.SUCCESS_AREA_LIST:
+        if screen_utils.find_area(ctx, screen, '战斗画面', area_name) == FindAreaResultEnum.TRUE:
+            return ScreenState.BATTLE_SUCCESS.value
+    for area_name in BattleScreenDetector.FAIL_AREA_LIST:
+        if screen_utils.find_area(ctx, screen, '战斗画面', area_name) == FindAreaResultEnum.TRUE:
+            return ScreenState.BATTLE_FAIL.value
+    return ScreenState.BATTLE.value
+
+
+def __debug_battle_detector(image_dir: Optional[str] = None):
+    """
+    使用保存的战斗画面 校验结果与原来逐个区域识别一致 并对比耗时
+    :param image_dir: 图片文件夹 默认为调试图片文件夹
+    """
+    import os
+    from one_dragon.utils import cv2_utils, debug_utils
+
+    ctx = SrContext()
+    ctx.ocr.init_model()
+    if image_dir is None:
+        image_dir = debug_utils.get_debug_image_dir_path()
+
+    old_cost: float = 0
+    new_cost: float = 0
+    for file_name in sorted(os.listdir(image_dir)):
+        if not file_name.endswith('.png'):
+            continue
+        screen = cv2_utils.read_image(os.path.join(image_dir, file_name))
+        t1 = time.time()
+        old_state = __old_tp_battle_screen_state(ctx, screen)
+        t2 = time.time()
+        new_state = get_tp_battle_screen_state(ctx, screen, battle_success=True, battle_fail=True)
+        t3 = time.time()
+        old_cost += t2 - t1
+        new_cost += t3 - t2
+        if old_state != new_state:
+            print('结果不一致 %s 原来 %s 现在 %s' % (file_name, old_state, new_state))
+
+    print('原来 %.3f秒 现在 %.3f秒' % (old_cost, new_cost))
+    print(battle_screen_detector.get_stats_str())
+
+
+if __name__ == '__main__':
+    __debug_battle_detector()
@@ -0,0 +1,359 @@
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from one_dragon.base.geometry.point import Point
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
+from one_dragon.utils import cv2_utils
+from one_dragon.utils.log_utils import log
+from sr_od.context.sr_context import SrContext
+from sr_od.sr_map import large_map_utils
+from sr_od.sr_map.sr_map_def import Region
+
+
+class LargeMapDragModel:
+
+    def __init__(self, default_gain: float = 1, min_gain: float = 0.3, max_gain: float = 3,
+                 min_drag: int = 50, smooth: float = 0.5):
+        """
+        大地图拖动的模型 记录每个缩放比例下 鼠标拖动1像素 地图在大地图坐标上移动多少像素
+        每次拖动后 使用拖动前后的匹配结果更新
+        :param default_gain: 没有记录时使用的比例
+        :param min_gain: 合理的最小比例 超出范围的观测值认为是匹配错误
+        :param max_gain: 合理的最大比例
+        :param min_drag: 拖动距离小于这个值时 不用于更新
+        :param smooth: 新观测值的权重
+        """
+        self.default_gain: float = default_gain
+        self.min_gain: float = min_gain
+        self.max_gain: float = max_gain
+        self.min_drag: int = min_drag
+        self.smooth: float = smooth
+
+        self.scale_2_gain: dict[int, float] = {}
+        """缩放比例 -> 拖动比例"""
+
+    def get_gain(self, scale: int) -> float:
+        return self.scale_2_gain.get(scale, self.default_gain)
+
+    def update(self, scale: int, drag: Point, before: MatchResult, after: MatchResult,
+               max_offset: Point) -> None:
+        """
+        使用一次拖动的结果更新比例
+        :param scale: 缩放比例
+        :param drag: 鼠标拖动的距离
+        :param before: 拖动前的匹配结果
+        :param after: 拖动后的匹配结果
+        :param max_offset: 匹配结果的最大坐标 到达边缘时地图无法继续移动 不用于更新
+        :return:
+        """
+        sample_list = []
+        for drag_len, before_pos, after_pos, max_pos in [(drag.x, before.x, after.x, max_offset.x),
+                                                         (drag.y, before.y, after.y, max_offset.y)]:
+            if abs(drag_len) < self.min_drag:
+                continue
+            if after_pos <= 0 or after_pos >= max_pos:
+                continue
+            sample = -(after_pos - before_pos) / drag_len  # 往左拖动 地图坐标增加
+            if self.min_gain <= sample <= self.max_gain:
+                sample_list.append(sample)
+
+        if len(sample_list) == 0:
+            return
+
+        sample = sum(sample_list) / len(sample_list)
+        if scale in self.scale_2_gain:
+            self.scale_2_gain[scale] = self.scale_2_gain[scale] * (1 - self.smooth) + sample * self.smooth
+        else:
+            self.scale_2_gain[scale] = sample
+        log.debug('大地图拖动比例 缩放 %d 观测 %.3f 更新为 %.3f', scale, sample, self.scale_2_gain[scale])
+
+
+large_map_drag_model = LargeMapDragModel()
+
+DRAG_END_RECT = Rect(200, 190, 1550, 1000)  # 从 EMPTY_MAP_POS 开始拖动时 终点的范围 右下方与原来固定拖动的范围一致
+
+
+class LargeMapNavigator:
+
+    def __init__(self, ctx: SrContext, region: Region,
+                 search_margin: int = 80, max_drag: int = 500, drag_duration: float = 1,
+                 stable_diff: float = 2, stable_timeout: float = 1.5):
+        """
+        在大地图上移动到目标点的闭环控制
+        拖动前按拖动比例预测拖动后的位置 拖动后只在预测位置附近匹配 失败时才匹配整张大地图
+        拖动的距离按目标点与画面中心的距离计算 一次拖动尽量让目标点居中
+        拖动后等待画面静止 而不是固定等待
+        :param ctx: 上下文
+        :param region: 目标区域
+        :param search_margin: 预测位置附近的匹配范围
+        :param max_drag: 一次拖动最大的鼠标距离
+        :param drag_duration: 拖动持续时间
+        :param stable_diff: 连续两帧的平均像素差小于这个值时 认为画面静止
+        :param stable_timeout: 等待画面静止的最长时间
+        """
+        self.ctx: SrContext = ctx
+        self.region: Region = region
+        self.search_margin: int = search_margin
+        self.max_drag: int = max_drag
+        self.drag_duration: float = drag_duration
+        self.stable_diff: float = stable_diff
+        self.stable_timeout: float = stable_timeout
+
+        self.screen_map_rect: Rect = large_map_utils.get_screen_map_rect(region)
+        self.drag_model: LargeMapDragModel = large_map_drag_model
+
+        self.last_offset: Optional[MatchResult] = None  # 上一次拖动前的匹配结果
+        self.last_drag: Optional[Point] = None  # 上一次拖动的鼠标距离
+        self.predicted_offset: Optional[Point] = None  # 预测的拖动后匹配结果的坐标
+
+        self.local_match_cnt: int = 0
+        """在预测位置附近匹配成功的次数"""
+
+        self.global_match_cnt: int = 0
+        """匹配整张大地图的次数"""
+
+    @property
+    def scale(self) -> int:
+        return self.ctx.pos_info.pos_lm_scale
+
+    def match(self, screen: MatLike) -> Tuple[MatLike, Optional[MatchResult]]:
+        """
+        在当前屏幕截图中扣出大地图部分，并匹配到完整大地图上获取偏移量
+        有预测位置时先在附近匹配
+        :param screen: 游戏屏幕截图
+        :return: 屏幕上的大地图部分, 偏移量
+        """
+        screen_part = cv2_utils.crop_image_only(screen, self.screen_map_rect)
+        lm_info = self.ctx.map_data.get_large_map_info(self.region)
+
+        offset: Optional[MatchResult] = None
+        if self.predicted_offset is not None:
+            offset = self._match_local(lm_info.raw, screen_part, self.predicted_offset)
+            if offset is not None:
+                self.local_match_cnt += 1
+
+        if offset is None:
+            result: MatchResultList = cv2_utils.match_template(lm_info.raw, screen_part, 0.7)
+            offset = result.max
+            self.global_match_cnt += 1
+
+        if offset is not None and self.last_offset is not None and self.last_drag is not None:
+            max_offset = Point(lm_info.raw.shape[1] - offset.w, lm_info.raw.shape[0] - offset.h)
+            self.drag_model.update(self.scale, self.last_drag, self.last_offset, offset, max_offset)
+
+        self.last_offset = None
+        self.last_drag = None
+        self.predicted_offset = None
+        return screen_part, offset
+
+    def _match_local(self, raw: MatLike, screen_part: MatLike, predicted: Point) -> Optional[MatchResult]:
+        """
+        在预测位置附近匹配
+        :param raw: 完整大地图
+        :param screen_part: 屏幕上的大地图部分
+        :param predicted: 预测的偏移量
+        :return:
+        """
+        h, w = screen_part.shape[:2]
+        x1 = max(0, predicted.x - self.search_margin)
+        y1 = max(0, predicted.y - self.search_margin)
+        x2 = min(raw.shape[1], predicted.x + w + self.search_margin)
+        y2 = min(raw.shape[0], predicted.y + h + self.search_margin)
+        if x2 - x1 < w or y2 - y1 < h:
+            return None
+
+        result: MatchResultList = cv2_utils.match_template(raw[y1:y2, x1:x2], screen_part, 0.7)
+        if result.max is None:
+            return None
+        return MatchResult(result.max.confidence, result.max.x + x1, result.max.y + y1, result.max.w, result.max.h)
+
+    def drag_to_target(self, offset: MatchResult, lm_pos: Point) -> Point:
+        """
+        拖动地图 让目标点尽量在画面中间
+        :param offset: 当前的偏移量
+        :param lm_pos: 目标点在大地图上的坐标
+        :return: 鼠标拖动的距离
+        """
+        gain = self.drag_model.get_gain(self.scale)
+        shift_x = lm_pos.x - (offset.x + offset.w // 2)  # 偏移量需要变化的值
+        shift_y = lm_pos.y - (offset.y + offset.h // 2)
+        drag_x = int(np.clip(-shift_x / gain, -self.max_drag, self.max_drag))
+        drag_y = int(np.clip(-shift_y / gain, -self.max_drag, self.max_drag))
+        return self.drag(offset, Point(drag_x, drag_y))
+
+    def drag(self, offset: Optional[MatchResult], drag: Point) -> Point:
+        """
+        从地图空白区域开始拖动地图 并记录预测的偏移量
+        终点限制在 DRAG_END_RECT 内 实际拖动的距离可能比传入的小
+        :param offset: 当前的偏移量 为空时不预测
+        :param drag: 鼠标拖动的距离
+        :return: 实际鼠标拖动的距离
+        """
+        start = large_map_utils.EMPTY_MAP_POS
+        end = Point(int(np.clip(start.x + drag.x, DRAG_END_RECT.x1, DRAG_END_RECT.x2)),
+                    int(np.clip(start.y + drag.y, DRAG_END_RECT.y1, DRAG_END_RECT.y2)))
+        drag = end - start
+        log.info('拖动地图 %s -> %s', start, end)
+        self.ctx.controller.drag_to(end=end, start=start, duration=self.drag_duration)
+
+        if offset is not None:
+            gain = self.drag_model.get_gain(self.scale)
+            lm_info = self.ctx.map_data.get_large_map_info(self.region)
+            max_x = lm_info.raw.shape[1] - offset.w
+            max_y = lm_info.raw.shape[0] - offset.h
+            self.predicted_offset = Point(int(np.clip(offset.x - drag.x * gain, 0, max_x)),
+                                          int(np.clip(offset.y - drag.y * gain, 0, max_y)))
+            self.last_offset = offset
+            self.last_drag = drag
+
+        return drag
+
+    def drag_random(self) -> None:
+        """
+        匹配失败时 随机拖动地图
+        :return:
+        """
+        large_map_utils.drag_in_large_map(self.ctx)
+        self.last_offset = None
+        self.last_drag = None
+        self.predicted_offset = None
+
+    def wait_stable(self) -> Optional[MatLike]:
+        """
+        等待大地图画面静止
+        :return: 最后一张截图 超时的时候也返回
+        """
+        start_time = time.time()
+        last_part: Optional[MatLike] = None
+        screen: Optional[MatLike] = None
+        while True:
+            screen = self.ctx.controller.screenshot()
+            part = cv2_utils.crop_image_only(screen, self.screen_map_rect)
+            part = cv2.resize(cv2.cvtColor(part, cv2.COLOR_RGB2GRAY), None, fx=0.25, fy=0.25,
+                              interpolation=cv2.INTER_AREA)
+            if last_part is not None and float(np.mean(cv2.absdiff(part, last_part))) < self.stable_diff:
+                break
+            if time.time() - start_time > self.stable_timeout:
+                log.debug('等待大地图静止超时')
+                break
+            last_part = part
+            time.sleep(0.05)
+
+        return screen
+
+
+def __debug_replay(true_gain: float = 1.3, inertia: float = 0.05, lm_size: int = 4000, case_cnt: int = 10):
+    """
+    使用合成的大地图回放 对比 固定拖动+全图匹配+固定等待 与 LargeMapNavigator 的次数和耗时
+    使用假的控制器 拖动后地图的移动量 = 真实比例 * 拖动距离 并带有惯性的随机误差
+    拖动后的第一张截图只移动了一半 模拟地图还在滑动
+    每轮的流程与 ChooseSpecialPoint 一致
+    :param true_gain: 真实的拖动比例
+    :param inertia: 惯性误差的比例
+    :param lm_size: 合成大地图的大小
+    :param case_cnt: 回放的次数
+    """
+    from types import SimpleNamespace
+
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 255, (lm_size // 16, lm_size // 16, 3), dtype=np.uint8)
+    raw = cv2.resize(noise, (lm_size, lm_size), interpolation=cv2.INTER_CUBIC)
+    region = SimpleNamespace(parent=None)
+    view_rect = large_map_utils.get_screen_map_rect(region)
+    view_w, view_h = view_rect.width, view_rect.height
+    max_pos = Point(lm_size - view_w, lm_size - view_h)
+
+    class _ReplayController:
+
+        def __init__(self, pos: Point):
+            self.pos: Point = pos  # 画面左上角在大地图上的坐标
+            self.moving_pos: Optional[Point] = None  # 还在滑动时的坐标
+            self.drag_cnt: int = 0
+
+        def drag_to(self, end: Point, start: Point = None, duration: float = 0.5):
+            drag = end - start
+            error = 1 + rng.uniform(-inertia, inertia)
+            new_pos = Point(int(np.clip(self.pos.x - drag.x * true_gain * error, 0, max_pos.x)),
+                            int(np.clip(self.pos.y - drag.y * true_gain * error, 0, max_pos.y)))
+            self.moving_pos = Point((self.pos.x + new_pos.x) // 2, (self.pos.y + new_pos.y) // 2)
+            self.pos = new_pos
+            self.drag_cnt += 1
+
+        def screenshot(self) -> MatLike:
+            pos = self.pos if self.moving_pos is None else self.moving_pos
+            self.moving_pos = None
+            screen = np.zeros((1080, 1920, 3), dtype=np.uint8)
+            screen[view_rect.y1:view_rect.y2, view_rect.x1:view_rect.x2] = raw[pos.y:pos.y + view_h, pos.x:pos.x + view_w]
+            return screen
+
+    case_list = [(Point(int(rng.integers(0, max_pos.x)), int(rng.integers(0, max_pos.y))),
+                  Point(int(rng.integers(100, lm_size - 100)), int(rng.integers(100, lm_size - 100))))
+                 for _ in range(case_cnt)]
+    drag_model = LargeMapDragModel()
+
+    for name in ['old', 'navigator']:
+        total_round = 0
+        total_match_time = 0
+        total_wait_time = 0
+        fail_cnt = 0
+        local_match_cnt = 0
+        global_match_cnt = 0
+        for start_pos, target in case_list:
+            controller = _ReplayController(start_pos)
+            ctx = SimpleNamespace(
+                controller=controller,
+                pos_info=SimpleNamespace(pos_lm_scale=5),
+                map_data=SimpleNamespace(get_large_map_info=lambda r: SimpleNamespace(raw=raw)),
+            )
+            navigator = LargeMapNavigator(ctx, region)
+            navigator.drag_model = drag_model
+
+            arrived = False
+            for _ in range(100):
+                total_round += 1
+                screen = controller.screenshot()
+                t1 = time.time()
+                if name == 'old':
+                    offset = cv2_utils.match_template(raw, cv2_utils.crop_image_only(screen, view_rect), 0.7).max
+                else:
+                    _, offset = navigator.match(screen)
+                total_match_time += time.time() - t1
+
+                if offset is None:
+                    if name == 'old':
+                        large_map_utils.drag_in_large_map(ctx)
+                    else:
+                        navigator.drag_random()
+                    continue
+
+                dx, dy = large_map_utils.get_map_next_drag(target, offset)
+                if dx == 0 and dy == 0:
+                    arrived = True
+                    break
+
+                if name == 'old':
+                    large_map_utils.drag_in_large_map(ctx, dx, dy)
+                    controller.moving_pos = None
+                    total_wait_time += 0.5  # 原来固定等待
+                else:
+                    navigator.drag_to_target(offset, target)
+                    t2 = time.time()
+                    navigator.wait_stable()
+                    total_wait_time += time.time() - t2
+            if not arrived:
+                fail_cnt += 1
+            local_match_cnt += navigator.local_match_cnt
+            global_match_cnt += navigator.global_match_cnt
+
+        print('%s 轮数 %d 失败 %d 匹配耗时 %.3f秒 等待耗时 %.2f秒 局部匹配 %d 全图匹配 %d' % (
+            name, total_round, fail_cnt, total_match_time, total_wait_time, local_match_cnt, global_match_cnt))
+    print('拖动比例 %s' % drag_model.scale_2_gain)
+
+
+if __name__ == '__main__':
+    __debug_replay()
@@ -15,6 +15,7 @@ from sr_od.config import game_const
 from sr_od.context.sr_context import SrContext
 from sr_od.operations.sr_operation import SrOperation
 from sr_od.sr_map import large_map_utils
+from sr_od.sr_map.large_map_navigator import LargeMapNavigator
 from sr_od.sr_map.operations.choose_floor import ChooseFloor
 from sr_od.sr_map.operations.scale_large_map import ScaleLargeMap
 from sr_od.sr_map.sr_map_def import Planet, Region
@@ -38,6 +39,7 @@ class ChooseRegion(SrOperation):
         self.sub_region_clicked: bool = False  # 是否已经点击了子区域
 
         SrOperation.__init__(self, ctx, op_name=gt('选择区域 %s') % region.display_name)
+        self.navigator: LargeMapNavigator = LargeMapNavigator(self.ctx, self.region_to_choose_1)
 
     @operation_node(name='检测星球', is_start_node=True)
     def _check_planet(self) -> OperationRoundResult:
@@ -196,10 +198,10 @@ class ChooseRegion(SrOperation):
         if self.sub_region_clicked and self._in_sub_region(screen):
             return self.round_success(wait=1)
 
-        screen_part, offset = large_map_utils.match_screen_in_large_map(self.ctx, screen, self.region_to_choose_1)
+        screen_part, offset = self.navigator.match(screen)
         if offset is None:
             log.error('匹配大地图失败')
-            large_map_utils.drag_in_large_map(self.ctx)
+            self.navigator.drag_random()
             return self.round_retry(wait=0.5)
         else:
             dx, dy = large_map_utils.get_map_next_drag(self.region.enter_lm_pos, offset)
@@ -215,7 +217,9 @@ class ChooseRegion(SrOperation):
                     self.ctx.controller.click(to_click)
                 self.sub_region_clicked = True
             else:
-                large_map_utils.drag_in_large_map(self.ctx, dx, dy)
+                self.navigator.drag_to_target(offset, self.region.enter_lm_pos)
+                self.navigator.wait_stable()
+                return self.round_retry()
 
             return self.round_retry(wait=0.5)
 
@@ -18,6 +18,7 @@ from sr_od.context.sr_context import SrContext
 from sr_od.operations.sr_operation import SrOperation
 from sr_od.sr_map import large_map_utils
 from sr_od.sr_map.large_map_info import LargeMapInfo
+from sr_od.sr_map.large_map_navigator import LargeMapNavigator
 from sr_od.sr_map.sr_map_def import SpecialPoint
 
 
@@ -31,6 +32,7 @@ class ChooseSpecialPoint(SrOperation):
         self.lm_info: LargeMapInfo = self.ctx.map_data.get_large_map_info(self.tp.region)
 
         self.click_sp_in_last_round: bool = False  # 上一轮点击了特殊点
+        self.navigator: LargeMapNavigator = LargeMapNavigator(self.ctx, self.tp.region)
 
     @operation_node(name='画面识别', node_max_retry_times=10, is_start_node=True)
     def check_screen(self) -> OperationRoundResult:
@@ -51,10 +53,10 @@ class ChooseSpecialPoint(SrOperation):
         time.sleep(0.5)
         self.click_sp_in_last_round = False
 
-        screen_part, offset = large_map_utils.match_screen_in_large_map(self.ctx, screen, self.tp.region)
+        screen_part, offset = self.navigator.match(screen)
         if offset is None:
             log.error('匹配大地图失败')
-            large_map_utils.drag_in_large_map(self.ctx)
+            self.navigator.drag_random()
             return self.round_retry(wait=0.5)
 
         dx, dy = large_map_utils.get_map_next_drag(self.tp.lm_pos, offset)
@@ -73,8 +75,8 @@ class ChooseSpecialPoint(SrOperation):
             self.click_sp_in_last_round = True
 
         if dx != 0 or dy != 0:
-            large_map_utils.drag_in_large_map(self.ctx, dx, dy)
-            time.sleep(0.5)
+            self.navigator.drag_to_target(offset, self.tp.lm_pos)
+            self.navigator.wait_stable()
 
         return self.round_retry()
 
@@ -0,0 +1,119 @@
+from typing import List, Optional
+
+from one_dragon.base.geometry.point import Point
+from one_dragon.base.geometry.rectangle import Rect
+from sr_od.sr_map.sr_map_def import SpecialPoint
+
+
+class SpecialPointGridIndex:
+
+    def __init__(self, sp_list: List[SpecialPoint], cell_size: int = 200):
+        """
+        一个区域内特殊点的网格索引 按大地图坐标把特殊点分到固定大小的格子中
+        查询结果与顺序遍历一致 按原列表的顺序返回
+        :param sp_list: 特殊点列表
+        :param cell_size: 格子大小
+        """
+        self.sp_list: List[SpecialPoint] = sp_list
+        self.cell_size: int = cell_size
+        self.cell_2_idx: dict[tuple[int, int], List[int]] = {}  # 格子 -> 特殊点在原列表的下标
+
+        self.min_cell_x: int = 0
+        self.max_cell_x: int = -1
+        self.min_cell_y: int = 0
+        self.max_cell_y: int = -1
+
+        for idx, sp in enumerate(sp_list):
+            cell = self._get_cell(sp.lm_pos.x, sp.lm_pos.y)
+            if cell not in self.cell_2_idx:
+                self.cell_2_idx[cell] = []
+            self.cell_2_idx[cell].append(idx)
+
+        if len(self.cell_2_idx) > 0:
+            self.min_cell_x = min(cell[0] for cell in self.cell_2_idx)
+            self.max_cell_x = max(cell[0] for cell in self.cell_2_idx)
+            self.min_cell_y = min(cell[1] for cell in self.cell_2_idx)
+            self.max_cell_y = max(cell[1] for cell in self.cell_2_idx)
+
+    def _get_cell(self, x: float, y: float) -> tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def query_rect(self, rect: Optional[Rect]) -> List[SpecialPoint]:
+        """
+        获取矩形内的特殊点 包含边界
+        :param rect: 矩形 为空时返回全部
+        :return: 按原列表顺序排列的特殊点
+        """
+        if rect is None:
+            return list(self.sp_list)
+
+        x1, y1 = self._get_cell(rect.x1, rect.y1)
+        x2, y2 = self._get_cell(rect.x2, rect.y2)
+        x1 = max(x1, self.min_cell_x)
+        y1 = max(y1, self.min_cell_y)
+        x2 = min(x2, self.max_cell_x)
+        y2 = min(y2, self.max_cell_y)
+
+        if x1 > x2 or y1 > y2:
+            return []
+
+        if (x2 - x1 + 1) * (y2 - y1 + 1) >= len(self.sp_list):  # 格子比特殊点还多时 直接遍历更快
+            return [sp for sp in self.sp_list
+                    if rect.x1 <= sp.lm_pos.x <= rect.x2 and rect.y1 <= sp.lm_pos.y <= rect.y2]
+
+        idx_list: List[int] = []
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                for idx in self.cell_2_idx.get((cx, cy), []):
+                    pos = self.sp_list[idx].lm_pos
+                    if rect.x1 <= pos.x <= rect.x2 and rect.y1 <= pos.y <= rect.y2:
+                        idx_list.append(idx)
+
+        idx_list.sort()
+        return [self.sp_list[idx] for idx in idx_list]
+
+    def nearest(self, pos: Point, template_id: Optional[str] = None,
+                max_distance: Optional[float] = None) -> Optional[SpecialPoint]:
+        """
+        获取离坐标最近的特殊点 距离一样时返回原列表中靠前的
+        从坐标所在的格子开始 一圈一圈往外找 找到的距离比下一圈的最近距离还近时停止
+        :param pos: 大地图坐标
+        :param template_id: 特殊点种类 为空时不限制
+        :param max_distance: 最远距离 为空时不限制
+        :return:
+        """
+        if len(self.cell_2_idx) == 0:
+            return None
+
+        cx, cy = self._get_cell(pos.x, pos.y)
+        max_ring = max(abs(cx - self.min_cell_x), abs(cx - self.max_cell_x),
+                       abs(cy - self.min_cell_y), abs(cy - self.max_cell_y))
+
+        best_idx: int = -1
+        best_dis2: float = 0
+        for ring in range(max_ring + 1):
+            # 这一圈的格子里 最近的点与坐标的距离下限
+            ring_min_dis = (ring - 1) * self.cell_size if ring > 0 else 0
+            if best_idx != -1 and ring_min_dis ** 2 > best_dis2:
+                break
+            if max_distance is not None and ring_min_dis > max_distance:
+                break
+
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if max(abs(x - cx), abs(y - cy)) != ring:  # 只看这一圈
+                        continue
+                    for idx in self.cell_2_idx.get((x, y), []):
+                        sp = self.sp_list[idx]
+                        if template_id is not None and sp.template_id != template_id:
+                            continue
+                        dis2 = (sp.lm_pos.x - pos.x) ** 2 + (sp.lm_pos.y - pos.y) ** 2
+                        if best_idx == -1 or dis2 < best_dis2 or (dis2 == best_dis2 and idx < best_idx):
+                            best_idx = idx
+                            best_dis2 = dis2
+
+        if best_idx == -1:
+            return None
+        if max_distance is not None and best_dis2 > max_distance ** 2:
+            return None
+        return self.sp_list[best_idx]
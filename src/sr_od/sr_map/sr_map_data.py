@@ -9,6 +9,7 @@ from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.utils import os_utils, str_utils, cv2_utils, cal_utils
 from one_dragon.utils.i18_utils import gt
 from sr_od.sr_map.large_map_info import LargeMapInfo
+from sr_od.sr_map.sp_grid_index import SpecialPointGridIndex
 from sr_od.sr_map.sr_map_def import Planet, Region, SpecialPoint
 
 
@@ -22,6 +23,14 @@ class SrMapData:
         self.sp_list: List[SpecialPoint] = []
         self.region_2_sp: dict[str, List[SpecialPoint]] = {}
 
+        self.pr_id_floor_2_region: dict[tuple[str, int], Region] = {}  # (区域, 楼层) -> 区域
+        self.pr_id_2_region_list: dict[str, List[Region]] = {}  # 区域 -> 全部楼层
+        self.sub_region_key_2_region: dict[tuple[str, str, int], Region] = {}  # (主区域, 子区域中文, 楼层) -> 子区域
+        self.region_2_planet_idx: dict[int, int] = {}  # 区域对象id -> 在星球区域列表的下标
+        self.region_2_sp_index: dict[str, SpecialPointGridIndex] = {}  # 区域 -> 特殊点网格索引
+        self.sp_key_2_sp: dict[tuple[str, str, int, str], SpecialPoint] = {}  # (星球, 区域, 楼层, 中文) -> 特殊点
+        self.region_2_sp_ocr_name: dict[str, dict[str, int]] = {}  # 区域 -> 特殊点的OCR名称 -> 第一个下标
+
         self.load_map_data()
 
         self.large_map_info_map: dict[str, LargeMapInfo] = {}
@@ -34,6 +43,8 @@ class SrMapData:
         self.load_planet_data()
         self.load_region_data()
         self.load_special_point_data()
+        self.init_region_index()
+        self.init_sp_index()
 
     @staticmethod
     def get_map_data_dir() -> str:
@@ -45,7 +56,7 @@ class SrMapData:
         :return:
         """
         file_path = os.path.join(self.get_map_data_dir(), 'planet.yml')
-        yaml_op = YamlOperator(file_path)
+        yaml_op = YamlOperator(file_path, use_cache=True)
         self.planet_list = [Planet(**item) for item in yaml_op.data]
 
     def load_region_data(self) -> None:
@@ -58,7 +69,7 @@ class SrMapData:
 
         for p in self.planet_list:
             file_path = os.path.join(self.get_map_data_dir(), p.np_id, f'{p.np_id}.yml')
-            yaml_op = YamlOperator(file_path)
+            yaml_op = YamlOperator(file_path, use_cache=True)
             self.planet_2_region[p.np_id] = []
 
             for r in yaml_op.data:
@@ -98,7 +109,7 @@ class SrMapData:
             loaded_region_set.add(region.pr_id)
 
             file_path = os.path.join(self.get_map_data_dir(), region.planet.np_id, f'{region.pr_id}.yml')
-            yaml_op = YamlOperator(file_path)
+            yaml_op = YamlOperator(file_path, use_cache=True)
 
             for sp_data in yaml_op.data:
                 real_planet = self.best_match_planet_by_name(sp_data['planet_name'])
@@ -113,6 +124,55 @@ class SrMapData:
 
                 self.region_2_sp[real_region.pr_id].append(sp)
 
+    def init_region_index(self) -> None:
+        """
+        初始化区域的查找索引 相同的键保留列表中的第一个 与顺序遍历的结果一致
+        :return:
+        """
+        self.pr_id_floor_2_region = {}
+        self.pr_id_2_region_list = {}
+        self.sub_region_key_2_region = {}
+        self.region_2_planet_idx = {}
+
+        for region in self.region_list:
+            key = (region.pr_id, region.floor)
+            if key not in self.pr_id_floor_2_region:
+                self.pr_id_floor_2_region[key] = region
+            if region.pr_id not in self.pr_id_2_region_list:
+                self.pr_id_2_region_list[region.pr_id] = []
+            self.pr_id_2_region_list[region.pr_id].append(region)
+            if region.parent is not None:
+                sub_key = (region.parent.pr_id, region.cn, region.floor)
+                if sub_key not in self.sub_region_key_2_region:
+                    self.sub_region_key_2_region[sub_key] = region
+
+        for region_list in self.planet_2_region.values():
+            for idx, region in enumerate(region_list):
+                self.region_2_planet_idx[id(region)] = idx
+
+    def init_sp_index(self) -> None:
+        """
+        初始化特殊点的查找索引
+        :return:
+        """
+        self.region_2_sp_index = {}
+        self.sp_key_2_sp = {}
+        self.region_2_sp_ocr_name = {}
+
+        for pr_id, sp_list in self.region_2_sp.items():
+            self.region_2_sp_index[pr_id] = SpecialPointGridIndex(sp_list)
+            name_2_idx: dict[str, int] = {}
+            for idx, sp in enumerate(sp_list):
+                name = gt(sp.cn, 'ocr')
+                if name not in name_2_idx:
+                    name_2_idx[name] = idx
+            self.region_2_sp_ocr_name[pr_id] = name_2_idx
+
+        for sp in self.sp_list:
+            key = (sp.planet.np_id, sp.region.pr_id, sp.region.floor, sp.cn)
+            if key not in self.sp_key_2_sp:
+                self.sp_key_2_sp[key] = sp
+
     def get_planet_by_cn(self, cn: str) -> Optional[Planet]:
         """
         根据星球的中文 获取对应常量
@@ -175,9 +235,7 @@ class SrMapData:
         :param floor: 目标楼层
         :return:
         """
-        for r in self.region_list:
-            if r.pr_id == region.pr_id and r.floor == floor:
-                return r
+        return self.pr_id_floor_2_region.get((region.pr_id, floor))
 
     def get_region_with_all_floor(self, region: Region) -> List[Region]:
         """
@@ -185,7 +243,7 @@ class SrMapData:
         :param region:
         :return:
         """
-        return [r for r in self.region_list if r.pr_id == region.pr_id]
+        return list(self.pr_id_2_region_list.get(region.pr_id, []))
 
     def get_sub_region_by_cn(self, region: Region, cn: str, floor: int = 0) -> Optional[Region]:
         """
@@ -195,6 +253,38 @@ class SrMapData:
         :param floor: 子区域的层数
         :return: 常量
         """
+        candidate_list: List[Region] = []
+        # 进入子区域
+        sub_region = self.sub_region_key_2_region.get((region.pr_id, cn, floor))
+        if sub_region is not None:
+            candidate_list.append(sub_region)
+        # 换了楼层
+        floor_region = self.pr_id_floor_2_region.get((region.pr_id, floor))
+        if floor_region is not None:
+            candidate_list.append(floor_region)
+        # 回到主区域
+        if region.parent is not None and region.parent.cn == cn and region.parent.floor == floor:
+            parent_list = self.pr_id_2_region_list.get(region.parent.pr_id, [])
+            if len(parent_list) > 0:
+                candidate_list.append(parent_list[0])
+
+        # 多个条件都满足时 返回星球区域列表中靠前的 与顺序遍历一致
+        result: Optional[Region] = None
+        for r in candidate_list:
+            if r.planet.np_id != region.planet.np_id:
+                continue
+            if result is None or self.region_2_planet_idx[id(r)] < self.region_2_planet_idx[id(result)]:
+                result = r
+        return result
+
+    def get_sub_region_by_cn_by_scan(self, region: Region, cn: str, floor: int = 0) -> Optional[Region]:
+        """
+        根据子区域的中文 获取对应常量 顺序遍历的版本 用于验证索引的结果
+        :param region: 所属区域
+        :param cn: 子区域名称
+        :param floor: 子区域的层数
+        :return: 常量
+        """
         same_planet_region_list = self.planet_2_region.get(region.planet.np_id, [])
         for r in same_planet_region_list:
             # 进入子区域
@@ -219,6 +309,10 @@ class SrMapData:
             return None
 
         to_check_sp_list: List[SpecialPoint] = self.region_2_sp.get(region.pr_id, [])
+        exact_idx = self.region_2_sp_ocr_name.get(region.pr_id, {}).get(ocr_word)
+        if exact_idx is not None:  # 名称完全一致时 就是最相近的结果
+            return to_check_sp_list[exact_idx]
+
         to_check_sp_name_list: List[str] = [gt(i.cn, 'ocr') for i in to_check_sp_list]
 
         idx = str_utils.find_best_match_by_difflib(ocr_word, to_check_sp_name_list)
@@ -241,6 +335,43 @@ class SrMapData:
         region = self.best_match_region_by_name(region_name, planet, region_floor)
         return self.best_match_sp_by_name(region, sp_name)
 
+    def get_sp_by_cn(self, region: Region, cn: str) -> Optional[SpecialPoint]:
+        """
+        根据区域和中文 精确获取特殊点
+        :param region: 区域 包括楼层
+        :param cn: 特殊点中文
+        :return:
+        """
+        return self.sp_key_2_sp.get((region.planet.np_id, region.pr_id, region.floor, cn))
+
+    def query_rect(self, region: Region, rect: Optional[Rect]) -> List[SpecialPoint]:
+        """
+        获取区域特定矩形内的特殊点 忽略楼层
+        :param region: 区域
+        :param rect: 矩形 包含边界 为空时返回全部
+        :return: 特殊点 顺序与加载顺序一致
+        """
+        index = self.region_2_sp_index.get(region.pr_id)
+        if index is None:
+            return []
+        return index.query_rect(rect)
+
+    def nearest_sp(self, region: Region, pos: Point,
+                   template_id: Optional[str] = None,
+                   max_distance: Optional[float] = None) -> Optional[SpecialPoint]:
+        """
+        获取区域内离坐标最近的特殊点 忽略楼层
+        :param region: 区域
+        :param pos: 大地图坐标
+        :param template_id: 特殊点种类 为空时不限制
+        :param max_distance: 最远距离 为空时不限制
+        :return:
+        """
+        index = self.region_2_sp_index.get(region.pr_id)
+        if index is None:
+            return None
+        return index.nearest(pos, template_id=template_id, max_distance=max_distance)
+
     def get_sp_type_in_rect(self, region: Region, rect: Rect) -> dict:
         """
         获取区域特定矩形内的特殊点 按种类分组
@@ -248,6 +379,21 @@ class SrMapData:
         :param rect: 矩形 为空时返回全部
         :return: 特殊点
         """
+        sp_map = {}
+        for sp in self.query_rect(region, rect):
+            if sp.template_id not in sp_map:
+                sp_map[sp.template_id] = []
+            sp_map[sp.template_id].append(sp)
+
+        return sp_map
+
+    def get_sp_type_in_rect_by_scan(self, region: Region, rect: Rect) -> dict:
+        """
+        获取区域特定矩形内的特殊点 按种类分组 顺序遍历的版本 用于验证索引的结果
+        :param region: 区域
+        :param rect: 矩形 为空时返回全部
+        :return: 特殊点
+        """
         sp_list = self.region_2_sp.get(region.pr_id)
         sp_map = {}
         if sp_list is None or len(sp_list) == 0:
@@ -338,8 +484,56 @@ class SrMapData:
         return cv2_utils.read_image(path)
 
 
+def __debug_index():
+    """
+    对比索引和顺序遍历的结果 以及耗时
+    """
+    import random
+    import time
+    data = SrMapData()
+    print(len(data.planet_list))
+    print(len(data.region_list))
+    print(len(data.sp_list))
+
+    rng = random.Random(0)
+    rect_list = []
+    for _ in range(2000):
+        region = rng.choice(data.region_list)
+        x = rng.randint(0, 2000)
+        y = rng.randint(0, 2000)
+        rect_list.append((region, Rect(x, y, x + rng.randint(50, 800), y + rng.randint(50, 800))))
+
+    t1 = time.time()
+    scan_result = [data.get_sp_type_in_rect_by_scan(region, rect) for region, rect in rect_list]
+    t2 = time.time()
+    index_result = [data.get_sp_type_in_rect(region, rect) for region, rect in rect_list]
+    t3 = time.time()
+    print('矩形查询 结果一致 %s 遍历 %.4f秒 索引 %.4f秒' % (scan_result == index_result, t2 - t1, t3 - t2))
+
+    same = True
+    for region, rect in rect_list:
+        pos = Point(rect.x1, rect.y1)
+        sp_list = data.region_2_sp.get(region.pr_id, [])
+        scan = None
+        for sp in sp_list:
+            if scan is None or cal_utils.distance_between(sp.lm_pos, pos) < cal_utils.distance_between(scan.lm_pos, pos):
+                scan = sp
+        if scan is not None and data.nearest_sp(region, pos) is not scan:
+            if cal_utils.distance_between(scan.lm_pos, pos) != cal_utils.distance_between(data.nearest_sp(region, pos).lm_pos, pos):
+                same = False
+    print('最近特殊点 结果一致 %s' % same)
+
+    same = True
+    t1 = time.time()
+    for region in data.region_list:
+        for r in data.region_list:
+            if r.planet.np_id != region.planet.np_id:
+                continue
+            if data.get_sub_region_by_cn(region, r.cn, r.floor) is not data.get_sub_region_by_cn_by_scan(region, r.cn, r.floor):
+                same = False
+    t2 = time.time()
+    print('子区域查询 结果一致 %s 耗时 %.4f秒' % (same, t2 - t1))
+
+
 if __name__ == '__main__':
-    _data = SrMapData()
-    print(len(_data.planet_list))
-    print(len(_data.region_list))
-    print(len(_data.sp_list))
+    __debug_index()